@@ -0,0 +1,119 @@
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that loads the token's user together with their Profile"""
+
+    def get_user(self, validated_token):
+        try:
+            user = self.user_model.objects.select_related('profile').get(
+                **{api_settings.USER_ID_FIELD: self.get_user_id(validated_token)}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        return self.check_user(user, validated_token)
+
+    async def aget_user(self, validated_token):
+        """Async version of get_user(), for async views"""
+        try:
+            user = await self.user_model.objects.select_related('profile').aget(
+                **{api_settings.USER_ID_FIELD: self.get_user_id(validated_token)}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        return self.check_user(user, validated_token)
+
+    @staticmethod
+    def get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    @staticmethod
+    def check_user(user, validated_token):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class ClaimsUser(TokenUser):
+    """Stateless user built from the role claims of a validated access token"""
+
+    @property
+    def role(self):
+        return self.token['role']
+
+    @property
+    def assigned_admin_id(self):
+        return self.token.get('assigned_admin')
+
+
+class RoleClaimsJWTAuthentication(ProfileJWTAuthentication):
+    """
+    Authorize read-only requests from the token's role claims alone.
+
+    Safe-method requests carrying role claims younger than
+    ``JWT_ROLE_CLAIMS_MAX_AGE`` seconds get a ClaimsUser without touching
+    the database; everything else loads the user and profile as usual.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in SAFE_METHODS and self.claims_are_fresh(validated_token):
+            return ClaimsUser(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    async def aauthenticate(self, request):
+        """
+        Async version of authenticate() for plain Django async views.
+
+        Token validation is CPU only; the database is only touched (through
+        the async ORM) when the claims can't be used.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in SAFE_METHODS and self.claims_are_fresh(validated_token):
+            return ClaimsUser(validated_token), validated_token
+        return await self.aget_user(validated_token), validated_token
+
+    @staticmethod
+    def claims_are_fresh(validated_token):
+        max_age = getattr(settings, 'JWT_ROLE_CLAIMS_MAX_AGE', 0)
+        issued_at = validated_token.get('role_iat')
+        if not max_age or issued_at is None or validated_token.get('role') is None:
+            return False
+        return time.time() - issued_at <= max_age
@@ -1,11 +1,26 @@
+from functools import wraps
+
 from django.shortcuts import redirect
 from django.contrib import messages
 
-def superadmin_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.user.is_authenticated:
-            if request.user.profile.role == 'superadmin':
+from .permissions import get_role
+
+
+def role_required(*roles, message="You don't have permission to access this page.", redirect_to='profile'):
+    """
+    Only let users whose profile role is in ``roles`` through to the view;
+    others are sent to ``redirect_to`` with ``message``. Goes under
+    login_required.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if get_role(request.user) in roles:
                 return view_func(request, *args, **kwargs)
-        messages.error(request, "Access Denied. SuperAdmin only.")
-        return redirect('login')
-    return wrapper
\ No newline at end of file
+            messages.error(request, message)
+            return redirect(redirect_to)
+        return wrapper
+    return decorator
+
+
+superadmin_required = role_required('superadmin')
@@ -0,0 +1,17 @@
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from .permissions import get_role
+
+
+class RoleMiddleware(MiddlewareMixin):
+    """
+    Expose the session user's profile role as ``request.role``.
+
+    The role is resolved lazily, on first access, and then reused for the
+    rest of the request. Must come after AuthenticationMiddleware.
+    MiddlewareMixin makes this usable from both sync and async request paths.
+    """
+
+    def process_request(self, request):
+        request.role = SimpleLazyObject(lambda: get_role(request.user))
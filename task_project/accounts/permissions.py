@@ -0,0 +1,43 @@
+from rest_framework import permissions
+
+from .authentication import ClaimsUser
+from .models import Profile
+
+ADMIN_ROLES = ('admin', 'superadmin')
+
+
+def get_role(user):
+    """
+    Return the Profile role of ``user``, or None for anonymous users and users without a profile.
+
+    Users loaded by ProfileModelBackend / ProfileJWTAuthentication already carry
+    their profile and ClaimsUser carries the role claim, so this doesn't query
+    the database.
+    """
+    if not user or not user.is_authenticated:
+        return None
+    if isinstance(user, ClaimsUser):
+        return user.role
+    try:
+        return user.profile.role
+    except Profile.DoesNotExist:
+        return None
+
+
+class HasRole(permissions.BasePermission):
+    """Allow access to users whose profile role is in ``allowed_roles``"""
+    allowed_roles = ()
+    message = "Not allowed"
+
+    def has_permission(self, request, view):
+        return get_role(request.user) in self.allowed_roles
+
+
+class IsRegularUser(HasRole):
+    """Permission class for regular users only"""
+    allowed_roles = ('user',)
+
+
+class IsAdminRole(HasRole):
+    """Permission class for admins and superadmins"""
+    allowed_roles = ADMIN_ROLES
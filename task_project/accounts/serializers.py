@@ -0,0 +1,24 @@
+import time
+
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from .permissions import get_role
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Token pair serializer that embeds the user's role and assigned admin.
+
+    ``role_iat`` records when those claims were read from the database, so
+    RoleClaimsJWTAuthentication can tell how stale they are. Access tokens
+    minted from the refresh token keep the original ``role_iat``.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['role'] = get_role(user)
+        profile = getattr(user, 'profile', None)
+        token['assigned_admin'] = profile.assigned_admin_id if profile else None
+        token['role_iat'] = int(time.time())
+        return token
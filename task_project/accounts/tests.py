@@ -1,3 +1,301 @@
-from django.test import TestCase
+import datetime
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from task_project.testing import QueryBudgetMixin
+from tasks.models import Task
+
+from .authentication import ClaimsUser, RoleClaimsJWTAuthentication
+from .permissions import get_role
+from .serializers import RoleTokenObtainPairSerializer
+from .views import PROFILE_RECENT_TASKS
+
+
+@override_settings(TASK_STATS_CACHE_TIMEOUT=0, TASK_RESPONSE_CACHE_TIMEOUT=0)
+class AccountViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Query budgets of the dashboards and profile pages, measured with the
+    caches off. Several users with several tasks each, so a per-row query
+    blows the budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_user('superadmin', password='pass')
+        cls.superadmin.profile.role = 'superadmin'
+        cls.superadmin.profile.save()
+
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+
+        cls.users = []
+        for i in range(4):
+            user = User.objects.create_user(f'user{i}', password='pass')
+            user.profile.assigned_admin = cls.admin
+            user.profile.save()
+            cls.users.append(user)
+            for j in range(4):
+                Task.objects.create(
+                    title=f'Task {i}.{j}',
+                    user=user,
+                    due_date=datetime.date.today(),
+                    status='completed' if j % 2 else 'pending',
+                    completion_report='Done' if j % 2 else '',
+                    worked_hours=1.5 if j % 2 else None,
+                )
+
+    def setUp(self):
+        # Task statistics are cached outside the test transaction
+        cache.clear()
+
+    def test_profile(self):
+        self.client.force_login(self.users[0])
+        with self.assertQueryBudget(6):
+            response = self.client.get('/profile/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_dashboard(self):
+        self.client.force_login(self.admin)
+        with self.assertQueryBudget(6):
+            response = self.client.get('/admin-panel/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_superadmin_dashboard(self):
+        self.client.force_login(self.superadmin)
+        with self.assertQueryBudget(6):
+            response = self.client.get('/superadmin/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_token_page(self):
+        self.client.force_login(self.users[0])
+        with self.assertQueryBudget(2):
+            response = self.client.get('/user/tokens/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(TASK_STATS_CACHE_TIMEOUT=300)
+class ProfileStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', password='pass')
+        for status, hours in (('pending', None), ('in_progress', None), ('completed', 1.5), ('completed', 2)):
+            Task.objects.create(
+                title='Task', user=cls.user, due_date=datetime.date.today(), status=status,
+                completion_report='Done' if hours else '', worked_hours=hours,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def counters(self):
+        context = self.client.get('/profile/').context
+        return {
+            name: context[name]
+            for name in ('total_tasks', 'pending_tasks', 'in_progress_tasks', 'completed_tasks', 'total_hours')
+        }
+
+    def test_counters(self):
+        expected = {
+            'total_tasks': 4, 'pending_tasks': 1, 'in_progress_tasks': 1, 'completed_tasks': 2, 'total_hours': 3.5,
+        }
+        self.assertEqual(self.counters(), expected)
+        with mock.patch('tasks.stats.read_user_task_stats') as read_user_task_stats:
+            self.assertEqual(self.counters(), expected)
+        read_user_task_stats.assert_not_called()
+
+        # A task write invalidates the cached block
+        Task.objects.filter(status='pending').get().delete()
+        self.assertEqual(self.counters(), dict(expected, total_tasks=3, pending_tasks=0))
+
+    def test_recent_tasks_only(self):
+        busy = User.objects.create_user('busy', password='pass')
+        self.client.force_login(busy)
+        for i in range(PROFILE_RECENT_TASKS + 5):
+            Task.objects.create(
+                title=f'Task {i}', user=busy, due_date=datetime.date.today(), status='completed',
+                completion_report=f'Report {i}', worked_hours=1,
+            )
+        response = self.client.get('/profile/')
+        content = response.content.decode()
+        self.assertEqual(content.count('onclick="viewReport('), PROFILE_RECENT_TASKS)
+        self.assertEqual(content.count('class="report-card"'), PROFILE_RECENT_TASKS)
+        self.assertIn(f'Task {PROFILE_RECENT_TASKS + 4}<', content)
+        self.assertNotIn('Task 4<', content)
+        self.assertIn(f'most recent of {PROFILE_RECENT_TASKS + 5} tasks', content)
+        self.assertIn(f'most recent of {PROFILE_RECENT_TASKS + 5} reports', content)
+
+    def test_no_tasks(self):
+        other = User.objects.create_user('other', password='pass')
+        self.client.force_login(other)
+        self.assertEqual(self.counters(), {
+            'total_tasks': 0, 'pending_tasks': 0, 'in_progress_tasks': 0, 'completed_tasks': 0, 'total_hours': 0,
+        })
+
+
+class RoleCheckTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        cls.others_task = Task.objects.create(
+            title='Theirs', user=cls.other, due_date=datetime.date.today(),
+            status='completed', completion_report='Done', worked_hours=1,
+        )
+
+    def auth(self, user):
+        return f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+
+    def test_get_role(self):
+        self.assertIsNone(get_role(None))
+        self.assertIsNone(get_role(AnonymousUser()))
+        self.assertEqual(get_role(User.objects.select_related('profile').get(pk=self.admin.pk)), 'admin')
+        self.assertEqual(get_role(ClaimsUser(RoleTokenObtainPairSerializer.get_token(self.user).access_token)), 'user')
+        self.other.profile.delete()
+        self.assertIsNone(get_role(User.objects.get(pk=self.other.pk)))
+
+    def test_api(self):
+        report_url = f'/api/tasks/{self.others_task.id}/report/'
+        response = self.client.get(report_url, HTTP_AUTHORIZATION=self.auth(self.user))
+        self.assertEqual((response.status_code, response.json()), (403, {'detail': 'Not allowed'}))
+        self.assertEqual(self.client.get(report_url, HTTP_AUTHORIZATION=self.auth(self.admin)).status_code, 200)
+
+        # Another user's task is out of reach for updates
+        response = self.client.put(
+            f'/api/tasks/{self.others_task.id}/', {'status': 'pending'},
+            content_type='application/json', HTTP_AUTHORIZATION=self.auth(self.user),
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Task.objects.get(pk=self.others_task.pk).status, 'completed')
+
+    def test_session_views(self):
+        self.client.force_login(self.user)
+        response = self.client.post(f'/api/update-task/{self.others_task.id}/', {'title': 'Mine now'})
+        self.assertRedirects(response, '/profile/')
+        response = self.client.post(f'/api/delete-task/{self.others_task.id}/')
+        self.assertRedirects(response, '/profile/')
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["You don't have permission to delete tasks."],
+        )
+        for url in ('/superadmin/', '/admin-panel/'):
+            self.assertRedirects(self.client.get(url), '/profile/')
+        task = Task.objects.get(pk=self.others_task.pk)
+        self.assertEqual(task.title, 'Theirs')
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/admin-panel/').status_code, 200)
+        self.assertRedirects(self.client.get('/superadmin/'), '/profile/')
+
+
+class RoleClaimsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+
+    def test_issued_claims(self):
+        response = self.client.post('/api/token/', {'username': 'user', 'password': 'pass'})
+        token = AccessToken(response.json()['access'])
+        self.assertEqual((token['role'], token['assigned_admin']), ('user', self.admin.id))
+        self.assertAlmostEqual(token['role_iat'], time.time(), delta=5)
+
+    def test_claims_user(self):
+        token = RoleTokenObtainPairSerializer.get_token(self.user).access_token
+        authenticator = RoleClaimsJWTAuthentication()
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.assertNumQueries(0):
+            user, _ = authenticator.authenticate(request)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.id, user.role, user.assigned_admin_id), (self.user.id, 'user', self.admin.id))
+
+        # Writes always load the user and profile
+        request = RequestFactory().put('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.assertNumQueries(1):
+            user, _ = authenticator.authenticate(request)
+        self.assertEqual((type(user), user.profile.role), (User, 'user'))
+
+    def test_freshness(self):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        self.user.profile.role = 'admin'
+        self.user.profile.save()
+
+        # Within JWT_ROLE_CLAIMS_MAX_AGE the claims decide, promotion or not
+        self.assertEqual(self.client.get('/api/admin/tasks/', HTTP_AUTHORIZATION=auth).status_code, 403)
+        # Then the profile does
+        later = time.time() + settings.JWT_ROLE_CLAIMS_MAX_AGE + 1
+        with mock.patch('accounts.authentication.time.time', return_value=later):
+            self.assertEqual(self.client.get('/api/admin/tasks/', HTTP_AUTHORIZATION=auth).status_code, 200)
+        with self.settings(JWT_ROLE_CLAIMS_MAX_AGE=0):
+            self.assertEqual(self.client.get('/api/admin/tasks/', HTTP_AUTHORIZATION=auth).status_code, 200)
+
+    def test_claims_are_fresh(self):
+        token = RoleTokenObtainPairSerializer.get_token(self.user).access_token
+        self.assertTrue(RoleClaimsJWTAuthentication.claims_are_fresh(token))
+        # Tokens issued without role claims
+        for claim in ('role', 'role_iat'):
+            stripped = RoleTokenObtainPairSerializer.get_token(self.user).access_token
+            del stripped[claim]
+            self.assertFalse(RoleClaimsJWTAuthentication.claims_are_fresh(stripped))
+
+
+class AsyncAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+
+    def request(self, method, user=None, token=None):
+        if token is None:
+            token = RoleTokenObtainPairSerializer.get_token(user).access_token
+        return getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    async def test_claims_user(self):
+        request = self.request('get', self.user)
+        with mock.patch.object(RoleClaimsJWTAuthentication, 'aget_user') as aget_user:
+            user, token = await RoleClaimsJWTAuthentication().aauthenticate(request)
+        aget_user.assert_not_called()
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.id, user.role, user.assigned_admin_id), (self.user.id, 'user', self.admin.id))
+
+    async def test_database_user(self):
+        # Writes, and reads once the claims are too old, load the user and profile
+        for method, max_age in (('put', 300), ('get', 0)):
+            with self.subTest(method=method), self.settings(JWT_ROLE_CLAIMS_MAX_AGE=max_age):
+                user, token = await RoleClaimsJWTAuthentication().aauthenticate(self.request(method, self.admin))
+                self.assertIsInstance(user, User)
+                self.assertEqual(user.profile.role, 'admin')
+
+    async def test_errors(self):
+        authenticator = RoleClaimsJWTAuthentication()
+        self.assertIsNone(await authenticator.aauthenticate(RequestFactory().get('/')))
+        with self.assertRaises(InvalidToken):
+            await authenticator.aauthenticate(self.request('get', token='not-a-token'))
+
+        token = RoleTokenObtainPairSerializer.get_token(self.user).access_token
+        await User.objects.filter(pk=self.user.pk).aupdate(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            await authenticator.aauthenticate(self.request('put', token=token))
+        await User.objects.filter(pk=self.user.pk).adelete()
+        with self.assertRaises(AuthenticationFailed):
+            await authenticator.aauthenticate(self.request('put', token=token))
@@ -2,41 +2,52 @@ from django.shortcuts import render
 
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from tasks.dashboards import superadmin_dashboard_context
 from tasks.models import Task
+from .decorators import role_required, superadmin_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from .models import Profile
-from rest_framework_simplejwt.tokens import RefreshToken
+from .permissions import get_role
+from .serializers import RoleTokenObtainPairSerializer
 import json
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db.models.functions import Coalesce
 
+ADMIN_DASHBOARD_USERS_PER_PAGE = 25
+ADMIN_DASHBOARD_TASKS_PER_PAGE = 50
+# The profile lists the most recent tasks and reports; the API has the rest
+PROFILE_RECENT_TASKS = 50
 
 
 @login_required
+@superadmin_required
 def superadmin_dashboard(request):
-    if request.user.profile.role != 'superadmin':
-        return redirect('not_allowed')
-
-    users = request.user.__class__.objects.all()
-    tasks = Task.objects.all()
-
-    return render(request, 'superadmin_dashboard.html', {
-        'users': users,
-        'tasks': tasks
-    })
+    return render(request, 'superadmin_dashboard.html', superadmin_dashboard_context(request))
 
 
 @login_required
+@role_required('admin')
 def admin_dashboard(request):
-    if request.user.profile.role != 'admin':
-        return redirect('not_allowed')
-
-    users = request.user.profile.user.users_under_admin.all()
-    tasks = Task.objects.filter(assigned_to__profile__assigned_admin=request.user)
+    # Users under this admin, with task counts read from their UserTaskStats row
+    users = (
+        User.objects.filter(profile__assigned_admin=request.user)
+        .annotate(
+            task_count=Coalesce('task_stats__total_tasks', 0),
+            completed_count=Coalesce('task_stats__completed_tasks', 0),
+        )
+        .order_by('username')
+    )
+    tasks = (
+        Task.objects.filter(user__profile__assigned_admin=request.user)
+        .select_related('user')
+        .order_by('-created_at', '-id')
+    )
 
     return render(request, 'admin_dashboard.html', {
-        'users': users,
-        'tasks': tasks
+        'users': Paginator(users, ADMIN_DASHBOARD_USERS_PER_PAGE).get_page(request.GET.get('users_page')),
+        'tasks': Paginator(tasks, ADMIN_DASHBOARD_TASKS_PER_PAGE).get_page(request.GET.get('page')),
     })
 
 ###########################
@@ -53,9 +64,9 @@ def login_view(request):
             login(request, user)
 
             # Redirect based on role
-            if user.profile.role == 'superadmin':
+            if get_role(user) == 'superadmin':
                 return redirect('superadmin_dashboard')
-            elif user.profile.role == 'admin':
+            elif get_role(user) == 'admin':
                 return redirect('admin_dashboard')
             else:  # Regular user
                 # Instead of showing error, redirect to JWT token page
@@ -111,7 +122,7 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from tasks.models import Task
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from tasks.stats import get_user_task_stats
 
 @login_required
 def profile_view(request):
@@ -120,29 +131,22 @@ def profile_view(request):
     # FIX: Use 'user' instead of 'assigned_to' (based on your model)
     tasks = Task.objects.filter(user=user).order_by('-created_at')
     
-    # Calculate statistics
-    total_tasks = tasks.count()
-    pending_tasks = tasks.filter(status='pending').count()
-    in_progress_tasks = tasks.filter(status='in_progress').count()
-    completed_tasks = tasks.filter(status='completed').count()
-    
-    # Calculate total hours worked
-    total_hours = tasks.filter(
-        status='completed'
-    ).aggregate(Sum('worked_hours'))['worked_hours__sum'] or 0
+    # All counters and the total hours come from one (cached) aggregate query
+    stats = get_user_task_stats(user)
     
     # Get completed tasks for reports
-    completed_tasks_list = tasks.filter(status='completed').order_by('-updated_at')
+    completed_tasks_list = tasks.filter(status='completed').order_by('-completed_at', '-id')
     
     context = {
         'user': user,
-        'tasks': tasks,
-        'total_tasks': total_tasks,
-        'pending_tasks': pending_tasks,
-        'in_progress_tasks': in_progress_tasks,
-        'completed_tasks': completed_tasks,
-        'total_hours': round(total_hours, 1),
-        'completed_tasks_list': completed_tasks_list,
+        'tasks': tasks[:PROFILE_RECENT_TASKS],
+        'recent_tasks_limit': PROFILE_RECENT_TASKS,
+        'total_tasks': stats['total_tasks'],
+        'pending_tasks': stats['pending_tasks'],
+        'in_progress_tasks': stats['in_progress_tasks'],
+        'completed_tasks': stats['completed_tasks'],
+        'total_hours': round(stats['total_hours'], 1),
+        'completed_tasks_list': completed_tasks_list[:PROFILE_RECENT_TASKS],
     }
     
     return render(request, 'profile.html', context)
@@ -155,15 +159,15 @@ def user_token_page(request):
         return redirect('login')
     
     # Check if user is regular user
-    if request.user.profile.role != 'user':
+    if request.role != 'user':
         messages.error(request, "This page is only for regular users")
-        if request.user.profile.role == 'superadmin':
+        if request.role == 'superadmin':
             return redirect('superadmin_dashboard')
-        elif request.user.profile.role == 'admin':
+        elif request.role == 'admin':
             return redirect('admin_dashboard')
     
     # Generate JWT tokens
-    refresh = RefreshToken.for_user(request.user)
+    refresh = RoleTokenObtainPairSerializer.get_token(request.user)
     access_token = str(refresh.access_token)
     refresh_token = str(refresh)
     
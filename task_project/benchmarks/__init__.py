@@ -0,0 +1,26 @@
+"""
+Standalone performance scripts. Run them from the directory holding
+manage.py, e.g. ``python -m benchmarks.load_test``.
+"""
+import contextlib
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_project.settings')
+    import django
+
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    """Run against a throwaway test database (in memory for SQLite), like the test runner"""
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,247 @@
+"""
+Per-endpoint benchmark: latency percentiles, queries per request and peak
+memory for the task and account endpoints.
+
+Runs in-process through Django's test client on a throwaway test database
+seeded with ``--users`` users (split between ``--admins`` admins) of
+``--tasks-per-user`` tasks each. Results are written as JSON, tagged with
+the git commit, so runs can be compared between commits:
+
+    python -m benchmarks.endpoints --users 50 --tasks-per-user 200
+    python -m benchmarks.endpoints --no-cache --only user_tasks profile_view
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+from . import setup_django, test_database
+from .load_test import percentile
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# Password checks dominate the token endpoint, keep its sample small
+MAX_REQUESTS = {'token_obtain': 10}
+
+
+def git_revision():
+    """Return (commit, dirty) of the working tree, or (None, None) outside git"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status)
+
+
+def build_fixtures(users, tasks_per_user, admins):
+    from django.contrib.auth.models import User
+
+    from accounts.serializers import RoleTokenObtainPairSerializer
+    from tasks.models import Task
+    from .seed import PASSWORD, PREFIX, seed
+
+    regular_users = seed(users, tasks_per_user, admins=admins)
+    superadmin = User.objects.create_user(f'{PREFIX}superadmin', password=PASSWORD)
+    superadmin.profile.role = 'superadmin'
+    superadmin.profile.save()
+
+    user = User.objects.select_related('profile').get(pk=regular_users[0].pk)
+    admin = user.profile.assigned_admin
+    refresh = RoleTokenObtainPairSerializer.get_token(user)
+    return {
+        'user': user,
+        'admin': admin,
+        'superadmin': superadmin,
+        'user_auth': f'Bearer {refresh.access_token}',
+        'admin_auth': f'Bearer {RoleTokenObtainPairSerializer.get_token(admin).access_token}',
+        'refresh': str(refresh),
+        'user_task_ids': list(user.tasks.values_list('id', flat=True)),
+        # Not the benchmark user's: update_task_status flips the status of those
+        'completed_task_ids': list(
+            Task.objects.filter(status='completed').exclude(user=user).values_list('id', flat=True)[:500]
+        ),
+    }
+
+
+def build_endpoints(fixtures):
+    """Return ``{name: request(i)}``: each callable performs one request and returns the response"""
+    from django.test import Client
+
+    from .seed import PASSWORD
+
+    def session_client(user):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        return client
+
+    api = Client(HTTP_HOST='localhost')
+    user_web = session_client(fixtures['user'])
+    admin_web = session_client(fixtures['admin'])
+    superadmin_web = session_client(fixtures['superadmin'])
+    user_auth, admin_auth = fixtures['user_auth'], fixtures['admin_auth']
+    task_ids = itertools.cycle(fixtures['user_task_ids'])
+    report_ids = itertools.cycle(fixtures['completed_task_ids'])
+    statuses = itertools.cycle(['in_progress', 'pending'])
+    today = datetime.date.today().isoformat()
+
+    return {
+        'user_tasks': lambda i: api.get('/api/tasks/', HTTP_AUTHORIZATION=user_auth),
+        'update_task_status': lambda i: api.put(
+            f'/api/tasks/{next(task_ids)}/', {'status': next(statuses)},
+            content_type='application/json', HTTP_AUTHORIZATION=user_auth,
+        ),
+        'task_report': lambda i: api.get(f'/api/tasks/{next(report_ids)}/report/', HTTP_AUTHORIZATION=admin_auth),
+        'profile_view': lambda i: user_web.get('/profile/'),
+        'admin_dashboard': lambda i: admin_web.get('/admin-panel/'),
+        'superadmin_dashboard': lambda i: superadmin_web.get('/superadmin/'),
+        'superadmin_dashboard_api': lambda i: superadmin_web.get('/api/superadmin/dashboard/'),
+        'add_task_form': lambda i: superadmin_web.get('/api/add-task/'),
+        'add_task': lambda i: superadmin_web.post('/api/add-task/', {
+            'title': f'Benchmark task {i}',
+            'description': 'Created by benchmarks.endpoints',
+            'due_date': today,
+            'status': 'pending',
+            'user_id': fixtures['user'].pk,
+        }),
+        'token_obtain': lambda i: api.post(
+            '/api/token/', {'username': fixtures['user'].username, 'password': PASSWORD},
+            content_type='application/json',
+        ),
+        'token_refresh': lambda i: api.post(
+            '/api/token/refresh/', {'refresh': fixtures['refresh']}, content_type='application/json',
+        ),
+    }
+
+
+def measure(request, count, warmup, memory_samples):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for i in range(warmup):
+        request(i)
+
+    latencies, query_counts, status_codes = [], [], {}
+    for i in range(count):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = request(i)
+            latencies.append(time.perf_counter() - start)
+        query_counts.append(len(queries))
+        status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+
+    # Separate pass: tracemalloc slows requests down too much to time them
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(memory_samples):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            request(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'requests': count,
+        'status_codes': status_codes,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) * 1000,
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': latencies[-1] * 1000,
+        },
+        'queries': {
+            'mean': sum(query_counts) / len(query_counts),
+            'max': max(query_counts),
+        },
+        'peak_memory_kib': max(peaks) / 1024 if peaks else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--admins', type=int, default=5)
+    parser.add_argument('--tasks-per-user', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=100, help="timed requests per endpoint")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--memory-samples', type=int, default=10)
+    parser.add_argument('--only', nargs='+', metavar='ENDPOINT', help="benchmark only these endpoints")
+    parser.add_argument('--no-cache', action='store_true', help="disable the stats and response caches")
+    parser.add_argument('--output', type=Path, help="JSON results file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    import django
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    # Everything runs in this process, so the caches are safe on locmem too
+    overrides = {
+        name: 0 if args.no_cache else getattr(settings, name) or 300
+        for name in ('TASK_STATS_CACHE_TIMEOUT', 'TASK_RESPONSE_CACHE_TIMEOUT')
+    }
+    commit, dirty = git_revision()
+    results = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cpus': os.cpu_count(),
+            'users': args.users,
+            'admins': args.admins,
+            'tasks_per_user': args.tasks_per_user,
+            'caches': not args.no_cache,
+            'fast_serializer': getattr(settings, 'TASK_FAST_SERIALIZER', False),
+        },
+        'endpoints': {},
+    }
+
+    with test_database(), override_settings(**overrides):
+        cache.clear()
+        endpoints = build_endpoints(build_fixtures(args.users, args.tasks_per_user, args.admins))
+        unknown = set(args.only or ()) - set(endpoints)
+        if unknown:
+            raise SystemExit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        print(f"{'endpoint':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'peak KiB':>9}")
+        for name, request in endpoints.items():
+            if args.only and name not in args.only:
+                continue
+            count = min(args.requests, MAX_REQUESTS.get(name, args.requests))
+            result = measure(request, count, min(args.warmup, count), min(args.memory_samples, count))
+            results['endpoints'][name] = result
+            print(
+                f"{name:<26} {result['latency_ms']['p50']:>8.2f} {result['latency_ms']['p95']:>8.2f}"
+                f" {result['latency_ms']['p99']:>8.2f} {result['queries']['mean']:>8.1f}"
+                f" {result['peak_memory_kib']:>9.1f}"
+                + f"  {result['status_codes']}"
+            )
+
+    output = args.output or RESULTS_DIR / f"{(commit or 'unknown')[:12]}{'-dirty' if dirty else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + '\n')
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
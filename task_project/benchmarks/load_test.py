@@ -0,0 +1,141 @@
+"""
+Concurrent read/write load test against the configured database.
+
+Each worker is a separate process driving the API through Django's test
+client, so the whole stack (auth, serializers, ORM, database locking) is
+exercised without needing a web server. Throughput is measured for each
+worker count:
+
+    DB_NAME=/tmp/loadtest.sqlite3 python -m benchmarks.load_test --workers 1 2 4 8
+    DB_ENGINE=postgres DB_NAME=tasks python -m benchmarks.load_test --workers 1 2 4 8 16
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+from . import setup_django
+
+
+def run_worker(user_ids, duration, write_ratio, barrier, results):
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from accounts.serializers import RoleTokenObtainPairSerializer
+
+    rng = random.Random()
+    sessions = []
+    for user in User.objects.filter(id__in=user_ids).select_related('profile'):
+        token = RoleTokenObtainPairSerializer.get_token(user).access_token
+        task_ids = list(user.tasks.values_list('id', flat=True))
+        sessions.append((f'Bearer {token}', task_ids))
+
+    client = Client(HTTP_HOST='localhost')
+    latencies = []
+    errors = {}
+    barrier.wait()
+
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        auth, task_ids = rng.choice(sessions)
+        start = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                response = client.put(
+                    f'/api/tasks/{rng.choice(task_ids)}/',
+                    {'status': rng.choice(['pending', 'in_progress'])},
+                    content_type='application/json',
+                    HTTP_AUTHORIZATION=auth,
+                )
+            else:
+                response = client.get('/api/tasks/?page_size=20', HTTP_AUTHORIZATION=auth)
+            error = None if response.status_code < 400 else f'HTTP {response.status_code}'
+        except Exception as exc:  # e.g. OperationalError: database is locked
+            error = f'{type(exc).__name__}: {exc}'
+        if error:
+            errors[error] = errors.get(error, 0) + 1
+        else:
+            latencies.append(time.perf_counter() - start)
+    results.put((latencies, errors))
+
+
+def run(workers, user_ids, duration, write_ratio):
+    """Run ``workers`` processes for ``duration`` seconds and return their merged results"""
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(
+            target=run_worker,
+            args=(user_ids[i::workers] or user_ids, duration, write_ratio, barrier, results),
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    latencies, errors = [], {}
+    for _ in processes:
+        worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        for error, count in worker_errors.items():
+            errors[error] = errors.get(error, 0) + count
+    for process in processes:
+        process.join()
+    return sorted(latencies), errors
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--duration', type=float, default=10, help="seconds per worker count")
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--tasks-per-user', type=int, default=50)
+    parser.add_argument('--write-ratio', type=float, default=0.3, help="share of requests that are writes")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connections
+
+    from .seed import clear, seed
+
+    call_command('migrate', verbosity=0)
+    clear()
+    user_ids = [user.id for user in seed(args.users, args.tasks_per_user)]
+    database = connections['default'].settings_dict
+    # Children open their own connections
+    connections.close_all()
+
+    print(
+        f"database: {database['ENGINE']} {database['NAME']}, write ratio {args.write_ratio:.0%},"
+        f" {os.cpu_count()} CPUs"
+    )
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    try:
+        for workers in args.workers:
+            latencies, errors = run(workers, user_ids, args.duration, args.write_ratio)
+            print(
+                f"{workers:>7} {len(latencies) / args.duration:>9.1f}"
+                f" {percentile(latencies, 50) * 1000:>8.1f}"
+                f" {percentile(latencies, 95) * 1000:>8.1f}"
+                f" {percentile(latencies, 99) * 1000:>8.1f}"
+                f" {sum(errors.values()):>7}"
+            )
+            for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+                print(f"        {count} x {error}")
+    finally:
+        clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Create and remove throwaway users and tasks for the benchmark scripts"""
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Profile
+from tasks.analytics import aggregate_worked_hours
+from tasks.models import Task, UserTaskStats, WorkedHoursRollup
+
+PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+
+
+@transaction.atomic
+def seed(users=20, tasks_per_user=100, prefix=PREFIX, admins=1):
+    """
+    Create ``admins`` admins and ``users`` users under them, each with
+    ``tasks_per_user`` tasks, and return the regular users.
+
+    Rows are bulk inserted, so the Profile signals don't fire and the
+    UserTaskStats and WorkedHoursRollup rows are filled in explicitly (the
+    rollups directly rather than through background jobs).
+    Completed tasks are spread over the last two years.
+    """
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [User(username=f'{prefix}admin{i}', password=password) for i in range(admins)]
+        + [User(username=f'{prefix}user{i}', password=password) for i in range(users)]
+    )
+    admin_users = list(User.objects.filter(username__startswith=f'{prefix}admin').order_by('id'))
+    regular_users = list(User.objects.filter(username__startswith=f'{prefix}user').order_by('id'))
+
+    Profile.objects.bulk_create(
+        [Profile(user=admin, role='admin') for admin in admin_users]
+        + [
+            Profile(user=user, role='user', assigned_admin=admin_users[i % len(admin_users)])
+            for i, user in enumerate(regular_users)
+        ]
+    )
+
+    rng = random.Random(0)
+    today = datetime.date.today()
+    statuses = [value for value, _ in Task.STATUS_CHOICES]
+    tasks = []
+    for user in regular_users:
+        for i in range(tasks_per_user):
+            task_status = rng.choice(statuses)
+            tasks.append(Task(
+                title=f'Task {i}',
+                description='Seeded for benchmarks',
+                user=user,
+                due_date=today + datetime.timedelta(days=rng.randint(-30, 30)),
+                status=task_status,
+                completion_report='Done' if task_status == 'completed' else None,
+                worked_hours=rng.randint(1, 8) if task_status == 'completed' else None,
+            ))
+    # Separate generator, so the tasks themselves match earlier seeds
+    completions = random.Random(1)
+    now = timezone.now()
+    for task in tasks:
+        task.update_completed_at(now - datetime.timedelta(minutes=completions.randint(0, 2 * 365 * 24 * 60)))
+    Task.objects.bulk_create(tasks, batch_size=1000)
+    UserTaskStats.objects.apply_changes((None, task.stats_values()) for task in tasks)
+    WorkedHoursRollup.objects.bulk_create(
+        aggregate_worked_hours(Task.objects.filter(user__in=regular_users)), batch_size=1000,
+    )
+    return regular_users
+
+
+def clear(prefix=PREFIX):
+    """Delete everything created by seed(); tasks and stats cascade"""
+    User.objects.filter(username__startswith=prefix).delete()
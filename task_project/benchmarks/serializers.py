@@ -0,0 +1,59 @@
+"""
+Compare TaskSerializer with the values() based TaskRowSerializer.
+
+For each row count, both paths load the newest tasks, serialize them and
+render JSON; the rendered bytes are checked to be identical. Runs on a
+throwaway test database:
+
+    python -m benchmarks.serializers --rows 1000 10000 100000
+"""
+import argparse
+import time
+
+from . import setup_django, test_database
+
+
+def best_of(repeat, func):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+
+    from tasks.models import Task
+    from tasks.serializers import TaskRowSerializer, TaskSerializer
+    from .seed import seed
+
+    renderer = JSONRenderer()
+
+    def render(serializer_class, rows):
+        queryset = serializer_class.optimize_queryset(Task.objects.order_by('-created_at', '-id'))[:rows]
+        return renderer.render(serializer_class(list(queryset), many=True).data)
+
+    with test_database():
+        users = 100
+        seed(users=users, tasks_per_user=-(-max(args.rows) // users))
+
+        print(f"{'rows':>8} {'TaskSerializer ms':>18} {'TaskRowSerializer ms':>21} {'speedup':>8}")
+        for rows in args.rows:
+            slow, slow_body = best_of(args.repeat, lambda: render(TaskSerializer, rows))
+            fast, fast_body = best_of(args.repeat, lambda: render(TaskRowSerializer, rows))
+            if fast_body != slow_body:
+                raise SystemExit(f"Outputs differ at {rows} rows")
+            print(f"{rows:>8} {slow * 1000:>18.1f} {fast * 1000:>21.1f} {slow / fast:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
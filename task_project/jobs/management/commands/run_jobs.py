@@ -0,0 +1,46 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a thread pool until stopped (SIGINT / SIGTERM)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=getattr(settings, 'JOBS_WORKER_THREADS', 4),
+            help="Jobs run at the same time (default JOBS_WORKER_THREADS)",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'JOBS_POLL_INTERVAL', 1),
+            metavar='SECONDS',
+            help="How often an idle worker checks for new jobs (default JOBS_POLL_INTERVAL)",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Exit once no job is available instead of waiting for more",
+        )
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError("--threads must be at least 1")
+        if options['poll_interval'] <= 0:
+            raise CommandError("--poll-interval must be positive")
+
+        worker = Worker(options['threads'], options['poll_interval'])
+        if threading.current_thread() is threading.main_thread():
+            # Finish the running jobs, then exit
+            signal.signal(signal.SIGINT, worker.stop)
+            signal.signal(signal.SIGTERM, worker.stop)
+
+        processed = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)"))
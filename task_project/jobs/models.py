@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    A unit of background work: the handler registered as ``name`` (see
+    jobs.queue) called with ``payload`` by ``manage.py run_jobs``.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # At most one queued job per key: enqueueing it again is a no-op
+    key = models.CharField(max_length=200, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Queued: when the job may run. Running: when its lease expires and
+    # another worker may take it over. Done / failed: when it finished.
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    # Claim token of the worker running the job
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    # User the job was enqueued for, if any (e.g. who requested an export)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status='queued'), name='job_queued_key_unique',
+            ),
+        ]
+        indexes = [
+            # claiming (queued and expired running jobs) and pruning (finished jobs)
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
@@ -0,0 +1,187 @@
+"""
+A database-backed job queue.
+
+Apps register handlers with the ``job`` decorator and add work with
+``enqueue()``; ``manage.py run_jobs`` claims jobs and runs them on a thread
+pool (see jobs.worker).
+
+Enqueueing is an INSERT on the caller's connection, so a job enqueued in a
+transaction only exists once it commits (and never if it rolls back).
+
+Claiming a job leases it for the handler's ``timeout`` seconds: the worker
+sets ``status='running'`` and ``run_after`` to the end of the lease with a
+conditional UPDATE, so two workers can't claim the same job. A job whose
+worker died becomes available again once its lease expires (a visibility
+timeout). Failed jobs are retried after an exponential backoff, up to
+``max_attempts`` attempts (lost leases included), and then marked failed. Delivery is therefore at
+least once: handlers must be safe to run again.
+
+Jobs sharing a ``key`` don't run concurrently, and only one of them can be
+queued at a time, so a burst of identical work collapses into one run.
+"""
+import datetime
+import logging
+import traceback
+import uuid
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Handler:
+    func: Callable
+    timeout: int
+    max_attempts: int
+
+
+handlers = {}
+
+
+def job(name, timeout=None, max_attempts=None):
+    """
+    Register the decorated function as the handler of ``name`` jobs. It is
+    called with the job's payload as keyword arguments.
+    """
+    def register(func):
+        handlers[name] = Handler(
+            func,
+            timeout or getattr(settings, 'JOBS_VISIBILITY_TIMEOUT', 300),
+            max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 5),
+        )
+        return func
+    return register
+
+
+def new_job(name, key=None, owner=None, run_after=None, **payload):
+    """Return an unsaved Job, for enqueue_many()"""
+    if name not in handlers:
+        raise LookupError(f"No job handler registered as {name!r}")
+    return Job(name=name, key=key, owner=owner, payload=payload, run_after=run_after or timezone.now())
+
+
+def enqueue(name, key=None, owner=None, run_after=None, **payload):
+    """
+    Queue a ``name`` job with ``payload`` and return it. With a ``key`` that
+    is already queued, nothing is added and None is returned.
+    """
+    job = new_job(name, key=key, owner=owner, run_after=run_after, **payload)
+    if key is None:
+        job.save()
+        return job
+    Job.objects.bulk_create([job], ignore_conflicts=True)
+    return Job.objects.filter(key=key, status=Job.QUEUED).first()
+
+
+def enqueue_many(jobs):
+    """Queue new_job() jobs with one INSERT; those whose key is already queued are skipped"""
+    Job.objects.bulk_create(jobs, ignore_conflicts=True)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before attempt ``attempts + 1``"""
+    base = getattr(settings, 'JOBS_RETRY_DELAY', 10)
+    return min(base * 2 ** (attempts - 1), 3600)
+
+
+def claim_jobs(limit, now=None):
+    """Lease up to ``limit`` available jobs, oldest first, and return them"""
+    now = now or timezone.now()
+    # Keys a live worker is busy with
+    busy_keys = Job.objects.filter(status=Job.RUNNING, run_after__gt=now, key__isnull=False).values('key')
+    candidates = (
+        Job.objects.filter(status__in=(Job.QUEUED, Job.RUNNING), run_after__lte=now)
+        .exclude(key__in=busy_keys)
+        .order_by('run_after', 'id')
+    )
+
+    claimed = []
+    claimed_keys = set()
+    # Over-fetch a little: another worker may win some of them
+    for job in candidates[:limit * 2]:
+        if job.key is not None and job.key in claimed_keys:
+            # e.g. an expired run and the job queued again behind it
+            continue
+        unchanged = Job.objects.filter(pk=job.pk, status=job.status, run_after=job.run_after)
+        handler = handlers.get(job.name)
+        if handler is None:
+            logger.error("No job handler registered as %r (job %s)", job.name, job.pk)
+            unchanged.update(status=Job.FAILED, run_after=now, last_error=f"No handler registered as {job.name!r}")
+            continue
+        if job.status == Job.RUNNING and job.attempts >= handler.max_attempts:
+            # Its last attempt took the worker down (or outlived the lease)
+            logger.error("Job %s (%s) did not finish in %s attempts", job.pk, job.name, job.attempts)
+            unchanged.update(
+                status=Job.FAILED, run_after=now,
+                last_error=f"The lease expired on attempt {job.attempts} of {handler.max_attempts}",
+            )
+            continue
+        token = uuid.uuid4().hex
+        lease = now + datetime.timedelta(seconds=handler.timeout)
+        won = unchanged.update(
+            status=Job.RUNNING, run_after=lease, locked_by=token, attempts=F('attempts') + 1,
+        )
+        if won:
+            job.status, job.run_after, job.locked_by, job.attempts = Job.RUNNING, lease, token, job.attempts + 1
+            claimed.append(job)
+            claimed_keys.add(job.key)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; returns True if it succeeded"""
+    handler = handlers[job.name]
+    # Only the worker holding the lease may record the outcome
+    mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status=Job.RUNNING)
+    try:
+        handler.func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= handler.max_attempts:
+            logger.error("Job %s (%s) failed after %s attempts:\n%s", job.pk, job.name, job.attempts, error)
+            mine.update(status=Job.FAILED, run_after=timezone.now(), last_error=error)
+        else:
+            delay = retry_delay(job.attempts)
+            logger.warning("Job %s (%s) failed, retrying in %ss:\n%s", job.pk, job.name, delay, error)
+            try:
+                with transaction.atomic():
+                    mine.update(
+                        status=Job.QUEUED, run_after=timezone.now() + datetime.timedelta(seconds=delay),
+                        locked_by='', last_error=error,
+                    )
+            except IntegrityError:
+                # The same work was queued again meanwhile: that job retries it
+                mine.update(status=Job.DONE, run_after=timezone.now(), last_error=error)
+        return False
+    mine.update(status=Job.DONE, run_after=timezone.now(), locked_by='')
+    return True
+
+
+def run_pending_jobs(limit=None):
+    """Run available jobs in this thread until none are left (or ``limit`` ran); returns how many ran"""
+    count = 0
+    while limit is None or count < limit:
+        jobs = claim_jobs(1)
+        if not jobs:
+            break
+        run_job(jobs[0])
+        count += 1
+    return count
+
+
+def prune_jobs(now=None):
+    """Delete jobs that finished more than JOBS_RETENTION_DAYS ago"""
+    now = now or timezone.now()
+    cutoff = now - datetime.timedelta(days=getattr(settings, 'JOBS_RETENTION_DAYS', 7))
+    deleted, _ = Job.objects.filter(status__in=(Job.DONE, Job.FAILED), run_after__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,153 @@
+import datetime
+import io
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim_jobs, enqueue, job, prune_jobs, retry_delay, run_job, run_pending_jobs
+
+calls = []
+
+
+@job('jobs.tests.record', timeout=60, max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@job('jobs.tests.fail', timeout=60, max_attempts=2)
+def fail():
+    raise RuntimeError("boom")
+
+
+@override_settings(JOBS_RETRY_DELAY=10, JOBS_RETENTION_DAYS=7)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue(self):
+        with self.assertRaises(LookupError):
+            enqueue('jobs.tests.missing')
+
+        first = enqueue('jobs.tests.record', key='same', value=1)
+        self.assertEqual(enqueue('jobs.tests.record', key='same', value=2), first)
+        enqueue('jobs.tests.record', value=3)
+        self.assertEqual(Job.objects.count(), 2)
+
+        self.assertEqual(run_pending_jobs(), 2)
+        self.assertEqual(calls, [1, 3])
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+    def test_rollback(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue('jobs.tests.record', value=1)
+            raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_lease(self):
+        queued = enqueue('jobs.tests.record', value=1)
+        now = timezone.now()
+        enqueue('jobs.tests.record', run_after=now + datetime.timedelta(minutes=1), value=2)
+
+        [claimed] = claim_jobs(10, now=now)
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (queued.pk, Job.RUNNING, 1))
+        self.assertEqual(claimed.run_after, now + datetime.timedelta(seconds=60))
+        self.assertEqual(claim_jobs(10, now=now), [])
+
+        # The worker died: once the lease expires, the job is claimed again
+        [reclaimed] = claim_jobs(1, now=now + datetime.timedelta(seconds=61))
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (queued.pk, 2))
+        # The first worker lost its lease and can't record the outcome
+        run_job(claimed)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.RUNNING)
+        self.assertTrue(run_job(reclaimed))
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.DONE)
+
+    def test_busy_key(self):
+        enqueue('jobs.tests.record', key='same', value=1)
+        now = timezone.now()
+        [running] = claim_jobs(1, now=now)
+        # Queueing the key again is allowed while it runs, but waits for it
+        enqueue('jobs.tests.record', key='same', value=2)
+        self.assertEqual(claim_jobs(1, now=now), [])
+        run_job(running)
+        [claimed] = claim_jobs(1, now=timezone.now())
+        self.assertEqual(claimed.payload, {'value': 2})
+
+    def test_expired_lease_and_queued_key(self):
+        enqueue('jobs.tests.record', key='same', value=1)
+        [running] = claim_jobs(1)
+        enqueue('jobs.tests.record', key='same', value=2)
+        # Both are available once the lease expires, but only one may run
+        later = running.run_after + datetime.timedelta(seconds=1)
+        self.assertEqual(len(claim_jobs(10, now=later)), 1)
+        self.assertEqual(claim_jobs(10, now=later), [])
+
+    def test_lease_expired_on_last_attempt(self):
+        crashing = enqueue('jobs.tests.record', value=1)
+        now = timezone.now()
+        for attempt in (1, 2):
+            [claimed] = claim_jobs(1, now=now)
+            self.assertEqual(claimed.attempts, attempt)
+            # The worker died without recording anything
+            now = claimed.run_after + datetime.timedelta(seconds=1)
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(claim_jobs(1, now=now), [])
+        crashing.refresh_from_db()
+        self.assertEqual((crashing.status, crashing.attempts), (Job.FAILED, 2))
+        self.assertEqual(calls, [])
+
+    def test_retries(self):
+        self.assertEqual([retry_delay(attempts) for attempts in (1, 2, 3)], [10, 20, 40])
+        failing = enqueue('jobs.tests.fail')
+
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertEqual(run_pending_jobs(), 1)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError: boom', failing.last_error)
+        self.assertGreater(failing.run_after, timezone.now() + datetime.timedelta(seconds=9))
+        # Not due yet
+        self.assertEqual(run_pending_jobs(), 0)
+
+        [claimed] = claim_jobs(1, now=failing.run_after)
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertFalse(run_job(claimed))
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.FAILED, 2))
+
+    def test_unknown_handler(self):
+        orphan = Job.objects.create(name='jobs.tests.removed')
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(claim_jobs(1), [])
+        self.assertEqual(Job.objects.get(pk=orphan.pk).status, Job.FAILED)
+
+    def test_prune(self):
+        now = timezone.now()
+        old = now - datetime.timedelta(days=8)
+        Job.objects.bulk_create([
+            Job(name='jobs.tests.record', status=Job.DONE, run_after=old),
+            Job(name='jobs.tests.record', status=Job.FAILED, run_after=old),
+            Job(name='jobs.tests.record', status=Job.DONE, run_after=now),
+            Job(name='jobs.tests.record', status=Job.QUEUED, run_after=old),
+        ])
+        self.assertEqual(prune_jobs(now=now), 2)
+        self.assertEqual(
+            sorted(Job.objects.values_list('status', flat=True)), [Job.DONE, Job.QUEUED],
+        )
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    # The worker's threads use their own connections: the jobs must be committed
+    def setUp(self):
+        calls.clear()
+
+    def test_command(self):
+        enqueue('jobs.tests.record', value=1)
+        enqueue('jobs.tests.record', value=2)
+        stdout = io.StringIO()
+        call_command('run_jobs', threads=1, once=True, stdout=stdout)
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertIn('Processed 2 job(s)', stdout.getvalue())
@@ -0,0 +1,79 @@
+"""
+The ``manage.py run_jobs`` worker: claims jobs and runs them on a thread pool.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import close_old_connections
+
+from .queue import claim_jobs, prune_jobs, run_job
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two prune_jobs() passes
+PRUNE_INTERVAL = 3600
+
+
+def _run_in_thread(job):
+    # Each pool thread has its own connections: drop broken or expired ones
+    close_old_connections()
+    try:
+        return run_job(job)
+    except Exception:
+        # Recording the outcome failed (e.g. the database went away); the
+        # lease expires and another attempt picks the job up
+        logger.exception("Job %s (%s) could not be completed", job.pk, job.name)
+        return False
+    finally:
+        close_old_connections()
+
+
+class Worker:
+    """
+    Run jobs on ``threads`` threads, polling for new ones every
+    ``poll_interval`` seconds while idle. ``stop()`` (from a signal handler
+    or another thread) lets running jobs finish, then ``run()`` returns.
+    """
+
+    def __init__(self, threads, poll_interval):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.pruned_at = 0.0
+        self.processed = 0
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self, once=False):
+        """Process jobs until stopped; with ``once``, until the queue is empty"""
+        running = set()
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='job') as pool:
+            try:
+                while not self.stopping.is_set():
+                    self.prune()
+                    jobs = claim_jobs(self.threads - len(running)) if len(running) < self.threads else []
+                    running.update(pool.submit(_run_in_thread, job) for job in jobs)
+                    if once and not running:
+                        break
+                    if jobs and len(running) < self.threads:
+                        continue
+                    if running:
+                        done, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                        self.processed += len(done)
+                    else:
+                        self.stopping.wait(self.poll_interval)
+            finally:
+                done, _ = wait(running)
+                self.processed += len(done)
+        return self.processed
+
+    def prune(self):
+        if time.monotonic() - self.pruned_at < PRUNE_INTERVAL:
+            return
+        self.pruned_at = time.monotonic()
+        deleted = prune_jobs()
+        if deleted:
+            logger.info("Deleted %s finished job(s)", deleted)
@@ -0,0 +1,79 @@
+"""
+Environment driven cache configuration.
+
+``CACHE_BACKEND`` selects the backend of the default cache:
+
+    locmem (default)  per-process memory, bounded by CACHE_MAX_ENTRIES
+    file              CACHE_LOCATION directory shared by the processes of one host
+    redis             CACHE_LOCATION URL (needs the ``redis`` package)
+    dummy             no caching
+
+``CACHE_TIMEOUT`` is the default entry lifetime in seconds.
+
+The task statistics and response caches (``TASK_STATS_CACHE_TIMEOUT`` and
+``TASK_RESPONSE_CACHE_TIMEOUT``) are invalidated by deleting or versioning
+keys in this cache, which other processes only see with a shared backend:
+they are off with locmem, and setting them is refused (see
+invalidated_cache_timeout).
+"""
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .db import env_int
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def cache_config(env=os.environ):
+    """Return the ``CACHES['default']`` dict described by ``env``"""
+    backend = env.get('CACHE_BACKEND', 'locmem').lower()
+    if backend not in CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f"CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}, got {backend!r}"
+        )
+
+    config = {
+        'BACKEND': CACHE_BACKENDS[backend],
+        'TIMEOUT': env_int(env, 'CACHE_TIMEOUT', 300),
+    }
+    if backend == 'locmem':
+        config['LOCATION'] = env.get('CACHE_LOCATION', 'task-management')
+    elif backend == 'file':
+        config['LOCATION'] = env.get('CACHE_LOCATION') or os.path.join(tempfile.gettempdir(), 'task_management_cache')
+    elif backend == 'redis':
+        config['LOCATION'] = env.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/0')
+
+    if backend in ('locmem', 'file'):
+        # Culls a third of the entries once the limit is reached
+        config['OPTIONS'] = {'MAX_ENTRIES': env_int(env, 'CACHE_MAX_ENTRIES', 10000)}
+    return config
+
+
+def cache_is_shared(config):
+    """Whether every process sees the entries of the cache described by ``config``"""
+    return config['BACKEND'] != CACHE_BACKENDS['locmem']
+
+
+def invalidated_cache_timeout(env, name, config, default=300):
+    """
+    Return the ``name`` timeout in seconds (0 disables that cache) of a cache
+    kept in ``config`` and invalidated when the data changes.
+
+    Web workers, job workers and management commands would each invalidate
+    their own copy of a process-local cache and serve stale entries from the
+    others until the timeout, so such caches are off with locmem.
+    """
+    if cache_is_shared(config):
+        return env_int(env, name, default)
+    if env_int(env, name, 0):
+        raise ImproperlyConfigured(
+            f"{name} needs a cache shared by every process: set CACHE_BACKEND to file or redis"
+        )
+    return 0
@@ -0,0 +1,370 @@
+"""
+Request metrics in the Prometheus text format, served from ``/metrics``.
+
+MetricsMiddleware records, per route (the matched URL pattern) and method:
+
+    http_requests_total{status}            counter
+    http_requests_in_progress              gauge
+    http_request_duration_seconds          histogram
+    http_request_db_queries_total          counter
+    http_request_db_seconds                histogram
+    http_request_serialization_seconds     histogram
+
+Database time is measured by an execute wrapper installed on every
+connection (see install_db_timer); serialization time covers the task
+serializers' ``.data`` and JSON rendering (see track_serialization).
+
+Every process counts on its own. With ``METRICS_DIR`` set, each process
+writes its counts to ``<METRICS_DIR>/<start time>-<pid>.json`` at most every
+``METRICS_FLUSH_INTERVAL`` seconds, and ``/metrics`` adds up the files of
+all processes, so any worker answering the scrape reports the whole server.
+The start time keeps a worker that gets the PID of an exited one from
+overwriting its file. Use one directory per deployment and empty it when the
+server starts, like prometheus_client's multiprocess mode. The counts of
+exited workers are kept; their in-progress gauges are dropped, unless their
+PID has been reused by a live process. Without ``METRICS_DIR`` (a single
+process), ``/metrics`` reports the serving process only.
+
+The metrics are off unless ``METRICS_ENABLED`` is set, and outside DEBUG
+they also need ``METRICS_TOKEN``: /metrics shows the server's routes and
+traffic to whoever can read it.
+
+Streaming responses (exports, event streams) are measured until the
+response is returned, not until the stream ends.
+"""
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LABELS = ('route', 'method')
+
+METRICS = {
+    'http_requests_total': (
+        'counter', 'HTTP requests handled.', LABELS + ('status',)),
+    'http_requests_in_progress': (
+        'gauge', 'HTTP requests being handled.', LABELS),
+    'http_request_duration_seconds': (
+        'histogram', 'Time taken to produce the response.', LABELS),
+    'http_request_db_queries_total': (
+        'counter', 'SQL queries run by requests.', LABELS),
+    'http_request_db_seconds': (
+        'histogram', 'Time per request spent running SQL queries.', LABELS),
+    'http_request_serialization_seconds': (
+        'histogram', 'Time per request spent serializing and rendering API data.', LABELS),
+}
+
+# Anything else is counted as "other", to bound the number of series
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Thread-safe counters, gauges and histograms keyed by ``(name, labels)``"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = defaultdict(float)
+        # [observations per bucket, +Inf last] and the sum of the observations
+        self.histograms = {}
+        self.flushed_at = 0.0
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[name, labels] += amount
+
+    def add(self, name, labels, amount):
+        with self.lock:
+            self.gauges[name, labels] += amount
+
+    def observe(self, name, labels, value):
+        index = bisect.bisect_left(BUCKETS, value)
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = [[0] * (len(BUCKETS) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, labels, value] for (name, labels), value in self.gauges.items()],
+                'histograms': [
+                    [name, labels, list(counts), total] for (name, labels), (counts, total) in self.histograms.items()
+                ],
+            }
+
+    def merge(self, snapshot, gauges=True):
+        """Add the values of another process' ``snapshot()`` to this registry"""
+        for name, labels, value in snapshot['counters']:
+            self.inc(name, tuple(labels), value)
+        if gauges:
+            for name, labels, value in snapshot['gauges']:
+                self.add(name, tuple(labels), value)
+        for name, labels, counts, total in snapshot['histograms']:
+            with self.lock:
+                histogram = self.histograms.setdefault((name, tuple(labels)), [[0] * (len(BUCKETS) + 1), 0.0])
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+
+    def flush(self, directory):
+        """Write this process' snapshot to ``directory``, atomically replacing the previous one"""
+        self.flushed_at = time.monotonic()
+        path = Path(directory) / f'{process_name}.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f'{process_name}.{threading.get_ident()}.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+    def render(self):
+        """Return the registry in the Prometheus text exposition format"""
+        with self.lock:
+            series = {
+                'counter': dict(self.counters),
+                'gauge': dict(self.gauges),
+                'histogram': {key: (list(counts), total) for key, (counts, total) in self.histograms.items()},
+            }
+
+        lines = []
+        for name, (kind, help_text, label_names) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (series_name, labels), value in sorted(series[kind].items()):
+                if series_name != name:
+                    continue
+                label_text = format_labels(label_names, labels)
+                if kind != 'histogram':
+                    lines.append(f'{name}{{{label_text}}} {format_value(value)}')
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label_text}}} {format_value(total)}')
+                lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(names, values):
+    escaped = (
+        str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+        for value in values
+    )
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def format_value(value):
+    return repr(float(value))
+
+
+def pid_alive(pid):
+    if pid == os.getpid() or os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(directory):
+    """Return a Registry adding up the snapshots of every process in ``directory``"""
+    merged = Registry()
+    for path in Path(directory).glob('*.json'):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        merged.merge(snapshot, gauges=pid_alive(snapshot['pid']))
+    return merged
+
+
+def new_process_name():
+    return f'{time.time_ns()}-{os.getpid()}'
+
+
+# Name of this process' METRICS_DIR file
+process_name = new_process_name()
+
+
+def _renamed_after_fork():
+    # Workers forked from a preloaded application get their own start time
+    global process_name
+    process_name = new_process_name()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_renamed_after_fork)
+
+registry = Registry()
+
+# METRICS_DIR directories the registry is written to when the process exits
+_flushed_at_exit = set()
+
+
+class RequestMetrics:
+    """Database and serialization time of the request being handled"""
+    __slots__ = ('db_queries', 'db_time', 'serialization_time')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+
+
+# Follows the request into sync_to_async threads and async tasks
+current_request = contextvars.ContextVar('current_request_metrics', default=None)
+
+
+def db_timer(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.db_queries += 1
+
+
+def install_db_timer(sender, connection, **kwargs):
+    """connection_created receiver adding db_timer to every database connection"""
+    if db_timer not in connection.execute_wrappers:
+        # First, so temporary execute_wrapper() blocks pop their own wrapper
+        connection.execute_wrappers.insert(0, db_timer)
+
+
+@contextmanager
+def track_serialization():
+    """Count the time spent in the block as the current request's serialization time"""
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_time += time.perf_counter() - start
+
+
+def route_labels(request):
+    match = getattr(request, 'resolver_match', None)
+    route = f'/{match.route}' if match is not None else 'unmatched'
+    method = request.method if request.method in METHODS else 'other'
+    return (route, method)
+
+
+class MetricsMiddleware:
+    """
+    Record the request metrics described in the module docstring. Enabled
+    by the ``METRICS_ENABLED`` setting; put it first in MIDDLEWARE.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        if not settings.DEBUG and not getattr(settings, 'METRICS_TOKEN', ''):
+            raise ImproperlyConfigured("METRICS_ENABLED needs a METRICS_TOKEN outside DEBUG")
+        self.get_response = get_response
+        self.directory = getattr(settings, 'METRICS_DIR', None)
+        self.flush_interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1)
+        if self.directory and self.directory not in _flushed_at_exit:
+            _flushed_at_exit.add(self.directory)
+            atexit.register(registry.flush, self.directory)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current_request.reset(token)
+            self.record(request, status, time.perf_counter() - start, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current_request.reset(token)
+            self.record(request, status, time.perf_counter() - start, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The route is only known once the URL is resolved
+        request._metrics_labels = route_labels(request)
+        registry.add('http_requests_in_progress', request._metrics_labels, 1)
+
+    def record(self, request, status, duration, metrics):
+        labels = getattr(request, '_metrics_labels', None)
+        if labels is not None:
+            registry.add('http_requests_in_progress', labels, -1)
+        else:
+            labels = route_labels(request)
+
+        registry.inc('http_requests_total', labels + (str(status),))
+        registry.observe('http_request_duration_seconds', labels, duration)
+        registry.inc('http_request_db_queries_total', labels, metrics.db_queries)
+        registry.observe('http_request_db_seconds', labels, metrics.db_time)
+        registry.observe('http_request_serialization_seconds', labels, metrics.serialization_time)
+
+        if self.directory and time.monotonic() - registry.flushed_at >= self.flush_interval:
+            registry.flush(self.directory)
+
+
+@require_GET
+def metrics_view(request):
+    """GET /metrics - Request metrics of every worker, in the Prometheus text format"""
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        registry.flush(directory)
+        exposition = collect(directory).render()
+    else:
+        exposition = registry.render()
+    return HttpResponse(exposition, content_type=CONTENT_TYPE)
@@ -0,0 +1,37 @@
+try:
+    import orjson
+except ImportError:  # optional, fall back to DRF's stdlib json parser
+    orjson = None
+
+import io
+import re
+
+from rest_framework.parsers import JSONParser
+
+# Integers of 20 digits or more may not fit in 64 bits, which orjson reads
+# as floats (losing precision) where json keeps them exact
+WIDE_INTEGER = re.compile(rb'\d{20}')
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser backed by orjson when it's installed (UTF-8 bodies only).
+
+    Parses to the same values as JSONParser: bodies with integers wider than
+    64 bits, and bodies orjson rejects but json may accept (lone surrogates,
+    floats out of range), are handed to JSONParser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if not WIDE_INTEGER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,156 @@
+"""
+Per-request SQL accounting for development and tests.
+
+QueryInspectorMiddleware (enabled by the ``QUERY_INSPECTOR`` setting, on
+with DEBUG by default) counts the queries each request runs, their total
+time and the query templates executed more than once, then reports them as
+response headers:
+
+    X-DB-Query-Count         queries run by the request
+    X-DB-Query-Time-Ms       time spent in the database, in milliseconds
+    X-DB-Duplicate-Queries   executions repeating an earlier query template
+
+and on the ``task_project.queries`` logger. A template repeated
+``QUERY_INSPECTOR_DUPLICATE_THRESHOLD`` times or more (default 3) is logged
+as a warning: that's the signature of an N+1 loop.
+
+Templates are the SQL with its parameters left out and ``IN (...)`` lists
+collapsed, so ``WHERE id = 1`` and ``WHERE id = 2`` count as the same query.
+
+The middleware works under WSGI and ASGI. Queries are attributed to the
+request through a context variable read by an execute wrapper installed on
+every connection (see install_query_recorder), so the queries async views
+run in sync_to_async threads are counted too.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, ?(?:%s|\?))*\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def query_template(sql):
+    """Return ``sql`` with placeholder lists of any length collapsed and whitespace normalised"""
+    return WHITESPACE.sub(' ', IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class QueryRecorder:
+    """
+    A database execute wrapper (see ``connection.execute_wrapper``) recording
+    the template and duration of every query it sees.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((query_template(sql), time.perf_counter() - start))
+
+    def record(self, using=None):
+        """Context manager recording the queries of ``using`` (default every connection)"""
+        stack = ExitStack()
+        aliases = [using] if using is not None else connections
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self, threshold=2):
+        """Return ``{template: executions}`` of the templates run at least ``threshold`` times"""
+        counts = Counter(template for template, _ in self.queries)
+        return {template: count for template, count in counts.items() if count >= threshold}
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.duplicates().values())
+
+
+# The recorder of the request being handled, if QueryInspectorMiddleware is on.
+# Follows the request into sync_to_async threads and async tasks.
+current_recorder = contextvars.ContextVar('current_query_recorder', default=None)
+
+
+def record_request_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding record_request_query to every database connection"""
+    if record_request_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_request_query)
+
+
+class QueryInspectorMiddleware:
+    """
+    Report the SQL run by each request; see the module docstring. Queries
+    run while a streaming response is consumed aren't counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSPECTOR', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_INSPECTOR_DUPLICATE_THRESHOLD', 3)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        response['X-DB-Query-Count'] = str(recorder.count)
+        response['X-DB-Query-Time-Ms'] = f'{recorder.duration * 1000:.2f}'
+        response['X-DB-Duplicate-Queries'] = str(recorder.duplicate_count)
+
+        logger.debug(
+            '%s %s: %d queries in %.2f ms, %d duplicated',
+            request.method, request.path, recorder.count, recorder.duration * 1000, recorder.duplicate_count,
+        )
+        for template, count in recorder.duplicates(self.threshold).items():
+            logger.warning('Possible N+1 in %s %s: query run %d times: %s', request.method, request.path, count, template)
+        return response
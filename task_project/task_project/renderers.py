@@ -0,0 +1,52 @@
+try:
+    import orjson
+except ImportError:  # optional, fall back to DRF's stdlib json renderer
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import track_serialization
+
+# orjson formats datetimes, dates and dataclasses its own way: hand them to
+# DRF's encoder instead so the output matches JSONRenderer's
+ORJSON_OPTIONS = (
+    (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS)
+    if orjson else 0
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it's installed.
+
+    Output is the same as JSONRenderer's compact UTF-8 form; types orjson
+    doesn't handle natively (Decimal, lazy strings, querysets, ...) go through
+    DRF's JSONEncoder. Indented output and values orjson rejects (e.g.
+    integers wider than 64 bits) fall back to JSONRenderer. Two differences
+    remain:
+
+    - floats written with an exponent lose the ``+`` and leading zeros of
+      Python's spelling (``1e16``, ``1e-7`` for ``1e+16``, ``1e-07``); the
+      values are the same.
+    - NaN and infinities render as ``null``, where JSONRenderer (with
+      STRICT_JSON, the default) raises ValueError and fails the request.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track_serialization():
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Like JSONRenderer: escape the separators that are invalid in JavaScript strings
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from .cache import cache_config, invalidated_cache_timeout
+from .db import database_config, env_bool
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,14 +43,20 @@ INSTALLED_APPS = [
     'rest_framework',
     'accounts.apps.AccountsConfig',
     'tasks',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    # Per-route request metrics served from /metrics (see task_project/metrics.py)
+    'task_project.metrics.MetricsMiddleware',
+    # Query count / time / N+1 headers; a no-op unless QUERY_INSPECTOR is on
+    'task_project.queries.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,14 +85,24 @@ WSGI_APPLICATION = 'task_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite by default; set DB_ENGINE=postgres for production (see task_project/db.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
+}
+
+
+# Local memory by default; see task_project/cache.py for file and Redis
+CACHES = {
+    'default': cache_config(),
 }
 
 
+# Load session users together with their Profile (see accounts.backends)
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.ProfileModelBackend',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -127,10 +146,88 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ProfileJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson backed when installed, otherwise the same as DRF's JSON classes
+    'DEFAULT_RENDERER_CLASSES': (
+        'task_project.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'task_project.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
-LOGIN_URL = '/'
\ No newline at end of file
+
+SIMPLE_JWT = {
+    # Embed role / assigned_admin claims in issued tokens
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.RoleTokenObtainPairSerializer',
+}
+
+# Seconds for which read-only API requests trust a token's role claims
+# instead of loading the user and profile (0 always loads them)
+JWT_ROLE_CLAIMS_MAX_AGE = 300
+
+LOGIN_URL = '/'
+
+# Seconds to cache each user's task statistics block (0 disables caching).
+# Both caches need a shared CACHE_BACKEND and are off with locmem.
+TASK_STATS_CACHE_TIMEOUT = invalidated_cache_timeout(os.environ, 'TASK_STATS_CACHE_TIMEOUT', CACHES['default'])
+
+# Seconds to cache task list and report payloads (0 disables caching, see tasks.caching)
+TASK_RESPONSE_CACHE_TIMEOUT = invalidated_cache_timeout(os.environ, 'TASK_RESPONSE_CACHE_TIMEOUT', CACHES['default'])
+
+# Days deletions are kept for ?since= delta sync; older watermarks get 410 Gone
+TASK_TOMBSTONE_RETENTION_DAYS = 30
+
+# Open tasks due within this many days are listed as due soon (tasks.due)
+TASK_DUE_SOON_DAYS = 3
+
+# Serialize task lists from values() rows (tasks.serializers.TaskRowSerializer)
+# instead of TaskSerializer; the JSON output is identical
+TASK_FAST_SERIALIZER = True
+
+# Request metrics for /metrics, off by default. Multi-process servers need
+# METRICS_DIR, a directory shared by the workers (emptied on start) where
+# each one writes its counts every METRICS_FLUSH_INTERVAL seconds.
+# METRICS_TOKEN must be sent as "Authorization: Bearer <token>" to read
+# /metrics; outside DEBUG the metrics refuse to start without one.
+METRICS_ENABLED = env_bool(os.environ, 'METRICS_ENABLED', False)
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Report the SQL each request runs in X-DB-* headers and the
+# task_project.queries log (see task_project/queries.py); never in production
+QUERY_INSPECTOR = env_bool(os.environ, 'QUERY_INSPECTOR', DEBUG)
+
+# Log a warning when one query template runs this many times in a request
+QUERY_INSPECTOR_DUPLICATE_THRESHOLD = 3
+
+# Background jobs (jobs.queue), run by "manage.py run_jobs". A claimed job
+# is leased for JOBS_VISIBILITY_TIMEOUT seconds (unless its handler sets its
+# own timeout) before another worker may take it over; failures are retried
+# JOBS_MAX_ATTEMPTS times in all, waiting JOBS_RETRY_DELAY seconds, doubled
+# on each retry. Finished jobs are deleted after JOBS_RETENTION_DAYS.
+JOBS_WORKER_THREADS = 4
+JOBS_POLL_INTERVAL = 1
+JOBS_VISIBILITY_TIMEOUT = 300
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_RETENTION_DAYS = 7
+
+# Completion notifications go to the assigned admin by email
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'tasks@localhost')
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND',
+    'django.core.mail.backends.console.EmailBackend' if DEBUG else 'django.core.mail.backends.smtp.EmailBackend',
+)
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+
+# Where background exports (POST /api/admin/tasks/exports/) are written
+TASK_EXPORT_DIR = os.environ.get('TASK_EXPORT_DIR') or str(BASE_DIR / 'exports')
@@ -0,0 +1,33 @@
+"""
+Test helpers shared by the app test suites.
+"""
+from contextlib import contextmanager
+
+from .queries import QueryRecorder
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting that a block of code stays within a query
+    budget. Unlike assertNumQueries, any count up to the budget passes; the
+    failure message lists the queries run, repeated templates first.
+
+        with self.assertQueryBudget(4):
+            self.client.get('/profile/')
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, using='default'):
+        recorder = QueryRecorder()
+        with recorder.record(using):
+            yield recorder
+        if recorder.count <= budget:
+            return
+
+        duplicates = recorder.duplicates()
+        lines = [f'{count}x {template}' for template, count in sorted(duplicates.items(), key=lambda item: -item[1])]
+        lines += [template for template, _ in recorder.queries if template not in duplicates]
+        self.fail(
+            f'{recorder.count} queries run, budget is {budget}:\n'
+            + '\n'.join(f'  {line}' for line in lines)
+        )
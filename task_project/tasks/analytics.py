@@ -0,0 +1,129 @@
+"""
+Worked hours analytics, read from the WorkedHoursRollup table.
+
+Reports never touch the tasks table: each row of a report is one rollup row
+(per user) or one aggregate over the rollup rows of a team (users sharing
+an assigned admin). Teams are taken as they are now, so moving a user to
+another admin moves their history with them.
+"""
+import datetime
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import WorkedHoursRollup, period_start
+
+GROUPS = ('user', 'team')
+
+# Default report length, and the longest allowed, in periods
+DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12}
+MAX_PERIODS = {'day': 366, 'week': 260, 'month': 120}
+
+
+def aggregate_worked_hours(tasks):
+    """Compute (unsaved) WorkedHoursRollup rows for the completed tasks of the ``tasks`` queryset"""
+    days = (
+        tasks.filter(status='completed', completed_at__isnull=False)
+        .annotate(day=TruncDate('completed_at'))
+        .values('user_id', 'day')
+        .annotate(completed_tasks=Count('id'), hours=Sum('worked_hours'))
+        .order_by()
+    )
+    buckets = defaultdict(Counter)
+    for row in days.iterator():
+        for period in WorkedHoursRollup.PERIODS:
+            bucket = buckets[row['user_id'], period, period_start(row['day'], period)]
+            bucket['completed_tasks'] += row['completed_tasks']
+            bucket['hours'] += row['hours'] or 0
+    return [
+        WorkedHoursRollup(
+            user_id=user_id, period=period, period_start=start,
+            completed_tasks=bucket['completed_tasks'], hours=bucket['hours'],
+        )
+        for (user_id, period, start), bucket in buckets.items()
+    ]
+
+
+def _count_periods(start, end, period):
+    if period == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    days = (end - start).days + 1
+    return -(-days // 7) if period == 'week' else days
+
+
+def parse_report_params(params):
+    """Validate the ``period``, ``from``, ``to`` and ``group`` query parameters"""
+    period = params.get('period', 'week')
+    if period not in WorkedHoursRollup.PERIODS:
+        raise ValidationError({'period': [f"Expected one of: {', '.join(WorkedHoursRollup.PERIODS)}."]})
+    group = params.get('group', 'user')
+    if group not in GROUPS:
+        raise ValidationError({'group': [f"Expected one of: {', '.join(GROUPS)}."]})
+
+    dates = {}
+    for name in ('from', 'to'):
+        value = params.get(name)
+        if value:
+            try:
+                dates[name] = parse_date(value)
+            except ValueError:
+                # Well formed but not a real date, e.g. 2024-02-30
+                dates[name] = None
+            if dates[name] is None:
+                raise ValidationError({name: ["Expected a YYYY-MM-DD date."]})
+
+    end = dates.get('to') or timezone.localdate()
+    if 'from' in dates:
+        start = period_start(dates['from'], period)
+    else:
+        start = end
+        for _ in range(DEFAULT_PERIODS[period] - 1):
+            start = period_start(start, period) - datetime.timedelta(days=1)
+        start = period_start(start, period)
+
+    if start > end:
+        raise ValidationError({'from': ["Must not be after 'to'."]})
+    if _count_periods(start, end, period) > MAX_PERIODS[period]:
+        raise ValidationError({'from': [f"Reports span at most {MAX_PERIODS[period]} {period}s."]})
+    return period, start, end, group
+
+
+def worked_hours_report(period, start, end, group='user', team=None, user_id=None):
+    """
+    Return the rows of a worked hours report, oldest period first.
+
+    ``team`` limits it to the users assigned to that admin (id), ``user_id``
+    to one user.
+    """
+    rollups = WorkedHoursRollup.objects.filter(period=period, period_start__range=(start, end))
+    if team is not None:
+        rollups = rollups.filter(user__profile__assigned_admin_id=team)
+    if user_id is not None:
+        rollups = rollups.filter(user_id=user_id)
+
+    if group == 'team':
+        rows = (
+            rollups.values('period_start', team=F('user__profile__assigned_admin_id'),
+                           team_username=F('user__profile__assigned_admin__username'))
+            .annotate(completed_tasks=Sum('completed_tasks'), hours=Sum('hours'))
+            # Users without an admin last
+            .order_by('period_start', F('team').asc(nulls_last=True))
+        )
+        return [dict(row, hours=round(row['hours'], 2)) for row in rows if row['completed_tasks']]
+
+    rows = (
+        rollups.exclude(completed_tasks=0)
+        .values_list('period_start', 'user_id', 'user__username', 'completed_tasks', 'hours')
+        .order_by('period_start', 'user_id')
+    )
+    return [
+        {
+            'period_start': start, 'user': user_id, 'username': username,
+            'completed_tasks': completed_tasks, 'hours': round(hours, 2),
+        }
+        for start, user_id, username, completed_tasks, hours in rows
+    ]
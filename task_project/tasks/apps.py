@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        import tasks.jobs
+        import tasks.signals
+        from task_project.db import configure_sqlite_connection
+        from task_project.metrics import install_db_timer
+        from task_project.queries import install_query_recorder
+        from tasks.search import restore_search_triggers
+
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='configure_sqlite_connection')
+        connection_created.connect(install_db_timer, dispatch_uid='install_db_timer')
+        connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
+        post_migrate.connect(restore_search_triggers, sender=self, dispatch_uid='restore_search_triggers')
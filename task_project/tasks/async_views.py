@@ -0,0 +1,174 @@
+"""
+Async versions of the hot task API endpoints.
+
+DRF 3.14 views are synchronous, so these are plain Django async views that
+reuse the DRF serializers and the JWT authentication classes but query the
+database through the async ORM. Under ASGI a request waiting on the
+database no longer holds a worker thread.
+"""
+import asyncio
+import functools
+import json
+
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions, status
+
+from .events import broker, format_sse
+from .models import Task
+from .pagination import TaskCursorPagination
+from .serializers import TaskCompleteSerializer, TaskSerializer, task_read_serializer
+from accounts.authentication import RoleClaimsJWTAuthentication
+from accounts.permissions import ADMIN_ROLES, HasRole, get_role
+
+# Seconds between comment lines keeping idle event streams (and proxies) alive
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def error_response(exc, request, authenticator):
+    """Render an APIException the way DRF's default exception handler does"""
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+        response.status_code = status.HTTP_401_UNAUTHORIZED
+    return response
+
+
+def async_api_view(methods=('GET',), roles=None):
+    """
+    Wrap an async view with JWT authentication and an optional role check.
+
+    ``request.user`` is set from RoleClaimsJWTAuthentication (a ClaimsUser for
+    reads with fresh claims). APIExceptions and Http404 become JSON responses.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+
+            authenticator = RoleClaimsJWTAuthentication()
+            try:
+                result = await authenticator.aauthenticate(request)
+                if result is None:
+                    raise exceptions.NotAuthenticated()
+                request.user, request.auth = result
+                if roles is not None and get_role(request.user) not in roles:
+                    raise exceptions.PermissionDenied(HasRole.message)
+                return await view(request, *args, **kwargs)
+            except Http404:
+                return error_response(exceptions.NotFound(), request, authenticator)
+            except exceptions.APIException as exc:
+                return error_response(exc, request, authenticator)
+
+        # Token authenticated, like DRF's APIView. csrf_exempt() itself only
+        # wraps sync views before Django 5.0.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def paginated_tasks(request, queryset):
+    fields = TaskSerializer.requested_fields(request)
+    serializer_class = task_read_serializer()
+    queryset = serializer_class.optimize_queryset(queryset, fields)
+
+    paginator = TaskCursorPagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, fields=fields)
+    return JsonResponse({
+        'next': paginator.get_next_link(),
+        'results': serializer.data,
+    })
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+@async_api_view()
+async def user_tasks(request):
+    """GET /api/async/tasks/ - Async UserTasksView"""
+    return await paginated_tasks(request, Task.objects.filter(user_id=request.user.id))
+
+
+@async_api_view(roles=ADMIN_ROLES)
+async def task_list(request):
+    """GET /api/async/admin/tasks/ - Async TaskListView (admin only)"""
+    return await paginated_tasks(request, Task.objects.all())
+
+
+@async_api_view(roles=ADMIN_ROLES)
+async def task_report(request, id):
+    """GET /api/async/admin/tasks/<id>/report/ - Async TaskReportView (admin only)"""
+    task = await aget_object_or_404(Task.objects.select_related('user'), id=id, status='completed')
+    return JsonResponse(TaskSerializer(task).data)
+
+
+@async_api_view(methods=('PUT', 'PATCH'))
+async def update_task_status(request, id):
+    """PUT /api/async/tasks/<id>/ - Async UpdateTaskStatus"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError as exc:
+        raise exceptions.ParseError(f'JSON parse error - {exc}')
+
+    task = await aget_object_or_404(Task.objects.all(), id=id, user_id=request.user.id)
+    serializer = TaskCompleteSerializer(task, data=data, partial=True)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    for name, value in serializer.validated_data.items():
+        setattr(task, name, value)
+    # Task.save keeps UserTaskStats in step; asave runs it off the event loop
+    await task.asave()
+    return JsonResponse({"message": "Task updated successfully", "task": serializer.data})
+
+
+def event_scope(user):
+    """Return the broker scope of the task events ``user`` may see"""
+    role = get_role(user)
+    if role == 'superadmin':
+        return ('all',)
+    if role == 'admin':
+        return ('admin', user.id)
+    return ('user', user.id)
+
+
+async def stream_events(scope):
+    subscription = broker.subscribe(scope)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_sse(event)
+            if event['event'] == 'resync':
+                # Fell too far behind: the client refetches its list and reconnects
+                break
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@async_api_view()
+async def task_event_stream(request):
+    """
+    GET /api/async/tasks/events/ - Server-sent events for task changes
+
+    Emits ``created``, ``updated``, ``completed`` and ``deleted`` events
+    (``data`` is the task, or just its id for deletions) for the caller's own
+    tasks, the tasks of an admin's users, or every task for superadmins.
+    """
+    response = StreamingHttpResponse(stream_events(event_scope(request.user)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
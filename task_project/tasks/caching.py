@@ -0,0 +1,98 @@
+"""
+Cache of rendered task API payloads (lists and completed-task reports).
+
+Entries are keyed on the request path plus the current version of every
+scope they depend on: ``('user', id)`` for a user's own tasks, ``('all',)``
+for lists over every task and ``('task', id)`` for a single task. The
+signal receivers in tasks.signals bump those versions when a task or
+profile changes, which orphans the old entries; TTL and the cache
+backend's size limit (MAX_ENTRIES for locmem/file) evict them.
+
+A hit needs no database query at all: the entry also carries the
+validators (see tasks.conditional) so conditional requests still get 304s.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .conditional import Validators
+
+
+def response_cache_timeout():
+    return getattr(settings, 'TASK_RESPONSE_CACHE_TIMEOUT', 0)
+
+
+def scope_version_key(scope):
+    return 'task_response_version:' + ':'.join(str(part) for part in scope)
+
+
+def scope_versions(scopes):
+    keys = [scope_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock rather than 1 so a version that was evicted
+            # never comes back to a value older entries were stored under
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_scope_versions(*scopes):
+    for scope in scopes:
+        key = scope_version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not cached yet: there are no entries under it to invalidate
+            pass
+
+
+def invalidate_task_responses(task_ids=(), user_ids=()):
+    """Drop cached payloads covering ``task_ids`` or the tasks of ``user_ids``"""
+    if not response_cache_timeout():
+        return
+    scopes = [('task', task_id) for task_id in set(task_ids) if task_id]
+    scopes += [('user', user_id) for user_id in set(user_ids) if user_id]
+    bump_scope_versions(('all',), *scopes)
+
+
+def response_cache_key(request, scopes):
+    versions = scope_versions(scopes)
+    raw = '|'.join([request.get_full_path()] + [
+        f"{':'.join(str(part) for part in scope)}={version}"
+        for scope, version in zip(scopes, versions)
+    ])
+    return 'task_payload:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached_task_response(request, scopes, get_validators, build_response):
+    """
+    Return the response for a task read endpoint, from the cache if possible.
+
+    ``get_validators()`` returns the request's Validators and
+    ``build_response()`` the full Response; neither is called on a cache hit.
+    Only 200 responses are stored.
+    """
+    timeout = response_cache_timeout()
+    key = response_cache_key(request, scopes) if timeout else None
+    entry = cache.get(key) if key else None
+
+    if entry is not None:
+        data, version = entry
+        validators = Validators(request, version)
+        response = validators.conditional_response(request) or Response(data)
+        return validators.apply(response)
+
+    validators = get_validators()
+    response = validators.conditional_response(request)
+    if response is not None:
+        return response
+
+    response = build_response()
+    if key and response.status_code == 200:
+        cache.set(key, (response.data, validators.version), timeout)
+    return validators.apply(response)
@@ -0,0 +1,65 @@
+"""
+ETag support for the task read APIs.
+
+Validators are computed without serializing anything: task collections use
+the UserTaskStats rows of the users in scope, single tasks their
+``updated_at``. Every task write increments its user's ``version`` inside
+its transaction, so the sum over the scope changes with each commit. A
+timestamp wouldn't do: a write that commits late can carry an earlier
+``last_activity_at`` than one already seen, leaving the newest unchanged.
+The row count covers users leaving the scope.
+
+There is no Last-Modified: HTTP dates have whole-second precision, so a
+client revalidating with If-Modified-Since alone would get a 304 for a
+write made later in the same second.
+"""
+import hashlib
+
+from django.db.models import Count, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .models import UserTaskStats
+
+
+class Validators:
+    def __init__(self, request, version):
+        self.version = version
+        # The representation also depends on who asks and on the query string
+        # (cursor, page size, sparse fields, since)
+        raw = f"{request.user.id}|{request.get_full_path()}|{version}"
+        self.etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def conditional_response(self, request):
+        """Return a 304 (or 412) response if the client's copy is current, else None"""
+        response = get_conditional_response(request, etag=self.etag)
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        # Per-user data: only private caches, and always revalidate
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+def stats_version(stats):
+    """Version of the tasks of the users of ``stats`` (a UserTaskStats queryset)"""
+    version = stats.aggregate(rows=Count('pk'), version=Sum('version'))
+    return f"{version['rows']}|{version['version'] or 0}"
+
+
+def task_list_validators(request, stats=None):
+    """
+    Validators for a task list covering the users of ``stats`` (a
+    UserTaskStats queryset, default every user). One aggregate query.
+    """
+    if stats is None:
+        stats = UserTaskStats.objects.all()
+    return Validators(request, stats_version(stats))
+
+
+def task_validators(request, task):
+    return Validators(request, f"{task.pk}|{task.updated_at}")
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+
+from .models import Task
+
+SUPERADMIN_USERS_PER_PAGE = 25
+SUPERADMIN_TASKS_PER_PAGE = 50
+
+PAGE_PARAMS = ('page', 'users_page')
+
+
+def parse_task_filters(params):
+    """
+    Read the dashboard filters from a query dict. Unknown statuses and
+    unparseable dates are dropped rather than rejected, like an empty field.
+    """
+    filters = {}
+    status = params.get('status', '')
+    if status in dict(Task.STATUS_CHOICES):
+        filters['status'] = status
+
+    username = params.get('user', '').strip()
+    if username:
+        filters['user'] = username
+
+    for name in ('due_from', 'due_to'):
+        try:
+            value = parse_date(params.get(name, ''))
+        except ValueError:
+            value = None
+        if value:
+            filters[name] = value
+    return filters
+
+
+def filter_tasks(queryset, filters):
+    if 'status' in filters:
+        queryset = queryset.filter(status=filters['status'])
+    if 'user' in filters:
+        queryset = queryset.filter(user__username=filters['user'])
+    if 'due_from' in filters:
+        queryset = queryset.filter(due_date__gte=filters['due_from'])
+    if 'due_to' in filters:
+        queryset = queryset.filter(due_date__lte=filters['due_to'])
+    return queryset
+
+
+def users_with_task_stats(queryset=None):
+    """Annotate users with the counters kept in their UserTaskStats row"""
+    if queryset is None:
+        queryset = User.objects.all()
+    return queryset.select_related('profile').annotate(
+        task_count=Coalesce('task_stats__total_tasks', 0),
+        pending_count=Coalesce('task_stats__pending_tasks', 0),
+        in_progress_count=Coalesce('task_stats__in_progress_tasks', 0),
+        completed_count=Coalesce('task_stats__completed_tasks', 0),
+        completed_hours=Coalesce('task_stats__total_hours', 0.0),
+    ).order_by('username')
+
+
+def superadmin_dashboard_context(request):
+    """
+    Build the superadmin dashboard: one page of filtered tasks and one page of
+    users with their task counters, each a single bounded query plus a COUNT.
+    """
+    filters = parse_task_filters(request.GET)
+    tasks = filter_tasks(Task.objects.select_related('user'), filters).order_by('-created_at', '-id')
+
+    # Keep the filters when following pagination links
+    params = request.GET.copy()
+    for name in PAGE_PARAMS:
+        params.pop(name, None)
+
+    return {
+        'tasks': Paginator(tasks, SUPERADMIN_TASKS_PER_PAGE).get_page(request.GET.get('page')),
+        'users': Paginator(users_with_task_stats(), SUPERADMIN_USERS_PER_PAGE).get_page(
+            request.GET.get('users_page')
+        ),
+        'filters': filters,
+        'status_choices': Task.STATUS_CHOICES,
+        'filter_query': params.urlencode(),
+    }
@@ -0,0 +1,236 @@
+"""
+Overdue and due-soon task detection.
+
+``manage.py scan_due_tasks`` (from cron, or as a worker with ``--every``)
+records the open tasks that are overdue or due within TASK_DUE_SOON_DAYS
+days as AtRiskTask rows. Each run only looks at new candidates, using the
+watermarks kept in DueScanState:
+
+``horizon``
+    The last due date covered. Open tasks due after it are picked up once
+    the horizon moves past them, by a range seek on task_status_due_idx;
+    completed history is never read.
+``scanned_at``
+    When the last run started. Tasks updated since (created, completed,
+    rescheduled, reassigned) are re-checked through task_updated_idx.
+
+Queryset update() skips ``updated_at``; ``scan_due_tasks --full`` rescans
+everything. Between runs the lists drop tasks that were completed,
+rescheduled or reassigned when they are read, so they only lag on tasks
+newly at risk.
+
+The lists are cached like the task lists (tasks.caching), under an extra
+``('at_risk', <today>)`` scope that each run bumps when something changed
+and that rolls over at midnight, when due-soon tasks become overdue.
+"""
+import base64
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from .caching import bump_scope_versions, response_cache_timeout
+from .conditional import Validators, stats_version
+from .models import AtRiskTask, DueScanState, Task
+from .pagination import TaskCursorPagination, row_value
+from .serializers import TaskSerializer, task_read_serializer
+
+OPEN_STATUSES = ('pending', 'in_progress')
+
+RISKS = ('overdue', 'due_soon')
+
+SCAN_NAME = 'due_tasks'
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Tasks saved by transactions still open when a run starts carry an
+# updated_at before it: re-check that far back
+UPDATE_OVERLAP = datetime.timedelta(minutes=5)
+
+
+def due_soon_days():
+    return getattr(settings, 'TASK_DUE_SOON_DAYS', 3)
+
+
+def due_horizon(today=None):
+    """Return the last due date counted as due soon"""
+    return (today or timezone.localdate()) + datetime.timedelta(days=due_soon_days())
+
+
+def at_risk_scope(today=None):
+    return ('at_risk', (today or timezone.localdate()).isoformat())
+
+
+def _keyset_chunks(queryset, fields, chunk_size):
+    """Yield values() rows of ``queryset`` ordered on ``fields`` (a column, then id), ``chunk_size`` at a time"""
+    column = fields[0]
+    queryset = queryset.order_by(column, 'id').values('id', *fields[1:], column)
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(
+                Q(**{f'{column}__gt': last[column]}) | Q(**{column: last[column], 'id__gt': last['id']})
+            )
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+
+
+def _record(rows, now):
+    """Upsert AtRiskTask rows for the task ``rows``; returns how many were written"""
+    AtRiskTask.objects.bulk_create(
+        [
+            AtRiskTask(task_id=row['id'], user_id=row['user_id'], due_date=row['due_date'], detected_at=now)
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['task'],
+        update_fields=['user', 'due_date'],
+    )
+    return len(rows)
+
+
+def scan_due_tasks(full=False, chunk_size=DEFAULT_CHUNK_SIZE, now=None):
+    """
+    Bring the AtRiskTask rows up to date, ``chunk_size`` tasks per query.
+    ``full`` ignores the watermarks and re-checks every open task.
+
+    Returns ``{'recorded': ..., 'removed': ...}`` row counts. Runs are
+    idempotent: one that fails is simply redone by the next.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    horizon = due_horizon(today)
+    state, _ = DueScanState.objects.get_or_create(name=SCAN_NAME)
+    previous_horizon = None if full else state.horizon
+    scanned_at = None if full else state.scanned_at
+    recorded = removed = 0
+
+    # Open tasks that came within the horizon since the last run
+    for status in OPEN_STATUSES:
+        candidates = Task.objects.filter(status=status, due_date__lte=horizon)
+        if previous_horizon is not None:
+            candidates = candidates.filter(due_date__gt=previous_horizon)
+        for rows in _keyset_chunks(candidates, ('due_date', 'user_id'), chunk_size):
+            recorded += _record(rows, now)
+
+    # Tasks written since the last run: newly at risk, or no longer
+    if scanned_at is not None:
+        updated = Task.objects.filter(updated_at__gte=scanned_at - UPDATE_OVERLAP)
+        for rows in _keyset_chunks(updated, ('updated_at', 'user_id', 'due_date', 'status'), chunk_size):
+            at_risk = [row for row in rows if row['status'] in OPEN_STATUSES and row['due_date'] <= horizon]
+            if at_risk:
+                recorded += _record(at_risk, now)
+            if len(at_risk) < len(rows):
+                kept = {row['id'] for row in at_risk}
+                safe = [row['id'] for row in rows if row['id'] not in kept]
+                removed += AtRiskTask.objects.filter(task_id__in=safe).delete()[0]
+
+    if full:
+        removed += AtRiskTask.objects.filter(
+            Q(task__status='completed') | Q(task__due_date__gt=horizon)
+        ).delete()[0]
+
+    if recorded or removed or state.horizon != horizon:
+        state.changed_at = now
+        if response_cache_timeout():
+            bump_scope_versions(at_risk_scope(today))
+    state.horizon = horizon
+    state.scanned_at = now
+    state.save()
+    return {'recorded': recorded, 'removed': removed}
+
+
+def current_at_risk(at_risk, today=None):
+    """Narrow an AtRiskTask queryset to the rows still right about their task"""
+    # Not status IN (open statuses): that would lead SQLite to drive the
+    # join from task_status_due_idx instead of the at-risk rows
+    return at_risk.filter(
+        task__due_date__lte=due_horizon(today),
+        task__user_id=F('user_id'),
+    ).exclude(task__status='completed')
+
+
+def at_risk_validators(request, stats):
+    """
+    Validators for an at-risk list over the users of ``stats`` (a
+    UserTaskStats queryset): their task writes, the last scan that changed
+    anything and the day.
+    """
+    changed_at = DueScanState.objects.filter(name=SCAN_NAME).values_list('changed_at', flat=True).first()
+    return Validators(request, f"{stats_version(stats)}|{changed_at}|{timezone.localdate()}")
+
+
+def encode_due_cursor(due_date, pk):
+    return base64.urlsafe_b64encode(f"{due_date.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_due_cursor(cursor):
+    """Decode a cursor back into (due_date, task id), or raise NotFound"""
+    try:
+        due_date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.date.fromisoformat(due_date), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise NotFound('Invalid cursor')
+
+
+def at_risk_response(request, at_risk):
+    """
+    Build the response of an at-risk list over the ``at_risk`` AtRiskTask
+    queryset: ``counts`` per risk and the tasks, earliest due first, each
+    with its ``risk``. ``?risk=`` keeps one kind; ``cursor``, ``page_size``
+    and ``fields`` work as on the task lists.
+    """
+    today = timezone.localdate()
+    at_risk = current_at_risk(at_risk, today)
+    counts = at_risk.aggregate(
+        overdue=Count('task', filter=Q(task__due_date__lt=today)),
+        due_soon=Count('task', filter=Q(task__due_date__gte=today)),
+    )
+
+    risk = request.query_params.get('risk')
+    if risk == 'overdue':
+        at_risk = at_risk.filter(task__due_date__lt=today)
+    elif risk == 'due_soon':
+        at_risk = at_risk.filter(task__due_date__gte=today)
+    elif risk is not None:
+        raise ValidationError({'risk': [f"Expected one of: {', '.join(RISKS)}."]})
+
+    rows = at_risk.order_by('due_date', 'task_id')
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        due_date, pk = decode_due_cursor(cursor)
+        rows = rows.filter(Q(due_date__gt=due_date) | Q(due_date=due_date, task_id__gt=pk))
+    page_size = TaskCursorPagination().get_page_size(request)
+    page = list(rows.values_list('task_id', 'task__due_date', 'due_date')[:page_size + 1])
+
+    next_link = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        params = request.query_params.copy()
+        params['cursor'] = encode_due_cursor(page[-1][2], page[-1][0])
+        next_link = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    fields = TaskSerializer.requested_fields(request)
+    serializer_class = task_read_serializer()
+    tasks = serializer_class.optimize_queryset(Task.objects.filter(id__in=[row[0] for row in page]), fields)
+    position = {row[0]: index for index, row in enumerate(page)}
+    tasks = sorted(tasks, key=lambda task: position[row_value(task, 'id')])
+
+    # Rescheduled tasks keep their old due_date here until the next scan
+    due_dates = {row[0]: row[1] for row in page}
+    results = serializer_class(tasks, many=True, fields=fields).data
+    for item, task in zip(results, tasks):
+        item['risk'] = 'overdue' if due_dates[row_value(task, 'id')] < today else 'due_soon'
+
+    return Response({
+        'counts': counts,
+        'next': next_link,
+        'results': results,
+    })
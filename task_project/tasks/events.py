@@ -0,0 +1,129 @@
+"""
+In-process broker for task change events, streamed to clients as
+server-sent events (see tasks.async_views.task_event_stream).
+
+Task signals (see tasks.signals) publish events once the writing
+transaction commits; every subscriber whose scope covers the task's user
+gets a copy. Scopes are ``('user', id)`` for a user's own tasks,
+``('admin', id)`` for the tasks of the users under an admin, and
+``('all',)`` for superadmins.
+
+The broker lives in the server process, so run a single ASGI worker process
+(any number of concurrent connections) or clients only see the changes made
+through their own worker.
+"""
+import asyncio
+import itertools
+import json
+import threading
+
+from django.db import transaction
+
+from accounts.models import Profile
+
+EVENT_FIELDS = [
+    'id', 'title', 'description', 'user', 'due_date', 'status',
+    'completion_report', 'worked_hours', 'created_at', 'updated_at', 'completed_at',
+]
+
+# Events a slow client may fall behind by before it's told to resync
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class Subscription:
+    def __init__(self, scope, loop):
+        self.scope = scope
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait({'id': event['id'], 'event': 'resync', 'data': {}})
+
+
+class TaskEventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, scope):
+        """Register a subscription for ``scope``; must be called from the event loop"""
+        subscription = Subscription(scope, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def publish(self, events):
+        """
+        Deliver ``(event_type, user_id, data)`` tuples to the matching
+        subscribers. Safe to call from any thread.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        if not subscriptions or not events:
+            return
+
+        admin_ids = {}
+        if any(subscription.scope[0] == 'admin' for subscription in subscriptions):
+            admin_ids = dict(
+                Profile.objects.filter(user_id__in={user_id for _, user_id, _ in events})
+                .values_list('user_id', 'assigned_admin_id')
+            )
+
+        for event_type, user_id, data in events:
+            event = {'id': next(self._ids), 'event': event_type, 'data': data}
+            scopes = {('all',), ('user', user_id), ('admin', admin_ids.get(user_id))}
+            for subscription in subscriptions:
+                if subscription.scope in scopes:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def publish_on_commit(self, events):
+        transaction.on_commit(lambda: self.publish(events))
+
+
+broker = TaskEventBroker()
+
+
+def task_events(task, created=False, deleted=False):
+    """Return the ``(event_type, user_id, data)`` tuples describing a write to ``task``"""
+    from .serializers import TaskSerializer
+
+    if deleted:
+        return [('deleted', task.user_id, {'id': task.pk})]
+
+    data = TaskSerializer(task, fields=EVENT_FIELDS).data
+    if created:
+        return [('created', task.user_id, data)]
+
+    events = []
+    previous_user_id = task.get_loaded_value('user_id')
+    if previous_user_id is not None and previous_user_id != task.user_id:
+        # Reassigned: it's gone for the previous owner, new for the current one
+        events.append(('deleted', previous_user_id, {'id': task.pk}))
+        events.append(('created', task.user_id, data))
+    elif task.status == 'completed' and task.get_loaded_value('status') != 'completed':
+        events.append(('completed', task.user_id, data))
+    else:
+        events.append(('updated', task.user_id, data))
+    return events
+
+
+def format_sse(event):
+    payload = json.dumps(event['data'], separators=(',', ':'))
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {payload}\n\n"
@@ -0,0 +1,103 @@
+import csv
+import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Task
+
+EXPORT_COLUMNS = (
+    'id', 'title', 'user', 'username', 'status', 'due_date',
+    'worked_hours', 'completion_report', 'created_at', 'updated_at', 'completed_at',
+)
+# values_list() lookups for EXPORT_COLUMNS, in the same order
+EXPORT_LOOKUPS = (
+    'id', 'title', 'user_id', 'user__username', 'status', 'due_date',
+    'worked_hours', 'completion_report', 'created_at', 'updated_at', 'completed_at',
+)
+ROWS_PER_CHUNK = 500
+
+
+class Echo:
+    """File-like object that hands written data straight back to csv.writer's caller"""
+    def write(self, value):
+        return value
+
+
+def export_tasks(params):
+    """
+    Return the tasks an export covers: ``status``, and ``from``/``to`` dates
+    (YYYY-MM-DD, inclusive) matched against the completion time of completed
+    tasks and the last update otherwise. Raises ValueError with a message for
+    the client on an unknown status or a malformed date.
+    """
+    tasks = Task.objects.all()
+    task_status = params.get('status')
+    if task_status:
+        if task_status not in dict(Task.STATUS_CHOICES):
+            raise ValueError(f"'status' must be one of: {', '.join(dict(Task.STATUS_CHOICES))}")
+        tasks = tasks.filter(status=task_status)
+    field = 'completed_at' if task_status == 'completed' else 'updated_at'
+
+    # Compare against datetime bounds rather than a __date lookup so an index can be used
+    for param, lookup, offset in (('from', f'{field}__gte', 0), ('to', f'{field}__lt', 1)):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            # Well formed but not a real date, e.g. 2024-13-45
+            day = None
+        if day is None:
+            raise ValueError(f"'{param}' must be a YYYY-MM-DD date")
+        if day == datetime.date.max and offset:
+            # Nothing happens after the last day there is
+            continue
+        bound = datetime.datetime.combine(day + datetime.timedelta(days=offset), datetime.time.min)
+        tasks = tasks.filter(**{lookup: timezone.make_aware(bound)})
+    return tasks
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield task rows as tuples without loading the whole queryset into memory"""
+    return queryset.order_by('id').values_list(*EXPORT_LOOKUPS).iterator(chunk_size=chunk_size)
+
+
+def _chunked(lines):
+    """Join lines into ROWS_PER_CHUNK sized strings so the response isn't one write per row"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    yield from _chunked(writer.writerow(row) for row in rows)
+
+
+def stream_ndjson(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield from _chunked(
+        encoder.encode(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in rows
+    )
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
+
+
+def export_path(name):
+    """Path of a background export file (see tasks.jobs.generate_export)"""
+    return Path(settings.TASK_EXPORT_DIR) / name
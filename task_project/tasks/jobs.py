@@ -0,0 +1,55 @@
+"""
+Background job handlers of the tasks app (see jobs.queue), registered when
+the app is ready.
+"""
+import datetime
+import os
+
+from django.core.mail import send_mail
+
+from jobs.queue import job
+from .exports import EXPORT_FORMATS, export_path, export_rows, export_tasks
+from .models import Task, WorkedHoursRollup
+
+
+@job('tasks.notify_completed')
+def notify_completed(task_id):
+    """Email the admin assigned to a task's user that the task was completed"""
+    task = (
+        Task.objects.select_related('user__profile__assigned_admin')
+        .filter(pk=task_id, status='completed')
+        .first()
+    )
+    if task is None:
+        # Deleted or reopened since
+        return
+    admin = task.user.profile.assigned_admin
+    if admin is None or not admin.email:
+        return
+    send_mail(
+        f"Task completed: {task.title}",
+        f"{task.user.username} completed \"{task.title}\" (due {task.due_date}).\n\n"
+        f"Worked hours: {task.worked_hours or 0}\n\n"
+        f"Report:\n{task.completion_report or '-'}\n",
+        None,
+        [admin.email],
+    )
+
+
+@job('tasks.recompute_worked_hours')
+def recompute_worked_hours(user_id, day):
+    WorkedHoursRollup.objects.recompute(user_id, datetime.date.fromisoformat(day))
+
+
+@job('tasks.export', timeout=3600)
+def generate_export(output, file, params):
+    """Write the export of ``params`` (see export_tasks) to ``file`` in TASK_EXPORT_DIR"""
+    _, stream = EXPORT_FORMATS[output]
+    path = export_path(file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written under another name first, so the file is never seen half done
+    temporary = path.with_name(f'{path.name}.tmp')
+    with open(temporary, 'w', encoding='utf-8', newline='') as target:
+        for chunk in stream(export_rows(export_tasks(params))):
+            target.write(chunk)
+    os.replace(temporary, path)
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from tasks.analytics import aggregate_worked_hours
+from tasks.models import Task, WorkedHoursRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the WorkedHoursRollup table from the completed tasks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Users whose rollups are rebuilt per transaction (default 500)",
+        )
+
+    def handle(self, *args, **options):
+        # Tasks completed before completed_at existed: their last update is the best guess
+        filled = Task.objects.filter(status='completed', completed_at__isnull=True).update(
+            completed_at=F('updated_at')
+        )
+        if filled:
+            self.stdout.write(f"Set completed_at of {filled} completed task(s) to their last update time")
+
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        created = 0
+        for offset in range(0, len(user_ids), batch_size):
+            batch = user_ids[offset:offset + batch_size]
+            with transaction.atomic():
+                rollups = aggregate_worked_hours(Task.objects.filter(user_id__in=batch))
+                WorkedHoursRollup.objects.filter(user_id__in=batch).delete()
+                WorkedHoursRollup.objects.bulk_create(rollups, batch_size=1000)
+            created += len(rollups)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {created} worked hours rollup(s) for {len(user_ids)} user(s)"
+        ))
@@ -0,0 +1,17 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.models import TaskTombstone
+
+
+class Command(BaseCommand):
+    help = "Delete task tombstones older than TASK_TOMBSTONE_RETENTION_DAYS"
+
+    def handle(self, *args, **options):
+        days = getattr(settings, 'TASK_TOMBSTONE_RETENTION_DAYS', 30)
+        cutoff = timezone.now() - datetime.timedelta(days=days)
+        deleted, _ = TaskTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstone(s) older than {days} days"))
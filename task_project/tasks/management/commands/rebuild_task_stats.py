@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tasks.models import UserTaskStats
+from tasks.stats import STATS_FIELDS, aggregate_task_stats_by_user, invalidate_user_task_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the UserTaskStats table from the tasks table and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report drift; exit with an error instead of rewriting the table",
+        )
+
+    def handle(self, *args, **options):
+        expected = aggregate_task_stats_by_user()
+        current = {
+            row.pop('user'): row
+            for row in UserTaskStats.objects.values('user', *STATS_FIELDS)
+        }
+
+        drifted = []
+        for user_id in sorted(expected.keys() | current.keys()):
+            want = expected.get(user_id, dict.fromkeys(STATS_FIELDS, 0))
+            have = current.get(user_id, dict.fromkeys(STATS_FIELDS, 0))
+            diff = {
+                name: (have[name], want[name])
+                for name in STATS_FIELDS
+                if abs(have[name] - want[name]) > 1e-6
+            }
+            if diff:
+                drifted.append(user_id)
+                details = ', '.join(f"{name}: {old} -> {new}" for name, (old, new) in diff.items())
+                self.stdout.write(f"user {user_id}: {details}")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{len(drifted)} user(s) have drifted task stats")
+            self.stdout.write(self.style.SUCCESS("Task stats are in sync"))
+            return
+
+        with transaction.atomic():
+            # Every existing row is kept, with its version bumped, so ETags
+            # derived from the versions (see tasks.conditional) can't repeat
+            versions = dict(UserTaskStats.objects.values_list('user', 'version'))
+            rows = [
+                UserTaskStats(
+                    user_id=user_id,
+                    version=versions.get(user_id, 0) + 1,
+                    **expected.get(user_id, dict.fromkeys(STATS_FIELDS, 0)),
+                )
+                for user_id in expected.keys() | versions.keys()
+            ]
+            UserTaskStats.objects.all().delete()
+            UserTaskStats.objects.bulk_create(rows, batch_size=1000)
+        invalidate_user_task_stats(*drifted)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt task stats for {len(expected)} user(s), {len(drifted)} had drifted"
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.due import DEFAULT_CHUNK_SIZE, due_soon_days, scan_due_tasks
+
+
+class Command(BaseCommand):
+    help = "Record the open tasks that are overdue or due within TASK_DUE_SOON_DAYS days (see tasks.due)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Tasks read per query (default {DEFAULT_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Ignore the watermarks and re-check every open task",
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            metavar='SECONDS',
+            help="Keep running, scanning every SECONDS seconds",
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        if options['every'] is not None and options['every'] < 1:
+            raise CommandError("--every must be at least 1")
+
+        full = options['full']
+        while True:
+            started = time.monotonic()
+            counts = scan_due_tasks(full=full, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Recorded {counts['recorded']} and removed {counts['removed']} at-risk task(s)"
+                f" (due within {due_soon_days()} days) in {time.monotonic() - started:.2f}s"
+            ))
+            if options['every'] is None:
+                return
+            # Only the first run of a worker needs to start over
+            full = False
+            time.sleep(max(options['every'] - (time.monotonic() - started), 0))
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+import django.db.models.deletion
+
+
+def backfill_user_task_stats(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    UserTaskStats = apps.get_model('tasks', 'UserTaskStats')
+
+    rows = Task.objects.values('user').annotate(
+        total_tasks=Count('id'),
+        pending_tasks=Count('id', filter=Q(status='pending')),
+        in_progress_tasks=Count('id', filter=Q(status='in_progress')),
+        completed_tasks=Count('id', filter=Q(status='completed')),
+        total_hours=Sum('worked_hours', filter=Q(status='completed')),
+        last_activity_at=Max('updated_at'),
+    ).order_by()
+    stats = []
+    for row in rows:
+        row['user_id'] = row.pop('user')
+        row['total_hours'] = row['total_hours'] or 0
+        stats.append(UserTaskStats(**row))
+    UserTaskStats.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0004_task_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTaskStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_tasks', models.IntegerField(default=0)),
+                ('pending_tasks', models.IntegerField(default=0)),
+                ('in_progress_tasks', models.IntegerField(default=0)),
+                ('completed_tasks', models.IntegerField(default=0)),
+                ('total_hours', models.FloatField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='task_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_user_task_stats, migrations.RunPython.noop),
+    ]
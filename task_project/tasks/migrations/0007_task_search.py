@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# The DDL is inlined rather than imported from tasks.search so later changes
+# to that module can't change what this migration does.
+SQLITE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_task_fts USING fts5(
+    title, description, completion_report,
+    content='tasks_task', content_rowid='id', tokenize='porter unicode61'
+)
+"""
+
+SQLITE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts (rowid, title, description, completion_report)
+        VALUES (new.id, new.title, new.description, new.completion_report);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts (tasks_task_fts, rowid, title, description, completion_report)
+        VALUES ('delete', old.id, old.title, old.description, old.completion_report);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_update
+    AFTER UPDATE OF title, description, completion_report ON tasks_task
+    WHEN old.title IS NOT new.title
+        OR old.description IS NOT new.description
+        OR old.completion_report IS NOT new.completion_report
+    BEGIN
+        INSERT INTO tasks_task_fts (tasks_task_fts, rowid, title, description, completion_report)
+        VALUES ('delete', old.id, old.title, old.description, old.completion_report);
+        INSERT INTO tasks_task_fts (rowid, title, description, completion_report)
+        VALUES (new.id, new.title, new.description, new.completion_report);
+    END
+    """,
+]
+
+POSTGRES_SEARCH_INDEX = [
+    """
+    ALTER TABLE tasks_task ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(completion_report, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS task_search_idx ON tasks_task USING GIN (search_vector)",
+]
+
+
+def forwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_SEARCH_TABLE)
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+        schema_editor.execute("INSERT INTO tasks_task_fts (tasks_task_fts) VALUES ('rebuild')")
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_SEARCH_INDEX:
+            schema_editor.execute(statement)
+
+
+def backwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS tasks_task_fts_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS tasks_task_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS task_search_idx")
+        schema_editor.execute("ALTER TABLE tasks_task DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_tombstones'),
+    ]
+
+    operations = [
+        # SQLite FTS5 table + triggers, or a PostgreSQL tsvector column + GIN index
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_completed_at(apps, schema_editor):
+    # Completed tasks were last updated when they were completed, as far as we know
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.filter(status='completed', completed_at__isnull=True).update(completed_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0007_task_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_completed_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='WorkedHoursRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('completed_tasks', models.IntegerField(default=0)),
+                ('hours', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='worked_hours_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'period_start'], name='rollup_period_start_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='workedhoursrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'period_start'), name='rollup_user_period_unique'),
+        ),
+    ]
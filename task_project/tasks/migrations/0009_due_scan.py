@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0008_task_completed_at_worked_hours_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AtRiskTask',
+            fields=[
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='at_risk', serialize=False, to='tasks.task')),
+                ('due_date', models.DateField()),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DueScanState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('horizon', models.DateField(blank=True, null=True)),
+                ('scanned_at', models.DateTimeField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'due_date'], name='task_status_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='atrisktask',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='atrisktask',
+            index=models.Index(fields=['user', 'due_date', 'task'], name='at_risk_user_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='atrisktask',
+            index=models.Index(fields=['due_date', 'task'], name='at_risk_due_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_due_scan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['user', 'completed_at'], name='task_user_completion_idx'),
+        ),
+    ]
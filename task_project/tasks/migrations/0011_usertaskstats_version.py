@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_task_user_completion_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usertaskstats',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,12 @@
-from django.db import models
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Count, F, Sum
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from jobs.queue import enqueue_many, new_job
 
 class Task(models.Model):
     STATUS_CHOICES = [
@@ -17,9 +24,400 @@ class Task(models.Model):
     worked_hours = models.FloatField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)  # set by update_completed_at()
+
+    # Fields the per-user aggregates (UserTaskStats, WorkedHoursRollup) are computed from
+    AGGREGATE_FIELDS = ('user_id', 'status', 'worked_hours', 'completed_at')
+
+    class Meta:
+        indexes = [
+            # profile_view status counters and per-user filters
+            models.Index(fields=['user', 'status'], name='task_user_status_idx'),
+            # per-user lists ordered by creation (profile, cursor pagination)
+            models.Index(fields=['user', 'created_at', 'id'], name='task_user_created_idx'),
+            # all-task lists ordered by creation (admin list, dashboards)
+            models.Index(fields=['created_at', 'id'], name='task_created_idx'),
+            models.Index(fields=['updated_at'], name='task_updated_idx'),
+            # overdue / due-soon scans (tasks.due) over the open statuses
+            models.Index(fields=['status', 'due_date'], name='task_status_due_idx'),
+            # per-user delta sync (?since=) ordered by update
+            models.Index(fields=['user', 'updated_at', 'id'], name='task_user_updated_idx'),
+            # completed reports ordered by completion time
+            models.Index(
+                fields=['user', 'updated_at'],
+                condition=models.Q(status='completed'),
+                name='task_completed_user_idx',
+            ),
+            # a user's completions of one day (WorkedHoursRollup recomputes)
+            models.Index(
+                fields=['user', 'completed_at'],
+                condition=models.Q(status='completed'),
+                name='task_user_completion_idx',
+            ),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the values loaded from the database so saves can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_loaded_value(self, field_name):
+        """Return ``field_name`` as it was loaded from the database, or None for new tasks"""
+        return getattr(self, '_loaded_values', {}).get(field_name)
+
+    @classmethod
+    def lock_stats_values(cls, tasks):
+        """
+        Lock the rows of ``tasks`` until the end of the transaction and return
+        ``{pk: values}`` of the fields the aggregates are computed from, as
+        stored. Tasks without a row are left out.
+
+        Aggregate deltas are computed from these rather than from the values
+        the tasks were loaded with, which a concurrent save may have changed
+        since. The tasks' loaded values are updated to match, so receivers
+        see what the save replaces.
+
+        SQLite has no row locks, and a transaction that reads before it
+        writes fails at once with "database is locked" when another writer
+        got in between, without waiting for the busy timeout. There the rows
+        are written to first (a no-op UPDATE), which waits for and takes the
+        database write lock before anything is read.
+        """
+        tasks = [task for task in tasks if task.pk is not None]
+        if not tasks:
+            return {}
+        rows = cls.objects.filter(pk__in=[task.pk for task in tasks])
+        if connections[router.db_for_write(cls)].features.has_select_for_update:
+            rows = rows.select_for_update()
+        else:
+            rows.update(id=F('id'))
+        stored = {row.pop('id'): row for row in rows.values('id', *cls.AGGREGATE_FIELDS)}
+        for task in tasks:
+            if task.pk in stored:
+                task._loaded_values = {**getattr(task, '_loaded_values', {}), **stored[task.pk]}
+        return stored
+
+    def update_completed_at(self, now=None):
+        """Stamp ``completed_at`` when the task is completed, clear it when it's reopened"""
+        if self.status != 'completed':
+            self.completed_at = None
+        elif self.completed_at is None:
+            self.completed_at = now or timezone.now()
+
+    def save(self, *args, **kwargs):
+        self.update_completed_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = update_fields = {*update_fields, 'completed_at'}
+        with transaction.atomic():
+            # None for a new task (also when it's created with an explicit pk)
+            old_values = self.lock_stats_values([self]).get(self.pk)
+            apply_aggregate_changes([(old_values, self.stats_values(old_values, update_fields))])
+            super().save(*args, **kwargs)
+        self.reset_loaded_values()
+
+    def reset_loaded_values(self):
+        """Treat the current field values as the ones stored in the database"""
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+        }
+
+    def stats_values(self, stored=None, update_fields=None):
+        """
+        Return the fields of this task that the per-user aggregates are
+        computed from. With ``update_fields``, those a save doesn't write are
+        taken from ``stored`` (see lock_stats_values) instead.
+        """
+        values = {}
+        for name in self.AGGREGATE_FIELDS:
+            field_name = self._meta.get_field(name.removesuffix('_id')).name
+            if stored is None or update_fields is None or {name, field_name} & set(update_fields):
+                values[name] = getattr(self, name)
+            else:
+                values[name] = stored[name]
+        return values
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # None if a concurrent delete got there first: nothing to subtract
+            apply_aggregate_changes([(self.lock_stats_values([self]).get(self.pk), None)])
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.title} - {self.user.username}"
     
     def get_status_display(self):
-        return dict(self.STATUS_CHOICES).get(self.status, self.status)
\ No newline at end of file
+        return dict(self.STATUS_CHOICES).get(self.status, self.status)
+
+
+class UserTaskStatsManager(models.Manager):
+    def apply_change(self, old_values, new_values):
+        """
+        Move one task's contribution from ``old_values`` to ``new_values``.
+
+        Each argument is a dict of ``Task.AGGREGATE_FIELDS`` (None for a
+        task that is being created or deleted). Counters are adjusted with F()
+        expressions so concurrent saves don't lose updates.
+        """
+        self.apply_changes([(old_values, new_values)])
+
+    def apply_changes(self, changes):
+        """Apply many ``(old_values, new_values)`` pairs with one UPDATE per affected user"""
+        deltas = defaultdict(Counter)
+        for old_values, new_values in changes:
+            self._accumulate(deltas, old_values, -1)
+            self._accumulate(deltas, new_values, 1)
+
+        now = timezone.now()
+        for user_id, delta in deltas.items():
+            updates = {name: F(name) + value for name, value in delta.items() if value}
+            updates['version'] = F('version') + 1
+            if self.filter(user_id=user_id).update(last_activity_at=now, **updates):
+                continue
+            # First change for this user: start from zero
+            try:
+                with transaction.atomic():
+                    self.create(user_id=user_id, last_activity_at=now, version=1, **delta)
+            except IntegrityError:
+                self.filter(user_id=user_id).update(last_activity_at=now, **updates)
+
+    @staticmethod
+    def _accumulate(deltas, values, sign):
+        if values is None:
+            return
+        delta = deltas[values['user_id']]
+        delta['total_tasks'] += sign
+        counter = UserTaskStats.STATUS_COUNTERS.get(values['status'])
+        if counter:
+            delta[counter] += sign
+        if values['status'] == 'completed' and values['worked_hours']:
+            delta['total_hours'] += sign * float(values['worked_hours'])
+
+
+class UserTaskStats(models.Model):
+    """
+    Denormalized per-user task counters, kept up to date by Task.save/delete.
+
+    Bulk queryset operations (update(), delete(), bulk_create()) bypass those
+    hooks; callers must use ``UserTaskStats.objects.apply_changes`` or run
+    ``manage.py rebuild_task_stats`` to resynchronize after them.
+    """
+    STATUS_COUNTERS = {
+        'pending': 'pending_tasks',
+        'in_progress': 'in_progress_tasks',
+        'completed': 'completed_tasks',
+    }
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='task_stats')
+    total_tasks = models.IntegerField(default=0)
+    pending_tasks = models.IntegerField(default=0)
+    in_progress_tasks = models.IntegerField(default=0)
+    completed_tasks = models.IntegerField(default=0)
+    total_hours = models.FloatField(default=0)  # worked hours of completed tasks
+    last_activity_at = models.DateTimeField(blank=True, null=True)
+    # Bumped by every task write, in its transaction; ETags are derived from it
+    # (see tasks.conditional), as timestamps needn't commit in order
+    version = models.PositiveBigIntegerField(default=0)
+
+    objects = UserTaskStatsManager()
+
+    def __str__(self):
+        return f"{self.user.username} task stats"
+
+
+class TaskTombstone(models.Model):
+    """
+    Deletion log for delta sync (``?since=``): one row per task deleted, or
+    reassigned away from ``user``. Pruned by ``manage.py prune_task_tombstones``.
+    """
+    task_id = models.BigIntegerField()
+    # No FK constraint: tombstones outlive the tasks and users they describe
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Task {self.task_id} removed from user {self.user_id}"
+
+
+def apply_aggregate_changes(changes):
+    """
+    Apply ``(old_values, new_values)`` task changes (see Task.stats_values) to
+    UserTaskStats, and queue the WorkedHoursRollup recomputes they call for.
+    """
+    changes = list(changes)
+    UserTaskStats.objects.apply_changes(changes)
+    WorkedHoursRollup.objects.schedule_recompute(changes)
+
+
+def period_start(day, period):
+    """Return the first day of the ``period`` ('day', 'week' or 'month') holding ``day``; weeks start on Monday"""
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period_start(day, period):
+    """Return the first day of the period after the one holding ``day``"""
+    start = period_start(day, period)
+    if period == 'week':
+        return start + datetime.timedelta(days=7)
+    if period == 'month':
+        return (start + datetime.timedelta(days=31)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+
+class WorkedHoursRollupManager(models.Manager):
+    def schedule_recompute(self, changes):
+        """
+        Queue a ``tasks.recompute_worked_hours`` job (see tasks.jobs) for each
+        user and day whose totals ``(old_values, new_values)`` task changes
+        affect; one INSERT, none if no completion changed.
+        """
+        days = set()
+        for old_values, new_values in changes:
+            old, new = self.contribution(old_values), self.contribution(new_values)
+            if old != new:
+                days.update(contribution[:2] for contribution in (old, new) if contribution is not None)
+        if not days:
+            return
+        enqueue_many([
+            new_job(
+                'tasks.recompute_worked_hours', key=f'worked-hours:{user_id}:{day}',
+                user_id=user_id, day=day.isoformat(),
+            )
+            for user_id, day in sorted(days)
+        ])
+
+    def recompute(self, user_id, day):
+        """
+        Recompute the user's day, week and month buckets holding ``day``: the
+        day from their tasks, the week and month from their day buckets.
+        """
+        with transaction.atomic():
+            # One recompute per user at a time: a recompute of another day of
+            # the same week could otherwise store week and month totals read
+            # before this day's bucket. SQLite has no row locks, but it fails
+            # the later of two such transactions, and its job is retried.
+            if not User.objects.select_for_update(no_key=True).filter(pk=user_id).exists():
+                # Deleted since, together with their buckets
+                return
+
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+            end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+            totals = Task.objects.filter(
+                user_id=user_id, status='completed', completed_at__gte=start, completed_at__lt=end,
+            ).aggregate(completed_tasks=Count('id'), hours=Sum('worked_hours'))
+            self._store(user_id, 'day', day, totals)
+
+            for period in ('week', 'month'):
+                totals = self.filter(
+                    user_id=user_id, period='day',
+                    period_start__gte=period_start(day, period), period_start__lt=next_period_start(day, period),
+                ).aggregate(completed_tasks=Sum('completed_tasks'), hours=Sum('hours'))
+                self._store(user_id, period, period_start(day, period), totals)
+
+    def _store(self, user_id, period, start, totals):
+        values = {'completed_tasks': totals['completed_tasks'] or 0, 'hours': totals['hours'] or 0}
+        bucket = {'user_id': user_id, 'period': period, 'period_start': start}
+        if self.filter(**bucket).update(**values):
+            return
+        try:
+            with transaction.atomic():
+                self.create(**bucket, **values)
+        except IntegrityError:
+            self.filter(**bucket).update(**values)
+
+    @staticmethod
+    def contribution(values):
+        """Return ``(user_id, completion day, hours)`` for a completed task's values, else None"""
+        if values is None or values['status'] != 'completed' or values['completed_at'] is None:
+            return None
+        day = timezone.localtime(values['completed_at']).date()
+        return values['user_id'], day, float(values['worked_hours'] or 0)
+
+
+class WorkedHoursRollup(models.Model):
+    """
+    Completed tasks and their worked hours per user and day, week (starting
+    Monday) or month of completion, for the analytics API.
+
+    Task writes queue recomputes of the buckets they affect, which the
+    background worker runs (see apply_aggregate_changes and tasks.jobs), so
+    the table trails the tasks by a few seconds. Bulk queryset operations
+    bypass it like they bypass UserTaskStats.
+    ``manage.py backfill_worked_hours`` rebuilds it from the tasks table.
+    """
+    PERIODS = ('day', 'week', 'month')
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='worked_hours_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    completed_tasks = models.IntegerField(default=0)
+    hours = models.FloatField(default=0)
+
+    objects = WorkedHoursRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'period_start'], name='rollup_user_period_unique'),
+        ]
+        indexes = [
+            # all-user and team reports over a date range
+            models.Index(fields=['period', 'period_start'], name='rollup_period_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.period} of {self.period_start}"
+
+
+class AtRiskTask(models.Model):
+    """
+    An open task that is overdue or due within TASK_DUE_SOON_DAYS days, as
+    found by ``manage.py scan_due_tasks`` (see tasks.due). Whether it is
+    overdue or due soon is decided when the list is read.
+    """
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, primary_key=True, related_name='at_risk')
+    # Copied from the task by the scan, for the per-user lists
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    due_date = models.DateField()
+    detected_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # per-user lists ordered by due date
+            models.Index(fields=['user', 'due_date', 'task'], name='at_risk_user_due_idx'),
+            # all-user and team lists ordered by due date
+            models.Index(fields=['due_date', 'task'], name='at_risk_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Task {self.task_id} due {self.due_date}"
+
+
+class DueScanState(models.Model):
+    """Watermarks of ``manage.py scan_due_tasks``, one row per scan"""
+    name = models.CharField(max_length=50, unique=True)
+    # Last due date covered: later ones are new candidates for the next run
+    horizon = models.DateField(blank=True, null=True)
+    # Start of the last run: tasks updated since are re-checked
+    scanned_at = models.DateTimeField(blank=True, null=True)
+    # Last time a run changed the AtRiskTask rows (or moved the horizon)
+    changed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} scanned through {self.horizon}"
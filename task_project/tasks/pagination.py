@@ -0,0 +1,120 @@
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+def encode_cursor(created_at, pk):
+    """Encode the (created_at, id) position of a row as an opaque cursor"""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into (created_at, id), or raise NotFound"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, pk = raw.split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise NotFound('Invalid cursor')
+    if created_at is None:
+        raise NotFound('Invalid cursor')
+    return created_at, pk
+
+
+def _keyset_queryset(queryset, cursor, page_size):
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    # Fetch one extra row to know whether another page exists
+    return queryset[:page_size + 1]
+
+
+def row_value(row, name):
+    """Read ``name`` from a model instance or a values() dict"""
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _split_page(rows, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(row_value(last, 'created_at'), row_value(last, 'id'))
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    Return up to ``page_size`` rows after ``cursor`` (newest first) and the
+    cursor of the following page, or None when this is the last page.
+
+    Rows are ordered on (created_at, id) so the position filter is an index
+    range seek instead of an OFFSET scan.
+    """
+    rows = list(_keyset_queryset(queryset, cursor, page_size))
+    return _split_page(rows, page_size)
+
+
+async def akeyset_page(queryset, cursor, page_size):
+    """Async version of keyset_page()"""
+    rows = [row async for row in _keyset_queryset(queryset, cursor, page_size)]
+    return _split_page(rows, page_size)
+
+
+def _query_params(request):
+    # DRF requests expose query_params, plain Django requests (async views) GET
+    return getattr(request, 'query_params', request.GET)
+
+
+class TaskCursorPagination(BasePagination):
+    """Keyset pagination over tasks ordered by (created_at, id), newest first"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        try:
+            size = int(_query_params(request)[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size < 1:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = _query_params(request).get(self.cursor_query_param)
+        page, self.next_cursor = keyset_page(queryset, cursor, self.get_page_size(request))
+        return page
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async version of paginate_queryset(), ``request`` may be a plain HttpRequest"""
+        self.request = request
+        cursor = _query_params(request).get(self.cursor_query_param)
+        page, self.next_cursor = await akeyset_page(queryset, cursor, self.get_page_size(request))
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        params = _query_params(self.request).copy()
+        params[self.cursor_query_param] = self.next_cursor
+        return self.request.build_absolute_uri(
+            f"{self.request.path}?{params.urlencode()}"
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
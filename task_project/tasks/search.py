@@ -0,0 +1,179 @@
+"""
+Full-text search over task titles, descriptions and completion reports.
+
+SQLite
+    ``tasks_task_fts``, an FTS5 table over the three columns (Porter
+    stemming), indexes tasks_task as external content. Triggers on
+    tasks_task keep it in step, so bulk_create(), bulk_update() and queryset
+    update() / delete() are covered too. Matches are ranked with bm25(),
+    title hits weighing more.
+PostgreSQL
+    ``tasks_task.search_vector``, a stored generated tsvector column (title
+    weighted A, description and report B) with a GIN index, ranked with
+    ts_rank().
+Other databases
+    ``icontains`` filters, most recently updated first.
+
+Migration 0007 creates the index; neither the FTS table nor the column is
+part of the Task model. SQLite drops triggers along with their table when a
+migration rebuilds tasks_task, so they are recreated after every migrate
+(see TasksConfig.ready); SQLITE_SEARCH_TRIGGERS must stay in step with the
+migration's copy.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import Task
+from .pagination import TaskCursorPagination, row_value
+from .serializers import TaskSerializer, task_read_serializer
+
+# Words beyond this are ignored; every word must match
+MAX_SEARCH_TERMS = 16
+
+# Deeper pages are refused; ranking every match to skip them isn't worth it
+MAX_SEARCH_PAGE = 100
+
+# bm25() weights of title, description and completion_report
+SQLITE_COLUMN_WEIGHTS = (4.0, 1.0, 1.0)
+
+SQLITE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts (rowid, title, description, completion_report)
+        VALUES (new.id, new.title, new.description, new.completion_report);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts (tasks_task_fts, rowid, title, description, completion_report)
+        VALUES ('delete', old.id, old.title, old.description, old.completion_report);
+    END
+    """,
+    # Task.save() writes every column: only reindex when the text changed
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_update
+    AFTER UPDATE OF title, description, completion_report ON tasks_task
+    WHEN old.title IS NOT new.title
+        OR old.description IS NOT new.description
+        OR old.completion_report IS NOT new.completion_report
+    BEGIN
+        INSERT INTO tasks_task_fts (tasks_task_fts, rowid, title, description, completion_report)
+        VALUES ('delete', old.id, old.title, old.description, old.completion_report);
+        INSERT INTO tasks_task_fts (rowid, title, description, completion_report)
+        VALUES (new.id, new.title, new.description, new.completion_report);
+    END
+    """,
+]
+
+def restore_search_triggers(sender, using, **kwargs):
+    """post_migrate receiver recreating the SQLite triggers a table rebuild dropped"""
+    from django.db import connections
+
+    db = connections[using]
+    if db.vendor != 'sqlite' or 'tasks_task_fts' not in db.introspection.table_names():
+        return
+    with db.cursor() as cursor:
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            cursor.execute(statement)
+
+
+def search_terms(text):
+    """Return the words of a search string; query syntax is not supported"""
+    return re.findall(r'\w+', text)[:MAX_SEARCH_TERMS]
+
+
+def _user_filter(user_ids):
+    if isinstance(user_ids, QuerySet):
+        sql, params = user_ids.query.sql_with_params()
+    else:
+        params = list(user_ids)
+        sql = ', '.join(['%s'] * len(params))
+    return f' AND tasks_task.user_id IN ({sql})', list(params)
+
+
+def search_task_ids(terms, user_ids=None, limit=50, offset=0):
+    """
+    Return the ids of the tasks matching every one of ``terms``, best match
+    first. ``user_ids`` (ids, or a values() queryset of them) restricts the
+    search to those users' tasks; None searches every task.
+    """
+    if not terms:
+        return []
+    user_sql, user_params = '', []
+    if user_ids is not None:
+        if not isinstance(user_ids, QuerySet) and not user_ids:
+            return []
+        user_sql, user_params = _user_filter(user_ids)
+
+    if connection.vendor == 'sqlite':
+        sql = f"""
+            SELECT tasks_task.id FROM tasks_task_fts
+            JOIN tasks_task ON tasks_task.id = tasks_task_fts.rowid
+            WHERE tasks_task_fts MATCH %s{user_sql}
+            ORDER BY bm25(tasks_task_fts, {', '.join(map(str, SQLITE_COLUMN_WEIGHTS))}), tasks_task.id DESC
+            LIMIT %s OFFSET %s
+        """
+        # Quoted, so words like AND / NOT / NEAR aren't operators
+        params = [' '.join(f'"{term}"' for term in terms), *user_params, limit, offset]
+    elif connection.vendor == 'postgresql':
+        sql = f"""
+            SELECT tasks_task.id FROM tasks_task, plainto_tsquery('english', %s) query
+            WHERE tasks_task.search_vector @@ query{user_sql}
+            ORDER BY ts_rank(tasks_task.search_vector, query) DESC, tasks_task.id DESC
+            LIMIT %s OFFSET %s
+        """
+        params = [' '.join(terms), *user_params, limit, offset]
+    else:
+        tasks = Task.objects.all()
+        for term in terms:
+            tasks = tasks.filter(
+                Q(title__icontains=term) | Q(description__icontains=term) | Q(completion_report__icontains=term)
+            )
+        if user_ids is not None:
+            tasks = tasks.filter(user_id__in=user_ids)
+        return list(tasks.order_by('-updated_at', '-id').values_list('id', flat=True)[offset:offset + limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_response(request, user_ids=None):
+    """Build the response of a task search (``?q=``, ``page``, ``page_size``, ``fields``)"""
+    terms = search_terms(request.query_params.get('q', ''))
+    if not terms:
+        raise ValidationError({'q': ["Enter at least one word to search for."]})
+    try:
+        page = int(request.query_params.get('page', 1))
+    except ValueError:
+        page = 0
+    if page < 1:
+        raise ValidationError({'page': ["Expected a positive integer."]})
+    if page > MAX_SEARCH_PAGE:
+        raise ValidationError({'page': [f"Only the first {MAX_SEARCH_PAGE} pages are available; refine the search."]})
+
+    page_size = TaskCursorPagination().get_page_size(request)
+    ids = search_task_ids(terms, user_ids, limit=page_size + 1, offset=(page - 1) * page_size)
+    has_more = len(ids) > page_size and page < MAX_SEARCH_PAGE
+    ids = ids[:page_size]
+
+    fields = TaskSerializer.requested_fields(request)
+    serializer_class = task_read_serializer()
+    tasks = serializer_class.optimize_queryset(Task.objects.filter(id__in=ids), fields)
+    position = {pk: index for index, pk in enumerate(ids)}
+    tasks = sorted(tasks, key=lambda task: position[row_value(task, 'id')])
+
+    next_link = None
+    if has_more:
+        params = request.query_params.copy()
+        params['page'] = page + 1
+        next_link = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    return Response({
+        'next': next_link,
+        'results': serializer_class(tasks, many=True, fields=fields).data,
+    })
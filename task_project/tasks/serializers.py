@@ -1,7 +1,86 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Task
+from task_project.metrics import track_serialization
+from .models import Task, apply_aggregate_changes
+from .signals import tasks_bulk_saved
+
+
+class TaskUserField(serializers.PrimaryKeyRelatedField):
+    """User PK field that resolves from ``context['users']`` when a bulk request preloaded them"""
+    def to_internal_value(self, data):
+        users = self.context.get('users')
+        # PrimaryKeyRelatedField rejects true/false, which int() would take for 1/0
+        if users is not None and not isinstance(data, bool):
+            try:
+                return users[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class TaskBulkCreateListSerializer(serializers.ListSerializer):
+    """Create all validated tasks with a single bulk_create"""
+    def create(self, validated_data):
+        now = timezone.now()
+        tasks = [Task(**attrs) for attrs in validated_data]
+        for task in tasks:
+            task.update_completed_at(now)
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create(tasks, batch_size=500)
+            apply_aggregate_changes((None, task.stats_values()) for task in tasks)
+            tasks_bulk_saved.send(sender=Task, instances=tasks, created=True)
+        for task in tasks:
+            task.reset_loaded_values()
+        return tasks
+
+
+class TaskBulkCompleteListSerializer(serializers.ListSerializer):
+    """Apply validated changes to ``instance`` (a list of tasks, in item order) with one bulk_update"""
+    def update(self, instances, validated_data):
+        if len({task.pk for task in instances}) != len(instances):
+            # Its aggregate change would be applied once per occurrence
+            raise ValueError("A task may only appear once in a bulk update")
+        now = timezone.now()
+        fields = {'updated_at'}  # bulk_update() doesn't apply auto_now
+        for task, attrs in zip(instances, validated_data):
+            for name, value in attrs.items():
+                setattr(task, name, value)
+            task.updated_at = now
+            task.update_completed_at(now)
+            fields.update(attrs)
+            if 'status' in attrs:
+                fields.add('completed_at')
+
+        with transaction.atomic():
+            stored = Task.lock_stats_values(instances)
+            apply_aggregate_changes(
+                (stored[task.pk], task.stats_values(stored[task.pk], fields))
+                for task in instances if task.pk in stored
+            )
+            Task.objects.bulk_update(instances, sorted(fields), batch_size=500)
+            tasks_bulk_saved.send(sender=Task, instances=instances, created=False)
+        for task in instances:
+            task.reset_loaded_values()
+        return instances
+
+class TaskListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with track_serialization():
+            return super().data
+
 
 class TaskSerializer(serializers.ModelSerializer):
+    """
+    Task serializer with optional sparse fieldsets.
+
+    Pass ``fields=[...]`` to only render a subset of the fields, e.g. from a
+    ``?fields=id,title,status`` query parameter.
+    """
     username = serializers.ReadOnlyField(source='user.username')
     
     class Meta:
@@ -9,9 +88,114 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'user', 'username',
             'due_date', 'status', 'completion_report', 
-            'worked_hours', 'created_at', 'updated_at'
+            'worked_hours', 'created_at', 'updated_at', 'completed_at'
+        ]
+        read_only_fields = ['id', 'created_at', 'updated_at', 'completed_at']
+        list_serializer_class = TaskListSerializer
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    @property
+    def data(self):
+        with track_serialization():
+            return super().data
+
+    @staticmethod
+    def requested_fields(request):
+        """Return the field names listed in ``?fields=``, or None for all fields"""
+        # DRF requests expose query_params, plain Django requests (async views) GET
+        raw = getattr(request, 'query_params', request.GET).get('fields')
+        if not raw:
+            return None
+        return [name.strip() for name in raw.split(',') if name.strip()]
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None):
+        """Only load the columns (and joins) the requested fields need"""
+        if fields is None:
+            return queryset.select_related('user')
+
+        columns = {'id', 'created_at', 'updated_at'}  # always needed for pagination and sync watermarks
+        columns.update(
+            name for name in fields
+            if name in cls.Meta.fields and name != 'username'
+        )
+        if 'username' in fields:
+            queryset = queryset.select_related('user')
+            columns.update({'user', 'user__username'})
+        return queryset.only(*columns)
+
+
+class TaskRowSerializer:
+    """
+    Read-only, ``values()`` based equivalent of ``TaskSerializer(many=True)``.
+
+    Rows come straight from the database as dicts (with the username joined
+    in SQL), so no model instances are built and only the per-value
+    ``to_representation`` of TaskSerializer's fields runs. The output is
+    identical to TaskSerializer's; it has the same ``optimize_queryset`` /
+    ``fields=`` interface so views can use either (see task_read_serializer).
+    """
+    # Values used as-is: the user pk and the joined username
+    RAW_FIELDS = ('user', 'username')
+    _converters = None
+
+    def __init__(self, instance=None, many=True, fields=None, **kwargs):
+        self.instance = instance
+        self.field_names = [
+            name for name in TaskSerializer.Meta.fields
+            if fields is None or name in fields
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None):
+        """Return ``queryset`` as values() rows holding the requested fields"""
+        columns = ['id', 'created_at', 'updated_at']  # always needed for pagination and sync watermarks
+        columns += [
+            name for name in TaskSerializer.Meta.fields
+            if (fields is None or name in fields) and name not in columns and name != 'username'
+        ]
+        if fields is None or 'username' in fields:
+            return queryset.values(*columns, username=F('user__username'))
+        return queryset.values(*columns)
+
+    @classmethod
+    def converters(cls):
+        if cls._converters is None:
+            cls._converters = {
+                name: field.to_representation
+                for name, field in TaskSerializer().fields.items()
+                if name not in cls.RAW_FIELDS
+            }
+        return cls._converters
+
+    @property
+    def data(self):
+        converters = self.converters()
+        names = self.field_names
+        results = []
+        with track_serialization():
+            for row in self.instance:
+                item = {}
+                for name in names:
+                    value = row[name]
+                    # Like Serializer.to_representation, None is never converted
+                    item[name] = value if value is None or name in self.RAW_FIELDS else converters[name](value)
+                results.append(item)
+        return results
+
+
+def task_read_serializer():
+    """Serializer class for task list reads, per the TASK_FAST_SERIALIZER setting"""
+    if getattr(settings, 'TASK_FAST_SERIALIZER', False):
+        return TaskRowSerializer
+    return TaskSerializer
 
 
 class TaskCompleteSerializer(serializers.ModelSerializer):
@@ -19,6 +203,7 @@ class TaskCompleteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = ['status', 'completion_report', 'worked_hours']
+        list_serializer_class = TaskBulkCompleteListSerializer
     
     def validate(self, data):
         """Validate that completion requires report and hours"""
@@ -36,12 +221,15 @@ class TaskCompleteSerializer(serializers.ModelSerializer):
 
 class TaskCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating new tasks"""
+    user = TaskUserField(queryset=User.objects.all())
+
     class Meta:
         model = Task
         fields = [
             'title', 'description', 'user', 'due_date', 
             'status', 'completion_report', 'worked_hours'
         ]
+        list_serializer_class = TaskBulkCreateListSerializer
     
     def validate(self, data):
         """Additional validation"""
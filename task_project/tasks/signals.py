@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from accounts.models import Profile
+from jobs.models import Job
+from jobs.queue import enqueue_many, new_job
+from .caching import invalidate_task_responses
+from .events import broker, task_events
+from .exports import export_path
+from .models import Task, TaskTombstone
+from .stats import invalidate_user_task_stats
+
+# Sent after tasks are written with bulk_create()/bulk_update(), which skip
+# post_save. Receives ``instances`` (still carrying the values they were
+# loaded with, see Task.get_loaded_value) and ``created``.
+tasks_bulk_saved = Signal()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_stats(sender, instance, **kwargs):
+    # A reassigned task changes the stats of both its old and new user
+    invalidate_user_task_stats(instance.user_id, instance.get_loaded_value('user_id'))
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def invalidate_bulk_task_stats(sender, instances, **kwargs):
+    user_ids = set()
+    for task in instances:
+        user_ids.update((task.user_id, task.get_loaded_value('user_id')))
+    invalidate_user_task_stats(*user_ids)
+
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, **kwargs):
+    if broker.has_subscribers():
+        broker.publish_on_commit(task_events(instance, created=created))
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, **kwargs):
+    if broker.has_subscribers():
+        broker.publish_on_commit(task_events(instance, deleted=True))
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def publish_bulk_tasks_saved(sender, instances, created, **kwargs):
+    if broker.has_subscribers():
+        events = []
+        for task in instances:
+            events.extend(task_events(task, created=created))
+        broker.publish_on_commit(events)
+
+
+@receiver(post_delete, sender=Task)
+def record_task_deleted(sender, instance, **kwargs):
+    TaskTombstone.objects.create(task_id=instance.pk, user_id=instance.user_id)
+
+
+@receiver(post_save, sender=Task)
+def record_task_reassigned(sender, instance, created, **kwargs):
+    previous_user_id = instance.get_loaded_value('user_id')
+    if not created and previous_user_id is not None and previous_user_id != instance.user_id:
+        TaskTombstone.objects.create(task_id=instance.pk, user_id=previous_user_id)
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def record_bulk_tasks_reassigned(sender, instances, created, **kwargs):
+    if created:
+        return
+    TaskTombstone.objects.bulk_create([
+        TaskTombstone(task_id=task.pk, user_id=task.get_loaded_value('user_id'))
+        for task in instances
+        if task.get_loaded_value('user_id') not in (None, task.user_id)
+    ])
+
+
+# Cached API payloads (tasks.caching) are dropped once the write commits, so
+# a concurrent read can't cache the pre-commit state under the new version
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_response_cache(sender, instance, **kwargs):
+    task_id, user_ids = instance.pk, (instance.user_id, instance.get_loaded_value('user_id'))
+    transaction.on_commit(lambda: invalidate_task_responses([task_id], user_ids))
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def invalidate_bulk_task_response_cache(sender, instances, **kwargs):
+    task_ids = [task.pk for task in instances]
+    user_ids = set()
+    for task in instances:
+        user_ids.update((task.user_id, task.get_loaded_value('user_id')))
+    transaction.on_commit(lambda: invalidate_task_responses(task_ids, user_ids))
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_task_response_cache(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_task_responses(user_ids=[user_id]))
+
+
+def _completion_notifications(tasks):
+    return [
+        new_job('tasks.notify_completed', key=f'task-completed:{task.pk}', task_id=task.pk)
+        for task in tasks
+        if task.status == 'completed' and task.get_loaded_value('status') not in (None, 'completed')
+    ]
+
+
+# Notifications are sent by the job worker, not while the request waits.
+# The job row is part of the task's transaction: no notification for a
+# completion that rolled back.
+@receiver(post_save, sender=Task)
+def notify_task_completed(sender, instance, created, **kwargs):
+    if not created:
+        enqueue_many(_completion_notifications([instance]))
+
+
+@receiver(tasks_bulk_saved, sender=Task)
+def notify_bulk_tasks_completed(sender, instances, created, **kwargs):
+    if not created:
+        enqueue_many(_completion_notifications(instances))
+
+
+@receiver(post_delete, sender=Job)
+def delete_export_file(sender, instance, **kwargs):
+    if instance.name == 'tasks.export':
+        export_path(instance.payload['file']).unlink(missing_ok=True)
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
+
+from .models import Task, UserTaskStats
+
+STATS_FIELDS = ('total_tasks', 'pending_tasks', 'in_progress_tasks', 'completed_tasks', 'total_hours')
+
+
+def stats_cache_key(user_id):
+    return f'task_stats:{user_id}'
+
+
+def _stats_aggregates():
+    return {
+        'total_tasks': Count('id'),
+        'pending_tasks': Count('id', filter=Q(status='pending')),
+        'in_progress_tasks': Count('id', filter=Q(status='in_progress')),
+        'completed_tasks': Count('id', filter=Q(status='completed')),
+        'total_hours': Sum('worked_hours', filter=Q(status='completed')),
+    }
+
+
+def aggregate_task_stats_by_user(queryset=None):
+    """Compute UserTaskStats values for every user with tasks, keyed by user id"""
+    if queryset is None:
+        queryset = Task.objects.all()
+    rows = queryset.values('user').annotate(
+        last_activity_at=Max('updated_at'),
+        **_stats_aggregates(),
+    ).order_by()
+
+    stats = {}
+    for row in rows:
+        row['total_hours'] = row['total_hours'] or 0
+        stats[row.pop('user')] = row
+    return stats
+
+
+def read_user_task_stats(user):
+    """Read a user's counters from their UserTaskStats row (zeros if they have none)"""
+    stats = UserTaskStats.objects.filter(user=user).values(*STATS_FIELDS).first()
+    return stats or dict.fromkeys(STATS_FIELDS, 0)
+
+
+def get_user_task_stats(user):
+    """
+    Return the task statistics block for ``user``.
+
+    Results are cached per user for ``TASK_STATS_CACHE_TIMEOUT`` seconds
+    (0 disables caching) and invalidated whenever one of their tasks changes.
+    """
+    timeout = getattr(settings, 'TASK_STATS_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return read_user_task_stats(user)
+
+    key = stats_cache_key(user.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = read_user_task_stats(user)
+        cache.set(key, stats, timeout)
+    return stats
+
+
+def invalidate_user_task_stats(*user_ids):
+    cache.delete_many([stats_cache_key(user_id) for user_id in user_ids if user_id])
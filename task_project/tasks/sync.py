@@ -0,0 +1,105 @@
+"""
+Delta sync for the task list APIs (``?since=<watermark>``).
+
+A sync response lists the tasks updated after the watermark, the ids of
+tasks deleted (or reassigned away) since then, and a new watermark to send
+next time. Watermarks are opaque (updated_at, id) positions; an ISO
+datetime is accepted as the starting point.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.response import Response
+
+from .pagination import TaskCursorPagination, decode_cursor, encode_cursor, row_value
+from .serializers import TaskSerializer, task_read_serializer
+
+# Watermarks trail the sync time by this much, so rows committed by
+# transactions still running during a sync are picked up by the next one
+SYNC_OVERLAP = datetime.timedelta(seconds=5)
+
+
+class SyncExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "'since' is older than the deletion log; fetch the full task list again."
+    default_code = 'sync_expired'
+
+
+def parse_since(value):
+    """Return the (updated_at, id) position of a ``since`` value; id is None for plain datetimes"""
+    try:
+        since_at = parse_datetime(value)
+    except ValueError:
+        since_at = None
+    if since_at is not None:
+        if timezone.is_naive(since_at):
+            since_at = timezone.make_aware(since_at, datetime.timezone.utc)
+        return since_at, None
+    try:
+        return decode_cursor(value)
+    except NotFound:
+        raise ValidationError({'since': ["Expected a watermark or an ISO 8601 datetime."]})
+
+
+def task_changes(queryset, tombstones, since, page_size):
+    """
+    Return ``(tasks, deleted_ids, watermark, has_more)`` for the tasks in
+    ``queryset`` changed after ``since`` and the ``tombstones`` recorded
+    since then, oldest change first.
+    """
+    started = timezone.now()
+    since_at, since_pk = since
+    retention = datetime.timedelta(days=getattr(settings, 'TASK_TOMBSTONE_RETENTION_DAYS', 30))
+    if since_at < started - retention:
+        raise SyncExpired()
+
+    position = Q(updated_at__gt=since_at)
+    if since_pk is not None:
+        position |= Q(updated_at=since_at, id__gt=since_pk)
+    tasks = list(queryset.filter(position).order_by('updated_at', 'id')[:page_size + 1])
+
+    tombstones = tombstones.filter(deleted_at__gt=since_at)
+    has_more = len(tasks) > page_size
+    if has_more:
+        tasks = tasks[:page_size]
+        last_at, last_pk = row_value(tasks[-1], 'updated_at'), row_value(tasks[-1], 'id')
+        watermark = encode_cursor(last_at, last_pk)
+        tombstones = tombstones.filter(deleted_at__lte=last_at)
+    else:
+        watermark = encode_cursor(max(since_at, started - SYNC_OVERLAP), 0)
+
+    # Tasks reassigned back into the scope are live again, not deleted
+    deleted_ids = sorted(set(
+        tombstones.exclude(task_id__in=queryset.values('id')).values_list('task_id', flat=True)
+    ))
+    return tasks, deleted_ids, watermark, has_more
+
+
+def sync_response(request, queryset, tombstones):
+    """Build the ``?since=`` response of a task list view"""
+    since = parse_since(request.query_params['since'])
+    fields = TaskSerializer.requested_fields(request)
+    page_size = TaskCursorPagination().get_page_size(request)
+
+    serializer_class = task_read_serializer()
+    tasks, deleted_ids, watermark, has_more = task_changes(
+        serializer_class.optimize_queryset(queryset, fields), tombstones, since, page_size
+    )
+
+    next_link = None
+    if has_more:
+        params = request.query_params.copy()
+        params['since'] = watermark
+        next_link = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    return Response({
+        'next': next_link,
+        'watermark': watermark,
+        'results': serializer_class(tasks, many=True, fields=fields).data,
+        'deleted': deleted_ids,
+    })
@@ -1,3 +1,1772 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import decimal
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from accounts.serializers import RoleTokenObtainPairSerializer
+from jobs.models import Job
+from jobs.queue import run_pending_jobs
+from jobs.worker import Worker
+from task_project import cache as cache_settings, db, metrics, renderers
+from task_project.parsers import ORJSONParser
+from task_project.queries import QueryInspectorMiddleware, QueryRecorder, query_template
+from task_project.renderers import ORJSONRenderer
+from task_project.testing import QueryBudgetMixin
+
+from .analytics import aggregate_worked_hours
+from .caching import scope_version_key
+from .async_views import event_scope, stream_events
+from .due import current_at_risk, scan_due_tasks
+from .events import TaskEventBroker, broker
+from .models import AtRiskTask, Task, TaskTombstone, UserTaskStats, WorkedHoursRollup, WorkedHoursRollupManager
+from .pagination import decode_cursor, encode_cursor
+from .search import MAX_SEARCH_PAGE, search_task_ids
+from .serializers import TaskCompleteSerializer, TaskRowSerializer, TaskSerializer
+from .stats import STATS_FIELDS, aggregate_task_stats_by_user, get_user_task_stats
+from .sync import SYNC_OVERLAP, SyncExpired
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output checked is SQLite specific')
+class TaskQueryPlanTests(TestCase):
+    """Fail when a hot Task query falls back to a full table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+
+        for i in range(5):
+            Task.objects.create(
+                title=f'Task {i}',
+                user=cls.user,
+                due_date=datetime.date.today(),
+                status='completed' if i % 2 else 'pending',
+            )
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            self.assertIsNone(
+                re.search(r'SCAN (tasks_task|tasks_tasktombstone|tasks_workedhoursrollup|tasks_atrisktask|accounts_profile)\s*$', line),
+                f'Full table scan in query plan:\n{plan}',
+            )
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', line, f'Unindexed sort in query plan:\n{plan}')
+
+    def test_user_status_counts(self):
+        self.assertNoFullScan(Task.objects.filter(user=self.user, status='pending'))
+
+    def test_user_completed_hours(self):
+        # aggregate() has no explain(), so check the underlying filter
+        queryset = Task.objects.filter(user=self.user, status='completed')
+        self.assertNoFullScan(queryset.values('user').annotate(hours=Sum('worked_hours')))
+
+    def test_user_tasks_newest_first(self):
+        self.assertNoFullScan(Task.objects.filter(user=self.user).order_by('-created_at', '-id')[:50])
+
+    def test_all_tasks_newest_first(self):
+        self.assertNoFullScan(Task.objects.order_by('-created_at', '-id')[:50])
+
+    def test_user_completed_reports(self):
+        self.assertNoFullScan(Task.objects.filter(user=self.user, status='completed').order_by('-updated_at'))
+
+    def test_recently_updated(self):
+        self.assertNoFullScan(Task.objects.order_by('-updated_at')[:50])
+
+    def test_task_report_lookup(self):
+        task = Task.objects.filter(status='completed').first()
+        self.assertNoFullScan(Task.objects.filter(id=task.id, status='completed'))
+
+    def test_admin_team_tasks(self):
+        self.assertNoFullScan(Task.objects.filter(user__profile__assigned_admin=self.admin))
+
+    def test_user_tasks_changed_since(self):
+        since = timezone.now() - datetime.timedelta(days=1)
+        self.assertNoFullScan(Task.objects.filter(user=self.user, updated_at__gt=since).order_by('updated_at', 'id'))
+
+    def test_user_tombstones_since(self):
+        since = timezone.now() - datetime.timedelta(days=1)
+        self.assertNoFullScan(TaskTombstone.objects.filter(user=self.user, deleted_at__gt=since))
+
+    def test_worked_hours_range(self):
+        start, end = datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)
+        rollups = WorkedHoursRollup.objects.filter(period='week', period_start__range=(start, end))
+        self.assertNoFullScan(rollups.order_by('period_start', 'user_id'))
+        self.assertNoFullScan(rollups.filter(user=self.user))
+        self.assertNoFullScan(rollups.filter(user__profile__assigned_admin=self.admin))
+
+    def test_due_scan(self):
+        today = datetime.date.today()
+        due = Task.objects.filter(status='pending', due_date__gt=today, due_date__lte=today + datetime.timedelta(days=3))
+        self.assertNoFullScan(due.order_by('due_date', 'id')[:1000])
+        at_risk = current_at_risk(AtRiskTask.objects.filter(user=self.user))
+        self.assertNoFullScan(at_risk.order_by('due_date', 'task_id')[:50])
+
+
+class UserTaskStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+
+    def create(self, **fields):
+        return Task.objects.create(title='Task', user=self.user, due_date=datetime.date(2024, 3, 1), **fields)
+
+    def stats(self):
+        return {
+            row.pop('user'): row
+            for row in UserTaskStats.objects.exclude(total_tasks=0).values('user', *STATS_FIELDS)
+        }
+
+    def assertStatsMatchTasks(self):
+        expected = {
+            user_id: {name: values[name] for name in STATS_FIELDS}
+            for user_id, values in aggregate_task_stats_by_user().items()
+        }
+        self.assertEqual(self.stats(), expected)
+
+    def test_counters(self):
+        task = self.create()
+        self.create(status='completed', completion_report='Done', worked_hours=2)
+        self.assertEqual(self.stats()[self.user.id], {
+            'total_tasks': 2, 'pending_tasks': 1, 'in_progress_tasks': 0, 'completed_tasks': 1, 'total_hours': 2.0,
+        })
+
+        task.status = 'completed'
+        task.worked_hours = 1.5
+        task.save(update_fields=['status'])
+        self.assertEqual(self.stats()[self.user.id]['total_hours'], 2.0)
+        task.save()
+        self.assertEqual(self.stats()[self.user.id]['total_hours'], 3.5)
+        task.user = self.other
+        task.save()
+        self.assertStatsMatchTasks()
+        task.delete()
+        self.assertStatsMatchTasks()
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite has no row locks')
+    def test_write_lock_before_read(self):
+        task = self.create()
+        with CaptureQueriesContext(connection) as queries:
+            task.status = 'in_progress'
+            task.save()
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        # Reading the row first would make SQLite fail concurrent saves at once
+        # with "database is locked" instead of waiting for the write lock
+        self.assertEqual(statements[:3], ['SAVEPOINT', 'UPDATE', 'SELECT'])
+
+    def test_stale_instances(self):
+        task = self.create()
+        first, second = Task.objects.get(pk=task.pk), Task.objects.get(pk=task.pk)
+        first.status = 'completed'
+        first.save()
+        # Loaded before the first save: the delta is taken from the stored row
+        second.status = 'in_progress'
+        second.save()
+        self.assertStatsMatchTasks()
+
+        second.user = self.other
+        second.save()
+        first.delete()
+        self.assertStatsMatchTasks()
+        # Already deleted: nothing left to subtract
+        second.delete()
+        self.assertStatsMatchTasks()
+
+    def test_save_with_explicit_pk(self):
+        task = self.create(status='completed', completion_report='Done', worked_hours=2)
+        Task(pk=task.pk, title='Replaced', user=self.other, due_date=task.due_date, created_at=task.created_at).save()
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertStatsMatchTasks()
+        self.assertTrue(TaskTombstone.objects.filter(task_id=task.pk, user=self.user).exists())
+
+    def test_rebuild_task_stats(self):
+        self.create()
+        self.create(status='completed', completion_report='Done', worked_hours=2)
+        Task.objects.create(title='Task', user=self.other, due_date=datetime.date(2024, 3, 1))
+        # Queryset updates bypass the counters
+        Task.objects.filter(user=self.user).update(status='in_progress')
+
+        stdout = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_task_stats', check=True, stdout=stdout)
+        self.assertIn(
+            f'user {self.user.id}: pending_tasks: 1 -> 0, in_progress_tasks: 0 -> 2, completed_tasks: 1 -> 0',
+            stdout.getvalue(),
+        )
+
+        stdout = io.StringIO()
+        call_command('rebuild_task_stats', stdout=stdout)
+        self.assertIn('Rebuilt task stats for 2 user(s), 1 had drifted', stdout.getvalue())
+        self.assertStatsMatchTasks()
+        call_command('rebuild_task_stats', check=True, stdout=io.StringIO())
+
+
+class TaskRowSerializerTests(TestCase):
+    """TaskRowSerializer must render exactly what TaskSerializer renders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('user', password='pass')
+        Task.objects.create(title='Pending', user=user, due_date=datetime.date(2024, 2, 29))
+        Task.objects.create(
+            title='Done \u2713 "quoted"',
+            description='Line one\nline two',
+            user=user,
+            due_date=datetime.date(2024, 3, 1),
+            status='completed',
+            completion_report='Finished',
+            worked_hours=2.5,
+        )
+        Task.objects.create(title='Whole hours', user=user, due_date=datetime.date(2024, 3, 2), worked_hours=3)
+
+    def assertSameJSON(self, fields):
+        queryset = Task.objects.order_by('-created_at', '-id')
+        expected = TaskSerializer(
+            list(TaskSerializer.optimize_queryset(queryset, fields)), many=True, fields=fields
+        ).data
+        actual = TaskRowSerializer(
+            list(TaskRowSerializer.optimize_queryset(queryset, fields)), many=True, fields=fields
+        ).data
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_all_fields(self):
+        self.assertSameJSON(None)
+
+    def test_sparse_fields(self):
+        self.assertSameJSON(['id', 'title', 'username'])
+        self.assertSameJSON(['worked_hours', 'due_date', 'updated_at', 'unknown'])
+
+
+class TaskPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        cls.tasks = [
+            Task.objects.create(title=f'Task {number}', user=cls.user, due_date=datetime.date(2024, 3, 1))
+            for number in range(5)
+        ]
+        Task.objects.create(title='Other', user=cls.other, due_date=datetime.date(2024, 3, 1))
+        # Ties on created_at are broken by id
+        Task.objects.filter(pk__in=[task.pk for task in cls.tasks[1:4]]).update(created_at=cls.tasks[1].created_at)
+
+    def get(self, user, url, params=None):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+        return self.client.get(url, params, HTTP_AUTHORIZATION=auth)
+
+    def test_pages(self):
+        newest_first = [task.id for task in reversed(self.tasks)]
+        response = self.get(self.user, '/api/tasks/', {'page_size': 2, 'fields': 'id,title'})
+        pages, data = [], response.json()
+        while True:
+            pages.append([task['id'] for task in data['results']])
+            self.assertTrue(all(set(task) == {'id', 'title'} for task in data['results']))
+            if data['next'] is None:
+                break
+            # The next link keeps the other parameters
+            self.assertIn('fields=id%2Ctitle', data['next'])
+            data = self.get(self.user, data['next']).json()
+        self.assertEqual(pages, [newest_first[:2], newest_first[2:4], newest_first[4:]])
+
+        data = self.get(self.admin, '/api/admin/tasks/', {'page_size': 0}).json()
+        self.assertEqual((len(data['results']), data['next']), (6, None))
+        self.assertIn('completion_report', data['results'][0])
+
+    def test_invalid_cursor(self):
+        for url in ('/api/tasks/', '/api/admin/tasks/'):
+            user = self.admin if 'admin' in url else self.user
+            response = self.get(user, url, {'cursor': 'not-a-cursor'})
+            self.assertEqual((response.status_code, response.json()), (404, {'detail': 'Invalid cursor'}))
+
+
+class BulkTaskApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        # id=1, the task true would be taken for
+        cls.task = Task.objects.create(id=1, title='Mine', user=cls.user, due_date=datetime.date(2024, 3, 1))
+        cls.others_task = Task.objects.create(title='Theirs', user=cls.other, due_date=datetime.date(2024, 3, 1))
+
+    def send(self, method, url, items, user=None):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user or self.user).access_token}'
+        return getattr(self.client, method)(url, items, content_type='application/json', HTTP_AUTHORIZATION=auth)
+
+    def test_create_errors(self):
+        item = {'title': 'New', 'user': self.user.id, 'due_date': '2024-03-02'}
+        for items in ([], {'title': 'New'}):
+            response = self.send('post', '/api/tasks/bulk/', items)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'Expected a non-empty list of items'})
+
+        response = self.send('post', '/api/tasks/bulk/', [
+            item,
+            dict(item, due_date='soon'),
+            dict(item, status='completed'),
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['index'] for error in errors], [1, 2])
+        self.assertIn('due_date', errors[0]['errors'])
+        self.assertIn('completion_report', errors[1]['errors'])
+
+        # Ids are checked before they're looked up
+        response = self.send('post', '/api/tasks/bulk/', [
+            item, dict(item, user=True), dict(item, user=[1]), dict(item, user='\u00b2'),
+            dict(item, user=2 ** 64), dict(item, user=str(2 ** 64)),
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'errors': [
+            {'index': index, 'errors': {'user': ['Expected a user id.']}} for index in (1, 2, 3, 4, 5)
+        ]})
+
+        # Regular users may only create their own tasks
+        response = self.send('post', '/api/tasks/bulk/', [item, dict(item, user=self.other.id)])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {
+            'errors': [{'index': 1, 'errors': {'user': ['You can only create tasks for yourself.']}}],
+        })
+        self.assertEqual(Task.objects.count(), 2)
+
+        response = self.send('post', '/api/tasks/bulk/', [item, dict(item, user=self.other.id)], user=self.admin)
+        self.assertEqual((response.status_code, response.json()['created']), (201, 2))
+
+    def test_status_errors(self):
+        response = self.send('put', '/api/tasks/bulk/status/', [
+            {'id': self.task.id, 'status': 'in_progress'},
+            {'id': self.others_task.id, 'status': 'in_progress'},
+            {'id': True, 'status': 'in_progress'},
+            {'id': str(self.task.id), 'status': 'in_progress'},
+            {'id': self.task.id, 'status': 'completed'},
+            'not an item',
+            {'id': 2 ** 64, 'status': 'in_progress'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = {error['index']: error['errors'] for error in response.json()['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3, 4, 5, 6])
+        for index in (1, 2, 3, 6):
+            self.assertEqual(errors[index]['id'], ['Task not found.'])
+        self.assertIn('completion_report', errors[4])
+        # Nothing is applied while any item fails
+        self.assertEqual(Task.objects.get(pk=self.task.pk).status, 'pending')
+
+        response = self.send('put', '/api/tasks/bulk/status/', [{'id': self.task.id, 'status': 'in_progress'}])
+        self.assertEqual((response.status_code, response.json()['updated']), (200, 1))
+        self.assertEqual(Task.objects.get(pk=self.task.pk).status, 'in_progress')
+
+    def test_duplicate_ids(self):
+        response = self.send('put', '/api/tasks/bulk/status/', [
+            {'id': self.task.id, 'status': 'in_progress'},
+            {'id': self.task.id, 'status': 'in_progress'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'errors': [{'index': 1, 'errors': {'id': ['Duplicate task id.']}}]})
+        # The stats would count the change twice
+        stats = UserTaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.pending_tasks, stats.in_progress_tasks), (1, 0))
+        call_command('rebuild_task_stats', check=True, stdout=io.StringIO())
+
+        with self.assertRaises(ValueError):
+            TaskCompleteSerializer([self.task, self.task], many=True).update(
+                [self.task, self.task], [{'status': 'in_progress'}, {'status': 'in_progress'}],
+            )
+
+
+@override_settings(TASK_STATS_CACHE_TIMEOUT=0, TASK_RESPONSE_CACHE_TIMEOUT=0)
+class TaskViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Query budgets of the task views, measured with the caches off. Several
+    users with several tasks each, so a per-row query blows the budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_user('superadmin', password='pass')
+        cls.superadmin.profile.role = 'superadmin'
+        cls.superadmin.profile.save()
+
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+
+        cls.users = []
+        for i in range(4):
+            user = User.objects.create_user(f'user{i}', password='pass')
+            user.profile.assigned_admin = cls.admin
+            user.profile.save()
+            cls.users.append(user)
+            for j in range(4):
+                Task.objects.create(
+                    title=f'Task {i}.{j}',
+                    user=user,
+                    due_date=datetime.date.today(),
+                    status='completed' if j % 2 else 'pending',
+                    completion_report='Done' if j % 2 else '',
+                    worked_hours=1.5 if j % 2 else None,
+                )
+        cls.user = cls.users[0]
+        cls.task = cls.user.tasks.filter(status='pending').first()
+        cls.completed_task = cls.user.tasks.filter(status='completed').first()
+
+    def setUp(self):
+        # The response cache outlives test transactions
+        cache.clear()
+        self.user_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        self.admin_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.admin).access_token}'
+
+    def test_user_tasks(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/tasks/', HTTP_AUTHORIZATION=self.user_auth)
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_task_list(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/admin/tasks/', HTTP_AUTHORIZATION=self.admin_auth)
+        self.assertEqual(response.status_code, 200)
+
+    def test_task_report(self):
+        with self.assertQueryBudget(1):
+            response = self.client.get(
+                f'/api/tasks/{self.completed_task.id}/report/', HTTP_AUTHORIZATION=self.admin_auth
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_task_status(self):
+        # Includes locking and reading the stored row the stats deltas are
+        # computed from; two queries on SQLite, see Task.lock_stats_values
+        with self.assertQueryBudget(8):
+            response = self.client.put(
+                f'/api/tasks/{self.task.id}/', {'status': 'in_progress'},
+                content_type='application/json', HTTP_AUTHORIZATION=self.user_auth,
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_create(self):
+        items = [{'title': f'Bulk {i}', 'user': self.user.id, 'due_date': '2024-01-01'} for i in range(10)]
+        with self.assertQueryBudget(6):
+            response = self.client.post(
+                '/api/tasks/bulk/', items, content_type='application/json', HTTP_AUTHORIZATION=self.user_auth,
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_bulk_status_update(self):
+        items = [{'id': task.id, 'status': 'in_progress'} for task in self.user.tasks.all()]
+        # Reopened tasks queue a WorkedHoursRollup recompute of their day
+        with self.assertQueryBudget(9):
+            response = self.client.put(
+                '/api/tasks/bulk/status/', items, content_type='application/json', HTTP_AUTHORIZATION=self.user_auth,
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_export(self):
+        with self.assertQueryBudget(1):
+            response = self.client.get('/api/admin/tasks/export/', HTTP_AUTHORIZATION=self.admin_auth)
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+    def test_superadmin_dashboard(self):
+        self.client.force_login(self.superadmin)
+        with self.assertQueryBudget(6):
+            response = self.client.get('/api/superadmin/dashboard/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_at_risk_lists(self):
+        scan_due_tasks()
+        with self.assertQueryBudget(5):
+            response = self.client.get('/api/tasks/at-risk/', HTTP_AUTHORIZATION=self.user_auth)
+        self.assertEqual(len(response.json()['results']), 2)
+        with self.assertQueryBudget(5):
+            response = self.client.get('/api/admin/tasks/at-risk/', HTTP_AUTHORIZATION=self.admin_auth)
+        self.assertEqual(len(response.json()['results']), 8)
+
+    def test_add_task_form(self):
+        self.client.force_login(self.superadmin)
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/add-task/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_add_task(self):
+        self.client.force_login(self.superadmin)
+        with self.assertQueryBudget(7):
+            response = self.client.post('/api/add-task/', {
+                'title': 'New task',
+                'description': 'Created in a test',
+                'due_date': '2024-01-01',
+                'status': 'pending',
+                'user_id': self.user.id,
+            })
+        self.assertEqual(response.status_code, 302)
+
+    def test_update_task(self):
+        self.client.force_login(self.superadmin)
+        # Completing the task queues a WorkedHoursRollup recompute and a notification
+        with self.assertQueryBudget(11):
+            response = self.client.post(f'/api/update-task/{self.task.id}/', {
+                'title': 'Updated', 'status': 'completed', 'completion_report': 'Done', 'worked_hours': '2',
+            })
+        self.assertEqual(response.status_code, 302)
+
+    def test_delete_task(self):
+        self.client.force_login(self.superadmin)
+        # Deleting cascades to the task's AtRiskTask row
+        with self.assertQueryBudget(11):
+            response = self.client.post(f'/api/delete-task/{self.task.id}/')
+        self.assertEqual(response.status_code, 302)
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite(self):
+        config = db.database_config(Path('/srv/app'), {})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], Path('/srv/app/db.sqlite3'))
+        self.assertEqual(config['OPTIONS'], {'timeout': 20})
+
+        config = db.database_config(Path('/srv/app'), {'DB_NAME': '/tmp/other.sqlite3', 'DB_SQLITE_TIMEOUT': '5'})
+        self.assertEqual((config['NAME'], config['OPTIONS']['timeout']), ('/tmp/other.sqlite3', 5))
+
+    def test_postgres(self):
+        config = db.database_config(Path('/srv/app'), {'DB_ENGINE': 'PostgreSQL', 'DB_USER': 'tasks'})
+        self.assertEqual(config, {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': 'task_management',
+            'USER': 'tasks',
+            'PASSWORD': '',
+            'HOST': 'localhost',
+            'PORT': '5432',
+            'CONN_MAX_AGE': 60,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        })
+
+        config = db.postgres_config({
+            'DB_CONN_MAX_AGE': '0', 'DB_CONN_HEALTH_CHECKS': 'off', 'DB_PGBOUNCER': 'yes',
+        })
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (0, False))
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+
+        with self.assertRaises(ImproperlyConfigured):
+            db.postgres_config({'DB_CONN_MAX_AGE': 'forever'})
+
+    def test_pool(self):
+        env = {'DB_POOL': '1', 'DB_POOL_MAX_SIZE': '20'}
+        with mock.patch.object(db.django, 'VERSION', (4, 2, 7, 'final', 0)), self.assertRaises(ImproperlyConfigured):
+            db.postgres_config(env)
+        with mock.patch.object(db.django, 'VERSION', (5, 1, 0, 'final', 0)):
+            config = db.postgres_config(env)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20})
+
+
+class CacheConfigTests(SimpleTestCase):
+    def test_backends(self):
+        config = cache_settings.cache_config({})
+        self.assertEqual(config['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertFalse(cache_settings.cache_is_shared(config))
+
+        config = cache_settings.cache_config({'CACHE_BACKEND': 'Redis', 'CACHE_LOCATION': 'redis://cache:6379/1'})
+        self.assertEqual(config['LOCATION'], 'redis://cache:6379/1')
+        self.assertTrue(cache_settings.cache_is_shared(config))
+
+        with self.assertRaises(ImproperlyConfigured):
+            cache_settings.cache_config({'CACHE_BACKEND': 'memcached'})
+
+    def test_invalidated_cache_timeout(self):
+        timeout = cache_settings.invalidated_cache_timeout
+        local = cache_settings.cache_config({})
+        shared = cache_settings.cache_config({'CACHE_BACKEND': 'file'})
+
+        self.assertEqual(timeout({}, 'TASK_RESPONSE_CACHE_TIMEOUT', shared), 300)
+        self.assertEqual(timeout({'TASK_RESPONSE_CACHE_TIMEOUT': '60'}, 'TASK_RESPONSE_CACHE_TIMEOUT', shared), 60)
+        # Other processes would keep serving what this one invalidated
+        self.assertEqual(timeout({}, 'TASK_RESPONSE_CACHE_TIMEOUT', local), 0)
+        self.assertEqual(timeout({'TASK_RESPONSE_CACHE_TIMEOUT': '0'}, 'TASK_RESPONSE_CACHE_TIMEOUT', local), 0)
+        with self.assertRaises(ImproperlyConfigured):
+            timeout({'TASK_RESPONSE_CACHE_TIMEOUT': '60'}, 'TASK_RESPONSE_CACHE_TIMEOUT', local)
+
+
+@override_settings(TASK_STATS_CACHE_TIMEOUT=300, TASK_RESPONSE_CACHE_TIMEOUT=300)
+class TaskCacheInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.task = Task.objects.create(
+            title='Task', user=cls.user, due_date=datetime.date(2024, 3, 1), status='completed', worked_hours=2,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, user, url):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+        response = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, user, url):
+        return [task['title'] for task in self.get(user, url)['results']]
+
+    def test_task_changes(self):
+        report_url = f'/api/tasks/{self.task.id}/report/'
+        self.assertEqual(self.titles(self.user, '/api/tasks/'), ['Task'])
+        self.assertEqual(self.titles(self.admin, '/api/admin/tasks/'), ['Task'])
+        self.assertEqual(self.get(self.admin, report_url)['title'], 'Task')
+        with self.assertNumQueries(0):
+            self.get(self.user, '/api/tasks/')
+            self.get(self.admin, '/api/admin/tasks/')
+            self.get(self.admin, report_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'Renamed'
+            self.task.save()
+        self.assertEqual(self.titles(self.user, '/api/tasks/'), ['Renamed'])
+        self.assertEqual(self.titles(self.admin, '/api/admin/tasks/'), ['Renamed'])
+        self.assertEqual(self.get(self.admin, report_url)['title'], 'Renamed')
+
+        # Reassigning drops the task from the old owner's cached list
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.user = self.admin
+            self.task.save()
+        self.assertEqual(self.titles(self.user, '/api/tasks/'), [])
+
+    def test_profile_changes(self):
+        self.get(self.user, '/api/tasks/')
+        version = cache.get(scope_version_key(('user', self.user.id)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.assigned_admin = self.admin
+            self.user.profile.save()
+        self.assertGreater(cache.get(scope_version_key(('user', self.user.id))), version)
+
+    def test_stats(self):
+        self.assertEqual(get_user_task_stats(self.user)['completed_tasks'], 1)
+        with self.assertNumQueries(0):
+            get_user_task_stats(self.user)
+        Task.objects.create(title='Other', user=self.user, due_date=datetime.date(2024, 3, 2))
+        self.assertEqual(get_user_task_stats(self.user)['total_tasks'], 2)
+
+
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.task = Task.objects.create(
+            title='Task', user=cls.user, due_date=datetime.date(2024, 3, 1), status='completed', worked_hours=2,
+        )
+
+    def get(self, user, url, **headers):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+        return self.client.get(url, HTTP_AUTHORIZATION=auth, **headers)
+
+    def test_validators(self):
+        endpoints = [
+            (self.user, '/api/tasks/'),
+            (self.admin, '/api/admin/tasks/'),
+            (self.admin, f'/api/tasks/{self.task.id}/report/'),
+        ]
+        # Cache hits rebuild the validators from the cached entry
+        for timeout in (0, 300):
+            cache.clear()
+            for user, url in endpoints:
+                with self.subTest(url=url, cache_timeout=timeout), self.settings(TASK_RESPONSE_CACHE_TIMEOUT=timeout):
+                    response = self.get(user, url)
+                    etag = response['ETag']
+                    self.assertNotIn('Last-Modified', response)
+
+                    not_modified = self.get(user, url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual((not_modified.status_code, not_modified.content), (304, b''))
+                    self.assertEqual(not_modified['ETag'], etag)
+                    self.assertEqual(self.get(user, url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+                    self.assertEqual(self.get(user, url, HTTP_IF_MATCH=etag).status_code, 200)
+                    failed = self.get(user, url, HTTP_IF_MATCH='"other"')
+                    self.assertEqual((failed.status_code, failed['ETag']), (412, etag))
+
+    def test_write_in_the_same_second(self):
+        first = self.get(self.user, '/api/tasks/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'Renamed'
+            self.task.save()
+        # A date can't tell the two versions apart, so only the ETag counts
+        later = http_date(time.time() + 60)
+        response = self.get(self.user, '/api/tasks/', HTTP_IF_MODIFIED_SINCE=later)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], 'Renamed')
+        self.assertEqual(
+            self.get(self.user, '/api/tasks/', HTTP_IF_NONE_MATCH=first['ETag'], HTTP_IF_MODIFIED_SINCE=later).status_code,
+            200,
+        )
+        self.assertEqual(self.get(self.user, '/api/tasks/', HTTP_IF_MATCH=first['ETag']).status_code, 412)
+
+    def test_write_committed_late(self):
+        # Another user's write stamped later than ours, but committed first
+        other = User.objects.create_user('other', password='pass')
+        Task.objects.create(title='Theirs', user=other, due_date=datetime.date(2024, 3, 1))
+        UserTaskStats.objects.filter(user=other).update(
+            last_activity_at=timezone.now() + datetime.timedelta(minutes=1),
+        )
+        first = self.get(self.admin, '/api/admin/tasks/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'Renamed'
+            self.task.save()
+        response = self.get(self.admin, '/api/admin/tasks/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', [task['title'] for task in response.json()['results']])
+
+        # Rebuilding the stats moves every version on too
+        etag = response['ETag']
+        call_command('rebuild_task_stats', stdout=io.StringIO())
+        self.assertEqual(self.get(self.admin, '/api/admin/tasks/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TaskSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        cls.hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        cls.tasks = [
+            Task.objects.create(title=f'Task {number}', user=cls.user, due_date=datetime.date(2024, 3, 1))
+            for number in range(4)
+        ]
+        # Spread the updates out, well before the sync overlap
+        for minutes, task in enumerate(cls.tasks):
+            Task.objects.filter(pk=task.pk).update(updated_at=cls.hour_ago + datetime.timedelta(minutes=minutes))
+
+    def sync(self, user, since, url='/api/tasks/', **params):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+        response = self.client.get(url, {'since': since, **params}, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, data):
+        return [task['id'] for task in data['results']]
+
+    def test_changes_and_tombstones(self):
+        first, updated, deleted, reassigned = self.tasks
+        deleted_id = deleted.id
+        data = self.sync(self.user, (self.hour_ago - datetime.timedelta(minutes=1)).isoformat())
+        self.assertEqual(self.ids(data), [task.id for task in self.tasks])
+        self.assertEqual((data['deleted'], data['next']), ([], None))
+        # The next watermark trails the sync a little, past the last change
+        watermark_at, watermark_pk = decode_cursor(data['watermark'])
+        self.assertGreater(watermark_at, self.hour_ago + datetime.timedelta(minutes=3))
+        self.assertLessEqual(watermark_at, timezone.now() - SYNC_OVERLAP)
+        self.assertEqual(watermark_pk, 0)
+
+        updated.refresh_from_db()
+        updated.status = 'in_progress'
+        updated.save()
+        deleted.delete()
+        reassigned.refresh_from_db()
+        reassigned.user = self.other
+        reassigned.save()
+
+        data = self.sync(self.user, data['watermark'])
+        self.assertEqual(self.ids(data), [updated.id])
+        self.assertEqual(data['results'][0]['status'], 'in_progress')
+        self.assertEqual(data['deleted'], sorted([deleted_id, reassigned.id]))
+
+        since = self.hour_ago.isoformat()
+        other = self.sync(self.other, since)
+        self.assertEqual((self.ids(other), other['deleted']), ([reassigned.id], []))
+        # Across every user a reassignment is an update, not a deletion
+        everyone = self.sync(self.admin, since, url='/api/admin/tasks/')
+        self.assertEqual(everyone['deleted'], [deleted_id])
+        self.assertNotIn(first.id, self.ids(everyone))
+
+        # Reassigned back: live again, no longer deleted
+        reassigned.user = self.user
+        reassigned.save()
+        data = self.sync(self.user, since)
+        self.assertIn(reassigned.id, self.ids(data))
+        self.assertEqual(data['deleted'], [deleted_id])
+
+    def test_pages(self):
+        since = (self.hour_ago - datetime.timedelta(minutes=1)).isoformat()
+        data = self.sync(self.user, since, page_size=3, fields='id')
+        self.assertEqual(self.ids(data), [task.id for task in self.tasks[:3]])
+        self.assertEqual(decode_cursor(data['watermark']), (self.hour_ago + datetime.timedelta(minutes=2), self.tasks[2].id))
+        self.assertIn('page_size=3', data['next'])
+        self.assertEqual(data['results'][0], {'id': self.tasks[0].id})
+
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        rest = self.client.get(data['next'], HTTP_AUTHORIZATION=auth).json()
+        self.assertEqual((self.ids(rest), rest['next']), ([self.tasks[3].id], None))
+
+    @override_settings(TASK_TOMBSTONE_RETENTION_DAYS=30)
+    def test_expired_and_invalid(self):
+        expired = encode_cursor(timezone.now() - datetime.timedelta(days=31), 0)
+        for user, url in ((self.admin, '/api/admin/tasks/'), (self.user, '/api/tasks/')):
+            auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+            response = self.client.get(url, {'since': expired}, HTTP_AUTHORIZATION=auth)
+            self.assertEqual(response.status_code, 410)
+            self.assertEqual(response.json()['detail'], SyncExpired.default_detail)
+        # A plain datetime within the retention starts a sync
+        self.sync(self.user, (timezone.now() - datetime.timedelta(days=29)).isoformat())
+
+        response = self.client.get('/api/tasks/', {'since': 'yesterday'}, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'since': ['Expected a watermark or an ISO 8601 datetime.']})
+
+
+class AsyncTaskViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        cls.tasks = [
+            Task.objects.create(title=f'Task {number}', user=cls.user, due_date=datetime.date(2024, 3, 1))
+            for number in range(3)
+        ]
+        cls.completed = Task.objects.create(
+            title='Done', user=cls.other, due_date=datetime.date(2024, 3, 1),
+            status='completed', completion_report='Report', worked_hours=2,
+        )
+
+    def headers(self, user):
+        return {'authorization': f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'}
+
+    async def test_authentication(self):
+        for headers in ({}, {'authorization': 'Bearer not-a-token'}):
+            response = await self.async_client.get('/api/async/tasks/', headers=headers)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = await self.async_client.post('/api/async/tasks/', headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_user_tasks_pages(self):
+        response = await self.async_client.get('/api/async/tasks/', {'page_size': 2}, headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        newest_first = [task.id for task in reversed(self.tasks)]
+        self.assertEqual([task['id'] for task in data['results']], newest_first[:2])
+
+        response = await self.async_client.get(data['next'], headers=self.headers(self.user))
+        data = response.json()
+        self.assertEqual(([task['id'] for task in data['results']], data['next']), (newest_first[2:], None))
+
+        response = await self.async_client.get('/api/async/tasks/', {'cursor': 'bogus'}, headers=self.headers(self.user))
+        self.assertEqual((response.status_code, response.json()), (404, {'detail': 'Invalid cursor'}))
+
+    async def test_roles(self):
+        report_url = f'/api/async/admin/tasks/{self.completed.id}/report/'
+        for url in ('/api/async/admin/tasks/', report_url):
+            response = await self.async_client.get(url, headers=self.headers(self.user))
+            self.assertEqual(response.status_code, 403)
+
+        response = await self.async_client.get('/api/async/admin/tasks/', headers=self.headers(self.admin))
+        self.assertEqual(len(response.json()['results']), 4)
+        response = await self.async_client.get(report_url, headers=self.headers(self.admin))
+        self.assertEqual((response.status_code, response.json()['title']), (200, 'Done'))
+        # Only completed tasks have a report
+        response = await self.async_client.get(
+            f'/api/async/admin/tasks/{self.tasks[0].id}/report/', headers=self.headers(self.admin),
+        )
+        self.assertEqual((response.status_code, response.json()), (404, {'detail': 'Not found.'}))
+
+    async def test_update_task_status(self):
+        url = f'/api/async/tasks/{self.tasks[0].id}/'
+        response = await self.async_client.put(
+            url, {'status': 'completed', 'completion_report': 'Done', 'worked_hours': 3},
+            content_type='application/json', headers=self.headers(self.user),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['task']['status'], 'completed')
+        stats = await UserTaskStats.objects.aget(user=self.user)
+        self.assertEqual((stats.completed_tasks, stats.total_hours), (1, 3))
+
+        response = await self.async_client.patch(
+            url, {'status': 'completed'}, content_type='application/json', headers=self.headers(self.user),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('completion_report', response.json())
+        response = await self.async_client.put(
+            url, '{"status":', content_type='application/json', headers=self.headers(self.user),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+        # Someone else's task doesn't exist for the caller
+        response = await self.async_client.put(
+            url, {'status': 'pending'}, content_type='application/json', headers=self.headers(self.other),
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class TaskEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_user('superadmin', password='pass')
+        cls.superadmin.profile.role = 'superadmin'
+        cls.superadmin.profile.save()
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+        cls.other = User.objects.create_user('other', password='pass')
+
+    @staticmethod
+    def received(subscription):
+        events = []
+        while not subscription.queue.empty():
+            event = subscription.queue.get_nowait()
+            events.append((event['event'], event['data'].get('id')))
+        return events
+
+    async def publish(self, broker, events):
+        # Publishers run in sync code: the admin scopes need a query
+        await sync_to_async(broker.publish)(events)
+        # Deliveries are scheduled on the subscribers' loop
+        await asyncio.sleep(0)
+
+    async def test_fan_out(self):
+        broker = TaskEventBroker()
+        subscriptions = {
+            'user': broker.subscribe(event_scope(self.user)),
+            'other': broker.subscribe(event_scope(self.other)),
+            'admin': broker.subscribe(event_scope(self.admin)),
+            'superadmin': broker.subscribe(event_scope(self.superadmin)),
+        }
+        self.assertEqual(subscriptions['admin'].scope, ('admin', self.admin.id))
+        self.assertEqual(subscriptions['superadmin'].scope, ('all',))
+
+        await self.publish(broker, [('created', self.user.id, {'id': 1}), ('deleted', self.other.id, {'id': 2})])
+        self.assertEqual(
+            {name: self.received(subscription) for name, subscription in subscriptions.items()},
+            {
+                'user': [('created', 1)],
+                'other': [('deleted', 2)],
+                'admin': [('created', 1)],
+                'superadmin': [('created', 1), ('deleted', 2)],
+            },
+        )
+
+        broker.unsubscribe(subscriptions.pop('superadmin'))
+        await self.publish(broker, [('updated', self.user.id, {'id': 1})])
+        self.assertEqual([self.received(subscription) for subscription in subscriptions.values()], [
+            [('updated', 1)], [], [('updated', 1)],
+        ])
+
+    async def test_slow_client_resync(self):
+        with mock.patch('tasks.events.SUBSCRIBER_QUEUE_SIZE', 2):
+            stream = stream_events(('user', self.user.id))
+            self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+        self.assertTrue(broker.has_subscribers())
+
+        # Nobody reads the stream while three events arrive
+        await self.publish(broker, [('updated', self.user.id, {'id': number}) for number in (1, 2, 3)])
+        # The oldest event makes room for the resync notice
+        self.assertRegex(await anext(stream), r'^id: \d+\nevent: updated\ndata: \{"id":2\}\n\n$')
+        self.assertRegex(await anext(stream), r'^id: \d+\nevent: resync\ndata: \{\}\n\n$')
+        # The client refetches its list and reconnects
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertFalse(broker.has_subscribers())
+
+    def test_published_on_commit(self):
+        task = Task.objects.create(title='Task', user=self.user, due_date=datetime.date(2024, 3, 1))
+        with mock.patch.object(broker, 'has_subscribers', return_value=True), \
+                mock.patch.object(broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                task.status = 'completed'
+                task.completion_report = 'Done'
+                task.worked_hours = 1
+                task.save()
+                publish.assert_not_called()
+            [(events,), _] = publish.call_args
+            self.assertEqual([(event, user_id) for event, user_id, _ in events], [('completed', self.user.id)])
+
+            publish.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                task.user = self.other
+                task.save()
+            [(events,), _] = publish.call_args
+            self.assertEqual(
+                [(event, user_id, data['id']) for event, user_id, data in events],
+                [('deleted', self.user.id, task.id), ('created', self.other.id, task.id)],
+            )
+
+
+@unittest.skipIf(renderers.orjson is None, 'orjson is not installed')
+class ORJSONTests(SimpleTestCase):
+    """ORJSONRenderer / ORJSONParser against DRF's JSONRenderer / JSONParser"""
+
+    def test_render(self):
+        values = [
+            1.5, 0.1, -0.0, 123456789.12345679, 2 ** 63 - 1, 2 ** 64, decimal.Decimal('1.10'),
+            datetime.datetime(2024, 3, 4, 5, 6, 7, 123456), timezone.make_aware(datetime.datetime(2024, 3, 4, 5, 6)),
+            datetime.date(2024, 1, 2), datetime.time(1, 2, 3, 4567), datetime.timedelta(seconds=90),
+            'café \u2028 \u2029 \U0001F600 "q" \\ \x01', {1: 'int key', 'a': None}, (1, True),
+        ]
+        for value in values:
+            with self.subTest(value=value):
+                self.assertEqual(ORJSONRenderer().render(value), JSONRenderer().render(value))
+
+        indented = {'accepted_media_type': 'application/json; indent=2'}
+        self.assertEqual(
+            ORJSONRenderer().render({'a': [1]}, **indented), JSONRenderer().render({'a': [1]}, **indented),
+        )
+
+    def test_render_differences(self):
+        # Documented in ORJSONRenderer: exponents are spelled differently...
+        for value in (1e16, 1e-7, 1e300):
+            self.assertNotEqual(ORJSONRenderer().render(value), JSONRenderer().render(value))
+            self.assertEqual(json.loads(ORJSONRenderer().render(value)), value)
+        # ...and non-finite floats become null instead of an error
+        for value in (float('nan'), float('inf')):
+            self.assertEqual(ORJSONRenderer().render([value]), b'[null]')
+            with self.assertRaises(ValueError):
+                JSONRenderer().render([value])
+
+    def test_parse(self):
+        def parse(parser, body, encoding='utf-8'):
+            try:
+                return parser.parse(io.BytesIO(body), parser_context={'encoding': encoding})
+            except ParseError:
+                return ParseError
+
+        bodies = [
+            b'{"a": 1.5, "b": [1, 2e3, -0.0, 1E5], "c": null, "d": true}',
+            '["café \u2028", "\\u00e9"]'.encode(),
+            b'123456789012345678901234567890', b'[18446744073709551617]', b'1e400', b'"\\ud800"',
+            b'{"a": 1, "a": 2}', b'NaN', b'[1,]', b'', b'\xff',
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(repr(parse(ORJSONParser(), body)), repr(parse(JSONParser(), body)))
+        latin = '{"a": "café"}'.encode('latin-1')
+        self.assertEqual(parse(ORJSONParser(), latin, 'latin-1'), {'a': 'café'})
+
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{i}', password='pass') for i in range(3)]
+
+    def test_query_template(self):
+        self.assertEqual(
+            query_template('SELECT *\n  FROM t WHERE id IN (%s, %s, %s) AND a = %s'),
+            query_template('SELECT * FROM t WHERE id IN (%s) AND a = %s'),
+        )
+
+    def test_duplicates(self):
+        recorder = QueryRecorder()
+        with recorder.record():
+            for user in self.users:
+                User.objects.get(pk=user.pk)
+            User.objects.count()
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(list(recorder.duplicates().values()), [3])
+        self.assertEqual(recorder.duplicate_count, 2)
+
+    @override_settings(QUERY_INSPECTOR=True)
+    def test_response_headers(self):
+        self.client.force_login(self.users[0])
+        response = self.client.get('/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Query-Count']), 0)
+        self.assertIn('X-DB-Query-Time-Ms', response)
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+
+    @override_settings(QUERY_INSPECTOR=False)
+    def test_disabled(self):
+        self.client.force_login(self.users[0])
+        self.assertNotIn('X-DB-Query-Count', self.client.get('/profile/'))
+
+    @override_settings(QUERY_INSPECTOR=True)
+    async def test_async_response_headers(self):
+        # Counted in the sync_to_async threads the async views query from
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.users[0]).access_token}'
+        response = await self.async_client.get('/api/async/tasks/', AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Query-Count']), 0)
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+
+        async def get_response(request):
+            pass
+        self.assertTrue(iscoroutinefunction(QueryInspectorMiddleware(get_response)))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', password='pass')
+        Task.objects.create(title='Task', user=cls.user, due_date=datetime.date.today())
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(metrics, 'registry', metrics.Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_request_metrics(self):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        self.client.get('/api/tasks/', HTTP_AUTHORIZATION=auth)
+        self.client.get('/no-such-page/')
+
+        labels = ('/api/tasks/', 'GET')
+        self.assertEqual(self.registry.counters['http_requests_total', labels + ('200',)], 1)
+        self.assertEqual(self.registry.counters['http_requests_total', ('unmatched', 'GET', '404')], 1)
+        self.assertEqual(self.registry.gauges['http_requests_in_progress', labels], 0)
+        self.assertGreater(self.registry.counters['http_request_db_queries_total', labels], 0)
+        for name in ('http_request_duration_seconds', 'http_request_db_seconds', 'http_request_serialization_seconds'):
+            counts, total = self.registry.histograms[name, labels]
+            self.assertEqual(sum(counts), 1)
+            self.assertGreater(total, 0)
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        exposition = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', exposition)
+        self.assertIn('http_requests_total{route="/api/tasks/",method="GET",status="200"} 1.0', exposition)
+        self.assertIn('http_request_duration_seconds_bucket{route="/api/tasks/",method="GET",le="+Inf"} 1', exposition)
+
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+        # Tests run without DEBUG: an open /metrics is refused
+        with self.settings(METRICS_TOKEN=''), self.assertRaises(ImproperlyConfigured):
+            metrics.MetricsMiddleware(lambda request: None)
+        with self.settings(METRICS_TOKEN='', DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.client.get('/no-such-page/')
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 404)
+        self.assertEqual(dict(self.registry.counters), {})
+
+    def test_workers_add_up(self):
+        labels = ('/api/tasks/', 'GET')
+        other = metrics.Registry()
+        other.inc('http_requests_total', labels + ('200',), 2)
+        other.add('http_requests_in_progress', labels, 1)
+        other.observe('http_request_duration_seconds', labels, 0.02)
+        self.registry.inc('http_requests_total', labels + ('200',), 3)
+        self.registry.add('http_requests_in_progress', labels, 1)
+        self.registry.observe('http_request_duration_seconds', labels, 0.2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            # A worker that has exited: its counts stay, its gauges go
+            snapshot = dict(other.snapshot(), pid=2 ** 22 + 1)
+            (Path(directory) / f"1-{snapshot['pid']}.json").write_text(json.dumps(snapshot))
+            # A later worker that got the same PID doesn't replace its file
+            snapshot = dict(snapshot, gauges=[])
+            (Path(directory) / f"2-{snapshot['pid']}.json").write_text(json.dumps(snapshot))
+            with self.settings(METRICS_DIR=directory):
+                exposition = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+            self.assertTrue((Path(directory) / f'{metrics.process_name}.json').exists())
+            merged = metrics.collect(directory)
+
+        self.assertEqual(merged.counters['http_requests_total', labels + ('200',)], 7)
+        self.assertEqual(merged.gauges['http_requests_in_progress', labels], 1)
+        counts, total = merged.histograms['http_request_duration_seconds', labels]
+        self.assertEqual(counts, [0, 0, 2, 0, 0, 1, 0, 0, 0, 0, 0, 0])
+        # Summed in directory order
+        self.assertAlmostEqual(total, 0.24)
+        self.assertIn('http_requests_total{route="/api/tasks/",method="GET",status="200"} 7.0', exposition)
+
+
+@unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'Full-text index is SQLite / PostgreSQL specific')
+class TaskSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_user('superadmin', password='pass')
+        cls.superadmin.profile.role = 'superadmin'
+        cls.superadmin.profile.save()
+
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+        cls.other = User.objects.create_user('other', password='pass')
+
+        today = datetime.date.today()
+        cls.title_hit = Task.objects.create(title='Invoice reconciliation', user=cls.user, due_date=today)
+        cls.report_hit = Task.objects.create(
+            title='Month end', user=cls.user, due_date=today, status='completed',
+            completion_report='Reconciled the invoices with the bank statements', worked_hours=2,
+        )
+        cls.other_hit = Task.objects.create(title='Invoice audit', user=cls.other, due_date=today)
+        Task.objects.create(title='Unrelated', description='Nothing to see', user=cls.user, due_date=today)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, user, q, **params):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+        return self.client.get('/api/tasks/search/', {'q': q, **params}, HTTP_AUTHORIZATION=auth)
+
+    def result_ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [task['id'] for task in response.json()['results']]
+
+    def test_ranking_and_stemming(self):
+        # "invoice" matches "invoices" in the report; title matches rank first
+        self.assertEqual(
+            self.result_ids(self.search(self.superadmin, 'invoice')),
+            [self.other_hit.id, self.title_hit.id, self.report_hit.id],
+        )
+        self.assertEqual(self.result_ids(self.search(self.superadmin, 'bank invoice')), [self.report_hit.id])
+
+    def test_role_scoping(self):
+        self.assertEqual(self.result_ids(self.search(self.user, 'invoice')), [self.title_hit.id, self.report_hit.id])
+        self.assertEqual(self.result_ids(self.search(self.admin, 'invoice')), [self.title_hit.id, self.report_hit.id])
+        self.assertEqual(self.result_ids(self.search(self.other, 'invoice')), [self.other_hit.id])
+
+    def test_index_follows_writes(self):
+        self.title_hit.title = 'Receipts'
+        self.title_hit.save()
+        Task.objects.filter(pk=self.other_hit.pk).delete()
+        Task.objects.bulk_create([Task(title='Invoice batch', user=self.user, due_date=datetime.date.today())])
+        Task.objects.filter(title='Unrelated').update(description='Overdue invoice')
+
+        self.assertEqual(len(search_task_ids(['invoice'])), 3)
+        self.assertEqual(search_task_ids(['receipt']), [self.title_hit.id])
+
+    def test_pagination(self):
+        response = self.search(self.superadmin, 'invoice', page_size=2, fields='id,title')
+        self.assertEqual(len(self.result_ids(response)), 2)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+        second = self.client.get(
+            response.json()['next'],
+            HTTP_AUTHORIZATION=f'Bearer {RoleTokenObtainPairSerializer.get_token(self.superadmin).access_token}',
+        )
+        self.assertEqual(self.result_ids(second), [self.report_hit.id])
+        self.assertIsNone(second.json()['next'])
+
+        # Deep pages are refused rather than overflowing the OFFSET
+        self.assertEqual(self.result_ids(self.search(self.superadmin, 'invoice', page=MAX_SEARCH_PAGE)), [])
+        for page in (MAX_SEARCH_PAGE + 1, 2 ** 64):
+            response = self.search(self.superadmin, 'invoice', page=page)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('page', response.json())
+
+    def test_query_syntax_is_ignored(self):
+        self.assertEqual(self.result_ids(self.search(self.superadmin, '"invoice" (audit*')), [self.other_hit.id])
+        self.assertEqual(self.search(self.superadmin, '  !! ').status_code, 400)
+
+
+class WorkedHoursRollupTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_user('superadmin', password='pass')
+        cls.superadmin.profile.role = 'superadmin'
+        cls.superadmin.profile.save()
+
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+        cls.other = User.objects.create_user('other', password='pass')
+
+    def setUp(self):
+        cache.clear()
+
+    def complete(self, user, hours, completed_at):
+        return Task.objects.create(
+            title='Task', user=user, due_date=datetime.date(2024, 1, 1), status='completed',
+            completion_report='Done', worked_hours=hours, completed_at=completed_at,
+        )
+
+    def rollups(self):
+        # Task writes only queue the recomputes
+        run_pending_jobs()
+        return sorted(
+            (rollup.user_id, rollup.period, rollup.period_start, rollup.completed_tasks, round(rollup.hours, 6))
+            for rollup in WorkedHoursRollup.objects.exclude(completed_tasks=0)
+        )
+
+    def assertRollupsMatchTasks(self):
+        expected = sorted(
+            (rollup.user_id, rollup.period, rollup.period_start, rollup.completed_tasks, round(rollup.hours, 6))
+            for rollup in aggregate_worked_hours(Task.objects.all())
+        )
+        self.assertEqual(self.rollups(), expected)
+
+    def test_completed_at(self):
+        task = Task.objects.create(title='Task', user=self.user, due_date=datetime.date.today())
+        self.assertIsNone(task.completed_at)
+        task.status = 'completed'
+        task.save(update_fields=['status'])
+        task.refresh_from_db()
+        self.assertIsNotNone(task.completed_at)
+        task.status = 'in_progress'
+        task.save()
+        self.assertIsNone(Task.objects.get(pk=task.pk).completed_at)
+
+    def test_incremental_updates(self):
+        monday = timezone.make_aware(datetime.datetime(2024, 3, 4, 9))
+        first = self.complete(self.user, 2, monday)
+        self.complete(self.user, 3, monday + datetime.timedelta(days=1))
+        moved = self.complete(self.user, 1.5, monday + datetime.timedelta(days=30))
+        reopened = self.complete(self.other, 4, monday)
+        self.assertIn((self.user.id, 'week', datetime.date(2024, 3, 4), 2, 5.0), self.rollups())
+        self.assertIn((self.user.id, 'month', datetime.date(2024, 3, 1), 2, 5.0), self.rollups())
+
+        first.worked_hours = 2.5
+        first.save()
+        moved.user = self.other
+        moved.save()
+        reopened.status = 'pending'
+        reopened.save()
+        Task.objects.get(pk=first.pk).delete()
+        self.assertRollupsMatchTasks()
+
+    def test_bulk_writes(self):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        items = [
+            {'title': f'Bulk {i}', 'user': self.user.id, 'due_date': '2024-01-01', 'status': 'completed',
+             'completion_report': 'Done', 'worked_hours': i}
+            for i in range(1, 4)
+        ]
+        response = self.client.post('/api/tasks/bulk/', items, content_type='application/json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertRollupsMatchTasks()
+
+        ids = response.json()['ids']
+        response = self.client.put(
+            '/api/tasks/bulk/status/', [{'id': ids[0], 'status': 'pending'}],
+            content_type='application/json', HTTP_AUTHORIZATION=auth,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Task.objects.get(pk=ids[0]).completed_at)
+        self.assertRollupsMatchTasks()
+
+    def test_backfill(self):
+        self.complete(self.user, 2, timezone.now())
+        self.complete(self.other, 3, timezone.now() - datetime.timedelta(days=400))
+        # Written behind the model's back: no completed_at, no rollups
+        Task.objects.filter(user=self.other).update(completed_at=None)
+        WorkedHoursRollup.objects.all().delete()
+
+        call_command('backfill_worked_hours', batch_size=1, stdout=io.StringIO())
+        self.assertIsNotNone(Task.objects.get(user=self.other).completed_at)
+        self.assertRollupsMatchTasks()
+
+    def test_report(self):
+        day = datetime.date(2024, 3, 6)
+        completed_at = timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+        self.complete(self.user, 2, completed_at)
+        self.complete(self.user, 1.25, completed_at)
+        self.complete(self.other, 4, completed_at)
+        run_pending_jobs()
+        params = {'period': 'week', 'from': '2024-03-01', 'to': '2024-03-31'}
+
+        superadmin_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.superadmin).access_token}'
+        with self.assertQueryBudget(1) as queries:
+            response = self.client.get(
+                '/api/admin/analytics/hours/', {**params, 'group': 'team'}, HTTP_AUTHORIZATION=superadmin_auth,
+            )
+        self.assertFalse(any('tasks_task' in template for template, _ in queries.queries))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['from'], '2024-02-26')
+        self.assertEqual(response.json()['results'], [
+            {'period_start': '2024-03-04', 'team': self.admin.id, 'team_username': 'admin',
+             'completed_tasks': 2, 'hours': 3.25},
+            {'period_start': '2024-03-04', 'team': None, 'team_username': None,
+             'completed_tasks': 1, 'hours': 4.0},
+        ])
+
+        admin_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.admin).access_token}'
+        response = self.client.get('/api/admin/analytics/hours/', {**params, 'period': 'day'}, HTTP_AUTHORIZATION=admin_auth)
+        self.assertEqual(response.json()['results'], [
+            {'period_start': '2024-03-06', 'user': self.user.id, 'username': 'user', 'completed_tasks': 2, 'hours': 3.25},
+        ])
+
+        response = self.client.get(
+            '/api/admin/analytics/hours/', {'period': 'day', 'from': '2020-01-01'}, HTTP_AUTHORIZATION=admin_auth,
+        )
+        self.assertEqual(response.status_code, 400)
+        for bad_date in ('2024-02-30', '2024-13-45', 'march'):
+            response = self.client.get('/api/admin/analytics/hours/', {'from': bad_date}, HTTP_AUTHORIZATION=admin_auth)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'from': ['Expected a YYYY-MM-DD date.']})
+        for bad_user in ('me', '\u00b2', '0', str(2 ** 64)):
+            response = self.client.get('/api/admin/analytics/hours/', {'user': bad_user}, HTTP_AUTHORIZATION=admin_auth)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': "'user' must be a user id"})
+
+
+@override_settings(JOBS_RETRY_DELAY=0)
+class WorkedHoursRecomputeConcurrencyTests(TransactionTestCase):
+    def test_same_week_recomputes(self):
+        user = User.objects.create_user('user', password='pass')
+        monday = timezone.make_aware(datetime.datetime(2024, 3, 4, 9))
+        for day, hours in ((0, 2), (1, 3)):
+            Task.objects.create(
+                title='Task', user=user, due_date=datetime.date(2024, 3, 1), status='completed',
+                completion_report='Done', worked_hours=hours, completed_at=monday + datetime.timedelta(days=day),
+            )
+
+        # The first recompute stops between reading the day buckets and
+        # storing the week until the second one has run
+        recompute, store = WorkedHoursRollupManager.recompute, WorkedHoursRollupManager._store
+        first, first_paused, first_done, second_ran = [], threading.Event(), threading.Event(), threading.Event()
+        lock = threading.Lock()
+
+        def paused_recompute(manager, user_id, day):
+            with lock:
+                is_first = not first
+                first.append(threading.current_thread())
+            if is_first:
+                try:
+                    return recompute(manager, user_id, day)
+                finally:
+                    first_done.set()
+            if second_ran.is_set():
+                # Retried after failing on the first one's lock
+                return recompute(manager, user_id, day)
+            first_paused.wait(5)
+            try:
+                return recompute(manager, user_id, day)
+            except Exception:
+                second_ran.set()
+                # The test database doesn't wait for locks: let the first one
+                # commit before the job records its retry
+                first_done.wait(5)
+                raise
+            finally:
+                second_ran.set()
+
+        def paused_store(manager, user_id, period, start, totals):
+            if period == 'week' and threading.current_thread() is first[0] and not first_paused.is_set():
+                first_paused.set()
+                second_ran.wait(5)
+            return store(manager, user_id, period, start, totals)
+
+        with mock.patch.object(WorkedHoursRollupManager, 'recompute', paused_recompute), \
+                mock.patch.object(WorkedHoursRollupManager, '_store', paused_store), \
+                mock.patch('jobs.queue.logger'):
+            Worker(threads=2, poll_interval=0.05).run(once=True)
+
+        self.assertEqual(
+            WorkedHoursRollup.objects.values_list('completed_tasks', 'hours').get(user=user, period='week'), (2, 5.0),
+        )
+        self.assertEqual(
+            WorkedHoursRollup.objects.values_list('completed_tasks', 'hours').get(user=user, period='month'), (2, 5.0),
+        )
+
+
+@override_settings(TASK_RESPONSE_CACHE_TIMEOUT=300)
+class DueTaskScanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_user('superadmin', password='pass')
+        cls.superadmin.profile.role = 'superadmin'
+        cls.superadmin.profile.save()
+
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+        cls.other = User.objects.create_user('other', password='pass')
+
+        cls.today = timezone.localdate()
+        cls.overdue = cls.task(cls.user, -2)
+        cls.due_soon = cls.task(cls.user, 1, status='in_progress')
+        cls.later = cls.task(cls.user, 10)
+        cls.task(cls.user, -5, status='completed')
+        cls.other_overdue = cls.task(cls.other, -1)
+
+    @classmethod
+    def task(cls, user, days, status='pending'):
+        return Task.objects.create(
+            title='Task', user=user, due_date=cls.today + datetime.timedelta(days=days), status=status,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def at_risk_ids(self):
+        return set(AtRiskTask.objects.values_list('task_id', flat=True))
+
+    def at_risk(self, user, url='/api/tasks/at-risk/', **params):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(user).access_token}'
+        response = self.client.get(url, params, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_scan_watermarks(self):
+        start = timezone.now() + datetime.timedelta(hours=1)
+        self.assertEqual(scan_due_tasks(now=start), {'recorded': 3, 'removed': 0})
+        self.assertEqual(self.at_risk_ids(), {self.overdue.id, self.due_soon.id, self.other_overdue.id})
+        # Nothing new since the last run
+        self.assertEqual(scan_due_tasks(now=start + datetime.timedelta(hours=1)), {'recorded': 0, 'removed': 0})
+
+        # A week on, the horizon has moved past the later task
+        self.assertEqual(
+            scan_due_tasks(now=start + datetime.timedelta(days=7, hours=2)), {'recorded': 1, 'removed': 0}
+        )
+        self.assertIn(self.later.id, self.at_risk_ids())
+
+    def test_scan_rechecks_updated_tasks(self):
+        scan_due_tasks(chunk_size=1)
+        self.due_soon.status = 'completed'
+        self.due_soon.save()
+        self.other_overdue.due_date = self.today + datetime.timedelta(days=30)
+        self.other_overdue.save()
+        new = self.task(self.other, 0)
+
+        scan_due_tasks(chunk_size=1)
+        self.assertEqual(self.at_risk_ids(), {self.overdue.id, new.id})
+
+        # update() skips updated_at: only a full scan sees it
+        Task.objects.filter(pk=self.later.pk).update(due_date=self.today)
+        call_command('scan_due_tasks', full=True, stdout=io.StringIO())
+        self.assertEqual(self.at_risk_ids(), {self.overdue.id, self.later.id, new.id})
+
+    def test_at_risk_lists(self):
+        scan_due_tasks()
+        data = self.at_risk(self.user)
+        self.assertEqual(data['counts'], {'overdue': 1, 'due_soon': 1})
+        self.assertEqual(
+            [(task['id'], task['risk']) for task in data['results']],
+            [(self.overdue.id, 'overdue'), (self.due_soon.id, 'due_soon')],
+        )
+        self.assertEqual(
+            [task['id'] for task in self.at_risk(self.admin, '/api/admin/tasks/at-risk/')['results']],
+            [self.overdue.id, self.due_soon.id],
+        )
+        superadmin = self.at_risk(self.superadmin, '/api/admin/tasks/at-risk/', risk='overdue', page_size=1)
+        self.assertEqual([task['id'] for task in superadmin['results']], [self.overdue.id])
+        next_page = self.client.get(superadmin['next'], HTTP_AUTHORIZATION=(
+            f'Bearer {RoleTokenObtainPairSerializer.get_token(self.superadmin).access_token}'
+        ))
+        self.assertEqual([task['id'] for task in next_page.json()['results']], [self.other_overdue.id])
+
+        # Completing a task drops it before the next scan, past the response cache
+        with self.captureOnCommitCallbacks(execute=True):
+            self.overdue.status = 'completed'
+            self.overdue.save()
+        self.assertEqual([task['id'] for task in self.at_risk(self.user)['results']], [self.due_soon.id])
+
+        # A scan that changes the rows invalidates the cached lists
+        Task.objects.filter(pk=self.later.pk).update(due_date=self.today)
+        scan_due_tasks(full=True)
+        self.assertEqual(
+            [task['id'] for task in self.at_risk(self.user, fields='id')['results']],
+            [self.later.id, self.due_soon.id],
+        )
+
+    def test_invalid_risk(self):
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        response = self.client.get('/api/tasks/at-risk/', {'risk': 'late'}, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.pending = Task.objects.create(title='Café, "quoted"', user=cls.user, due_date=datetime.date(2024, 3, 1))
+        cls.completed = Task.objects.create(
+            title='Done', user=cls.user, due_date=datetime.date(2024, 3, 1), status='completed',
+            completion_report='Line one\nline two', worked_hours=1.5,
+        )
+        for task, day in ((cls.pending, 4), (cls.completed, 6)):
+            Task.objects.filter(pk=task.pk).update(
+                updated_at=timezone.make_aware(datetime.datetime(2024, 3, day, 12)),
+            )
+        Task.objects.filter(pk=cls.completed.pk).update(
+            completed_at=timezone.make_aware(datetime.datetime(2024, 3, 2, 12)),
+        )
+
+    def setUp(self):
+        self.admin_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.admin).access_token}'
+
+    def export(self, **params):
+        response = self.client.get('/api/admin/tasks/export/', params, HTTP_AUTHORIZATION=self.admin_auth)
+        if response.status_code != 200:
+            return response, None
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tasks.csv"')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:5], ['id', 'title', 'user', 'username', 'status'])
+        self.assertEqual(
+            [row[:5] for row in rows[1:]],
+            [[str(self.pending.id), 'Café, "quoted"', str(self.user.id), 'user', 'pending'],
+             [str(self.completed.id), 'Done', str(self.user.id), 'user', 'completed']],
+        )
+        self.assertEqual(rows[2][rows[0].index('completion_report')], 'Line one\nline two')
+
+    def test_ndjson(self):
+        response, body = self.export(output='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Café, "quoted"', 'Done'])
+        self.assertEqual(rows[1]['worked_hours'], 1.5)
+        self.assertEqual(rows[1]['updated_at'][:10], '2024-03-06')
+
+    def test_filters(self):
+        def ids(**params):
+            return [json.loads(line)['id'] for line in self.export(output='ndjson', **params)[1].splitlines()]
+
+        self.assertEqual(ids(status='completed'), [self.completed.id])
+        # Both bounds are inclusive days
+        self.assertEqual(ids(**{'from': '2024-03-06'}), [self.completed.id])
+        self.assertEqual(ids(to='2024-03-04'), [self.pending.id])
+        self.assertEqual(ids(**{'from': '2024-03-05', 'to': '2024-03-05'}), [])
+        self.assertEqual(ids(to='9999-12-31'), [self.pending.id, self.completed.id])
+        # Completed exports go by the completion time rather than the last update
+        self.assertEqual(ids(status='completed', **{'from': '2024-03-02', 'to': '2024-03-02'}), [self.completed.id])
+        self.assertEqual(ids(status='completed', **{'from': '2024-03-06'}), [])
+
+    def test_invalid_params(self):
+        for params in ({'output': 'xml'}, {'from': 'yesterday'}, {'to': '2024-13-45'}, {'from': '2024-02-30'},
+                       {'status': 'done'}):
+            response, _ = self.export(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+        user_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        response = self.client.get('/api/admin/tasks/export/', HTTP_AUTHORIZATION=user_auth)
+        self.assertEqual(response.status_code, 403)
+
+
+class TaskJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', email='admin@example.com', password='pass')
+        cls.admin.profile.role = 'admin'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('user', password='pass')
+        cls.user.profile.assigned_admin = cls.admin
+        cls.user.profile.save()
+        cls.task = Task.objects.create(title='Report', user=cls.user, due_date=datetime.date(2024, 3, 1))
+
+    def setUp(self):
+        cache.clear()
+        self.admin_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.admin).access_token}'
+
+    def test_completion_notification(self):
+        self.task.description = 'Edited'
+        self.task.save()
+        self.task.status = 'completed'
+        self.task.worked_hours = 2
+        self.task.save()
+        # Saving the completed task again doesn't notify twice
+        self.task.save()
+        run_pending_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['admin@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Task completed: Report')
+
+        auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(self.user).access_token}'
+        other = Task.objects.create(title='Other', user=self.user, due_date=datetime.date(2024, 3, 1))
+        response = self.client.put(
+            '/api/tasks/bulk/status/', [{'id': other.id, 'status': 'completed', 'completion_report': 'Done', 'worked_hours': 1}],
+            content_type='application/json', HTTP_AUTHORIZATION=auth,
+        )
+        self.assertEqual(response.status_code, 200)
+        run_pending_jobs()
+        self.assertEqual([message.subject for message in mail.outbox][1:], ['Task completed: Other'])
+
+    def test_export_job(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(TASK_EXPORT_DIR=directory):
+            response = self.client.post(
+                '/api/admin/tasks/exports/', {'output': 'xml'}, HTTP_AUTHORIZATION=self.admin_auth,
+            )
+            self.assertEqual(response.status_code, 400)
+            for body in ({'output': 'csv', 'from': 'yesterday'}, [], {'from': 20240101}, {'output': ['csv']},
+                         {'status': ['pending']}, {'status': 'done'}):
+                response = self.client.post(
+                    '/api/admin/tasks/exports/', body, content_type='application/json', HTTP_AUTHORIZATION=self.admin_auth,
+                )
+                self.assertEqual(response.status_code, 400, body)
+                self.assertIn('error', response.json())
+            self.assertFalse(Job.objects.exists())
+
+            response = self.client.post(
+                '/api/admin/tasks/exports/', {'output': 'csv', 'status': 'pending'}, HTTP_AUTHORIZATION=self.admin_auth,
+            )
+            self.assertEqual(response.status_code, 202)
+            url = response.json()['url']
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=self.admin_auth).json()['status'], 'queued')
+
+            run_pending_jobs()
+            response = self.client.get(url, HTTP_AUTHORIZATION=self.admin_auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Report', b''.join(response.streaming_content).decode())
+            response.close()
+
+            # Only the admin who asked for it can download it
+            superadmin = User.objects.create_user('superadmin', password='pass')
+            superadmin.profile.role = 'superadmin'
+            superadmin.profile.save()
+            superadmin_auth = f'Bearer {RoleTokenObtainPairSerializer.get_token(superadmin).access_token}'
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=superadmin_auth).status_code, 404)
+
+            # Pruning the job deletes its file
+            [path] = Path(directory).iterdir()
+            with self.captureOnCommitCallbacks(execute=True):
+                Job.objects.all().delete()
+            self.assertFalse(path.exists())
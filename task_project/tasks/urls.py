@@ -1,13 +1,34 @@
 from django.urls import path
-from .views import UserTasksView, UpdateTaskStatus, TaskReportView
-from . import views
+from .views import (
+    UserTasksView, UpdateTaskStatus, TaskListView, TaskReportView, TaskExportView,
+    BulkTaskCreateView, BulkTaskStatusUpdateView, TaskSearchView, WorkedHoursView,
+    AtRiskTasksView, TeamAtRiskTasksView, TaskExportJobsView, TaskExportJobView,
+)
+from . import async_views, views
 
 urlpatterns = [
     path('add/', views.add_task, name='add_task'),
     path('delete/<int:id>/', views.delete_task, name='delete_task'),
     path('tasks/', UserTasksView.as_view(), name='user_tasks'),
     path('tasks/<int:id>/', UpdateTaskStatus.as_view(), name='update_task'),
+    path('admin/tasks/', TaskListView.as_view(), name='task_list'),
     path('tasks/<int:id>/report/', TaskReportView.as_view(), name='task_report'),
+    path('tasks/bulk/', BulkTaskCreateView.as_view(), name='bulk_task_create'),
+    path('tasks/bulk/status/', BulkTaskStatusUpdateView.as_view(), name='bulk_task_status'),
+    path('tasks/search/', TaskSearchView.as_view(), name='task_search'),
+    path('tasks/at-risk/', AtRiskTasksView.as_view(), name='at_risk_tasks'),
+    path('admin/tasks/export/', TaskExportView.as_view(), name='task_export'),
+    path('admin/tasks/exports/', TaskExportJobsView.as_view(), name='task_export_jobs'),
+    path('admin/tasks/exports/<int:id>/', TaskExportJobView.as_view(), name='task_export_job'),
+    path('admin/tasks/at-risk/', TeamAtRiskTasksView.as_view(), name='team_at_risk_tasks'),
+    path('admin/analytics/hours/', WorkedHoursView.as_view(), name='worked_hours'),
+
+    # Async (ASGI) versions of the hot endpoints
+    path('async/tasks/', async_views.user_tasks, name='async_user_tasks'),
+    path('async/tasks/<int:id>/', async_views.update_task_status, name='async_update_task'),
+    path('async/tasks/events/', async_views.task_event_stream, name='task_events'),
+    path('async/admin/tasks/', async_views.task_list, name='async_task_list'),
+    path('async/admin/tasks/<int:id>/report/', async_views.task_report, name='async_task_report'),
     
     path('superadmin/dashboard/', views.superadmin_dashboard, name='superadmin_dashboard'),
     path('add-task/', views.add_task, name='add_task'),
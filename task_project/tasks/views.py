@@ -1,28 +1,85 @@
+import uuid
+
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils.functional import cached_property
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import generics, permissions, status
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from .models import Task
-from .serializers import TaskSerializer, TaskCompleteSerializer, TaskCreateSerializer
-from accounts.decorators import superadmin_required
+from .analytics import parse_report_params, worked_hours_report
+from .caching import cached_task_response
+from .conditional import task_list_validators, task_validators
+from .dashboards import superadmin_dashboard_context
+from .due import at_risk_response, at_risk_scope, at_risk_validators
+from .exports import EXPORT_FORMATS, export_path, export_rows, export_tasks
+from .models import AtRiskTask, Task, TaskTombstone, UserTaskStats
+from .pagination import TaskCursorPagination
+from .search import search_response
+from .serializers import TaskSerializer, TaskCompleteSerializer, TaskCreateSerializer, task_read_serializer
+from .sync import sync_response
+from accounts.authentication import ProfileJWTAuthentication, RoleClaimsJWTAuthentication
+from accounts.decorators import role_required, superadmin_required
+from accounts.models import Profile
+from accounts.permissions import IsAdminRole, IsRegularUser, get_role
+from jobs.models import Job
+from jobs.queue import enqueue
 
 # ============= USER API VIEWS (Session Auth) =============
 
 class UserTasksView(APIView):
     """GET /api/user/tasks/ - Get tasks for logged-in user"""
+    authentication_classes = [RoleClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        tasks = Task.objects.filter(user=request.user)
-        serializer = TaskSerializer(tasks, many=True)
-        return Response(serializer.data)
+        return cached_task_response(
+            request,
+            [('user', request.user.id)],
+            lambda: task_list_validators(request, UserTaskStats.objects.filter(user_id=request.user.id)),
+            lambda: self.task_list(request),
+        )
+
+    def task_list(self, request):
+        if 'since' in request.query_params:
+            return sync_response(
+                request,
+                Task.objects.filter(user_id=request.user.id),
+                TaskTombstone.objects.filter(user_id=request.user.id),
+            )
+
+        fields = TaskSerializer.requested_fields(request)
+        serializer_class = task_read_serializer()
+        tasks = serializer_class.optimize_queryset(Task.objects.filter(user_id=request.user.id), fields)
+
+        paginator = TaskCursorPagination()
+        page = paginator.paginate_queryset(tasks, request, view=self)
+        serializer = serializer_class(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class AtRiskTasksView(APIView):
+    """
+    GET /api/tasks/at-risk/ - The logged-in user's overdue and due-soon tasks
+
+    As found by the last ``manage.py scan_due_tasks`` run, see tasks.due.
+    """
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return cached_task_response(
+            request,
+            [('user', request.user.id), at_risk_scope()],
+            lambda: at_risk_validators(request, UserTaskStats.objects.filter(user_id=request.user.id)),
+            lambda: at_risk_response(request, AtRiskTask.objects.filter(user_id=request.user.id)),
+        )
 
 
 class UpdateTaskStatus(APIView):
@@ -40,61 +97,399 @@ class UpdateTaskStatus(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ============= BULK API VIEWS =============
+
+def _batch_error(items, max_items):
+    """Return an error Response if ``items`` isn't an acceptable batch, else None"""
+    if not isinstance(items, list) or not items:
+        return Response({"error": "Expected a non-empty list of items"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > max_items:
+        return Response(
+            {"error": f"A batch may contain at most {max_items} items"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return None
+
+
+# Largest value of the 64-bit primary keys; SQLite overflows past it
+MAX_ID = 2 ** 63 - 1
+
+
+def _parse_id(value, strings=True):
+    """
+    Return ``value`` as a primary key, or None if it can't be one. Accepts
+    positive ints (not bools, an int subclass) and, with ``strings``, strings
+    of ASCII digits.
+    """
+    if isinstance(value, str) and strings:
+        if not (value.isascii() and value.isdigit()):
+            return None
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool):
+        return None
+    return value if 0 < value <= MAX_ID else None
+
+
+def _item_errors(errors):
+    """Turn a per-item error list into ``[{"index": i, "errors": {...}}]`` for the failing items"""
+    return [
+        {"index": index, "errors": item_errors}
+        for index, item_errors in enumerate(errors)
+        if item_errors
+    ]
+
+
+class BulkTaskCreateView(APIView):
+    """POST /api/tasks/bulk/ - Create a batch of tasks in one transaction"""
+    permission_classes = [IsAuthenticated]
+    max_batch_size = 5000
+
+    def post(self, request):
+        items = request.data
+        error = _batch_error(items, self.max_batch_size)
+        if error:
+            return error
+
+        # Resolve every referenced user with one query instead of one per item
+        user_ids, errors = set(), [{} for _ in items]
+        for index, item in enumerate(items):
+            if isinstance(item, dict) and item.get('user') is not None:
+                user_id = _parse_id(item['user'])
+                if user_id is None:
+                    errors[index] = {'user': ['Expected a user id.']}
+                else:
+                    user_ids.add(user_id)
+        if any(errors):
+            return Response({"errors": _item_errors(errors)}, status=status.HTTP_400_BAD_REQUEST)
+        users = User.objects.in_bulk(user_ids)
+        serializer = TaskCreateSerializer(data=items, many=True, context={'request': request, 'users': users})
+        if not serializer.is_valid():
+            return Response({"errors": _item_errors(serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Regular users can only create tasks for themselves
+        if get_role(request.user) == 'user':
+            errors = [
+                {'user': ['You can only create tasks for yourself.']} if attrs['user'] != request.user else {}
+                for attrs in serializer.validated_data
+            ]
+            if any(errors):
+                return Response({"errors": _item_errors(errors)}, status=status.HTTP_403_FORBIDDEN)
+
+        tasks = serializer.save()
+        return Response(
+            {"message": "Tasks created successfully", "created": len(tasks), "ids": [task.id for task in tasks]},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class BulkTaskStatusUpdateView(APIView):
+    """PUT /api/tasks/bulk/status/ - Update the status of a batch of own tasks in one transaction"""
+    permission_classes = [IsAuthenticated]
+    max_batch_size = 5000
+
+    def put(self, request):
+        items = request.data
+        error = _batch_error(items, self.max_batch_size)
+        if error:
+            return error
+
+        ids = [item.get('id') if isinstance(item, dict) else None for item in items]
+        ids = [_parse_id(pk, strings=False) for pk in ids]
+        tasks = Task.objects.filter(user=request.user).in_bulk([pk for pk in ids if pk is not None])
+        found = [tasks.get(pk) for pk in ids]
+
+        # Each item's change is counted in UserTaskStats: a task listed twice
+        # would be counted twice
+        id_errors = [{} for _ in items]
+        seen = set()
+        for index, (pk, task) in enumerate(zip(ids, found)):
+            if task is None:
+                id_errors[index] = {'id': ['Task not found.']}
+            elif pk in seen:
+                id_errors[index] = {'id': ['Duplicate task id.']}
+            seen.add(pk)
+
+        serializer = TaskCompleteSerializer(found, data=items, many=True, partial=True)
+        valid = serializer.is_valid()
+        errors = list(serializer.errors) if not valid else [{} for _ in items]
+        errors = [dict(item_errors, **item_id_errors) for item_errors, item_id_errors in zip(errors, id_errors)]
+        if any(errors):
+            return Response({"errors": _item_errors(errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        tasks = serializer.save()
+        return Response({"message": "Tasks updated successfully", "updated": len(tasks)})
+
+
 # ============= ADMIN API VIEWS =============
 
 class TaskReportView(APIView):
     """GET /api/admin/tasks/<id>/report/ - Get task report (admin only)"""
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request, id):
-        profile = request.user.profile
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
 
-        if profile.role not in ['admin', 'superadmin']:
-            return Response({"error": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
+    @cached_property
+    def task(self):
+        return get_object_or_404(Task.objects.select_related('user'), id=self.kwargs['id'], status='completed')
 
-        task = get_object_or_404(Task, id=id, status='completed')
-        serializer = TaskSerializer(task)
-        return Response(serializer.data)
+    def get(self, request, id):
+        # Reports are read far more often than they change: a cache hit skips the DB entirely
+        return cached_task_response(
+            request,
+            [('task', id)],
+            lambda: task_validators(request, self.task),
+            lambda: Response(TaskSerializer(self.task).data),
+        )
 
 
 class TaskListView(APIView):
     """GET /api/admin/tasks/ - Get all tasks (admin only)"""
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        return cached_task_response(
+            request,
+            [('all',)],
+            lambda: task_list_validators(request),
+            lambda: self.task_list(request),
+        )
+
+    def task_list(self, request):
+        if 'since' in request.query_params:
+            return sync_response(request, Task.objects.all(), TaskTombstone.objects.all())
+
+        fields = TaskSerializer.requested_fields(request)
+        serializer_class = task_read_serializer()
+        tasks = serializer_class.optimize_queryset(Task.objects.all(), fields)
+
+        paginator = TaskCursorPagination()
+        page = paginator.paginate_queryset(tasks, request, view=self)
+        serializer = serializer_class(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class TeamAtRiskTasksView(APIView):
+    """
+    GET /api/admin/tasks/at-risk/ - Overdue and due-soon tasks (admin only)
+
+    Admins see their users' tasks, superadmins everyone's.
+    """
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        at_risk, stats = AtRiskTask.objects.all(), UserTaskStats.objects.all()
+        if get_role(request.user) == 'admin':
+            team = Profile.objects.filter(assigned_admin_id=request.user.id).values('user_id')
+            at_risk, stats = at_risk.filter(user_id__in=team), stats.filter(user_id__in=team)
+        return cached_task_response(
+            request,
+            # The admin's own scope keys the entry to them (and their team)
+            [('all',), ('user', request.user.id), at_risk_scope()],
+            lambda: at_risk_validators(request, stats),
+            lambda: at_risk_response(request, at_risk),
+        )
+
+
+class TaskSearchView(APIView):
+    """
+    GET /api/tasks/search/?q=<words> - Full-text search over task titles, descriptions and completion reports
+
+    Superadmins search every task, admins their own tasks and their users',
+    users their own. Results come best match first, ``page`` / ``page_size``
+    paginated; ``fields`` selects fields as on the task lists.
+    """
+    authentication_classes = [RoleClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        profile = request.user.profile
-        if profile.role not in ['admin', 'superadmin']:
-            return Response({"error": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
-            
-        tasks = Task.objects.all()
-        serializer = TaskSerializer(tasks, many=True)
-        return Response(serializer.data)
+        role = get_role(request.user)
+        if role == 'superadmin':
+            user_ids = None
+        elif role == 'admin':
+            user_ids = Profile.objects.filter(
+                Q(assigned_admin_id=request.user.id) | Q(user_id=request.user.id)
+            ).values('user_id')
+        else:
+            user_ids = [request.user.id]
+        return search_response(request, user_ids)
 
 
-# ============= JWT API VIEWS (for regular users with token auth) =============
+class WorkedHoursView(APIView):
+    """
+    GET /api/admin/analytics/hours/ - Completed tasks and worked hours per period (admin only)
+
+    Query parameters: ``period`` (day, week or month, default week), ``from``
+    and ``to`` dates (default the last 30 days / 12 weeks / 12 months),
+    ``group`` (user or team, default user) and ``user`` (a user id). Admins
+    see their own team, superadmins everyone.
+    """
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        period, start, end, group = parse_report_params(request.query_params)
+        user_id = request.query_params.get('user')
+        if user_id is not None:
+            user_id = _parse_id(user_id)
+            if user_id is None:
+                return Response({"error": "'user' must be a user id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        team = request.user.id if get_role(request.user) == 'admin' else None
+        return Response({
+            'period': period,
+            'from': start,
+            'to': end,
+            'group': group,
+            'results': worked_hours_report(period, start, end, group, team=team, user_id=user_id),
+        })
+
+
+class TaskExportView(APIView):
+    """
+    GET /api/admin/tasks/export/ - Stream tasks as CSV or NDJSON (admin only)
+
+    Query parameters: ``output`` (csv or ndjson, default csv), ``status``, and
+    ``from``/``to`` dates (YYYY-MM-DD, inclusive) matched against the task's
+    completion time with ``status=completed`` and its last update otherwise.
+    """
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The export body bypasses renderers, so accept any Accept header (e.g. text/csv)
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            tasks = export_tasks(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, stream = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(stream(export_rows(tasks)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="tasks.{output}"'
+        return response
+
+
+def export_job_data(request, job):
+    data = {
+        'id': job.id,
+        'status': job.status,
+        'url': request.build_absolute_uri(f'/api/admin/tasks/exports/{job.id}/'),
+    }
+    if job.status == Job.FAILED:
+        data['error'] = "The export failed"
+    return data
+
+
+class TaskExportJobsView(APIView):
+    """
+    POST /api/admin/tasks/exports/ - Generate an export in the background (admin only)
+
+    Takes the parameters of the streaming export (``output``, ``status``,
+    ``from``, ``to``) in the body and answers 202 with the job; its ``url``
+    returns the job's status until the file is ready, then the file.
+    """
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({"error": "Expected an object"}, status=status.HTTP_400_BAD_REQUEST)
+        for name in ('output', 'status', 'from', 'to'):
+            if request.data.get(name) is not None and not isinstance(request.data[name], str):
+                return Response({"error": f"'{name}' must be a string"}, status=status.HTTP_400_BAD_REQUEST)
+        output = request.data.get('output') or 'csv'
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        params = {name: request.data[name] for name in ('status', 'from', 'to') if request.data.get(name)}
+        try:
+            export_tasks(params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = enqueue(
+            'tasks.export', owner=request.user,
+            output=output, file=f'{uuid.uuid4().hex}.{output}', params=params,
+        )
+        return Response(export_job_data(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+class TaskExportJobView(APIView):
+    """GET /api/admin/tasks/exports/<id>/ - A background export's status, or its file once done"""
+    authentication_classes = [RoleClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminRole]
 
-class IsRegularUser(permissions.BasePermission):
-    """Permission class for regular users only"""
-    def has_permission(self, request, view):
-        return (request.user and request.user.is_authenticated and 
-                hasattr(request.user, 'profile') and 
-                request.user.profile.role == 'user')
+    def perform_content_negotiation(self, request, force=False):
+        # The file bypasses renderers, so accept any Accept header (e.g. text/csv)
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, id):
+        job = get_object_or_404(Job, id=id, name='tasks.export', owner_id=request.user.id)
+        if job.status != Job.DONE:
+            return Response(export_job_data(request, job))
+        output = job.payload['output']
+        content_type, _ = EXPORT_FORMATS[output]
+        try:
+            file = open(export_path(job.payload['file']), 'rb')
+        except FileNotFoundError:
+            return Response({"error": "The export file is gone"}, status=status.HTTP_410_GONE)
+        return FileResponse(file, as_attachment=True, filename=f'tasks.{output}', content_type=content_type)
 
 
+# ============= JWT API VIEWS (for regular users with token auth) =============
+
 class UserTaskListAPIView(generics.ListAPIView):
     """GET /api/tasks/ - JWT protected endpoint for regular users"""
     serializer_class = TaskSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleClaimsJWTAuthentication]
     permission_classes = [IsRegularUser]
+    pagination_class = TaskCursorPagination
     
+    def get_serializer_class(self):
+        return task_read_serializer()
+
     def get_queryset(self):
-        return Task.objects.filter(user=self.request.user)
+        fields = TaskSerializer.requested_fields(self.request)
+        return self.get_serializer_class().optimize_queryset(Task.objects.filter(user_id=self.request.user.id), fields)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', TaskSerializer.requested_fields(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return cached_task_response(
+            request,
+            [('user', request.user.id)],
+            lambda: task_list_validators(request, UserTaskStats.objects.filter(user_id=request.user.id)),
+            lambda: self.task_list(request, *args, **kwargs),
+        )
+
+    def task_list(self, request, *args, **kwargs):
+        if 'since' in request.query_params:
+            return sync_response(
+                request,
+                Task.objects.filter(user_id=request.user.id),
+                TaskTombstone.objects.filter(user_id=request.user.id),
+            )
+        return super().list(request, *args, **kwargs)
 
 
 class UserTaskUpdateAPIView(generics.UpdateAPIView):
     """PUT /api/tasks/<id>/ - JWT protected endpoint for updating tasks"""
     serializer_class = TaskCompleteSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ProfileJWTAuthentication]
     permission_classes = [IsRegularUser]
     
     def get_queryset(self):
@@ -126,31 +521,16 @@ class UserTaskUpdateAPIView(generics.UpdateAPIView):
 # ============= WEB VIEWS (Admin Panel) =============
 
 @login_required
+@superadmin_required
 def superadmin_dashboard(request):
     """SuperAdmin dashboard view - only accessible by superadmin"""
-    # Check if user is superadmin
-    if not hasattr(request.user, 'profile') or request.user.profile.role != 'superadmin':
-        messages.error(request, "You don't have permission to access this page.")
-        return redirect('profile')
-    
-    users = User.objects.all()
-    tasks = Task.objects.all().select_related('user')
-    
-    context = {
-        'users': users,
-        'tasks': tasks,
-    }
-    return render(request, 'superadmin_dashboard.html', context)
+    return render(request, 'superadmin_dashboard.html', superadmin_dashboard_context(request))
 
 
 @login_required
+@role_required('superadmin', message="You don't have permission to delete tasks.")
 def delete_task(request, id):
     """Delete task view - only accessible by superadmin"""
-    # Check if user is superadmin
-    if not hasattr(request.user, 'profile') or request.user.profile.role != 'superadmin':
-        messages.error(request, "You don't have permission to delete tasks.")
-        return redirect('profile')
-    
     task = get_object_or_404(Task, id=id)
     task.delete()
     messages.success(request, "Task deleted successfully")
@@ -178,7 +558,7 @@ def add_task(request):
         user_id = request.POST.get("user_id")
         
         # For regular users, force assignment to themselves
-        if request.user.profile.role == 'user':
+        if request.role == 'user':
             assigned_user = request.user
         else:
             # For admins and superadmins, they can assign to any user
@@ -201,24 +581,25 @@ def add_task(request):
         messages.success(request, "Task created successfully")
         
         # Redirect based on role
-        if request.user.profile.role == 'superadmin':
+        if request.role == 'superadmin':
             return redirect("superadmin_dashboard")
         else:
             return redirect("profile")
 
     # GET request - show form
     # Determine which users to show in dropdown based on role
-    if request.user.profile.role == 'superadmin':
+    if request.role == 'superadmin':
         users = User.objects.all()
-    elif request.user.profile.role == 'admin':
+    elif request.role == 'admin':
         users = User.objects.filter(profile__assigned_admin=request.user) | User.objects.filter(id=request.user.id)
     else:
         # Regular users - only show themselves
         users = User.objects.filter(id=request.user.id)
+    users = users.select_related('profile')
     
     return render(request, "add_task.html", {
         "users": users,
-        "user_role": request.user.profile.role
+        "user_role": request.role
     })
 
 
@@ -228,7 +609,7 @@ def update_task(request, id):
     task = get_object_or_404(Task, id=id)
     
     # Check if user has permission to update this task
-    if request.user.profile.role == 'user' and task.user != request.user:
+    if request.role == 'user' and task.user != request.user:
         messages.error(request, "You can only update your own tasks.")
         return redirect('profile')
     
@@ -249,23 +630,24 @@ def update_task(request, id):
         messages.success(request, "Task updated successfully")
         
         # Redirect based on role
-        if request.user.profile.role == 'superadmin':
+        if request.role == 'superadmin':
             return redirect("superadmin_dashboard")
         else:
             return redirect("profile")
     
     # GET request - show form
     # Determine which users to show in dropdown based on role
-    if request.user.profile.role == 'superadmin':
+    if request.role == 'superadmin':
         users = User.objects.all()
-    elif request.user.profile.role == 'admin':
+    elif request.role == 'admin':
         users = User.objects.filter(profile__assigned_admin=request.user) | User.objects.filter(id=request.user.id)
     else:
         # Regular users - only show themselves
         users = User.objects.filter(id=request.user.id)
+    users = users.select_related('profile')
     
     return render(request, "update_task.html", {
         "task": task, 
         "users": users,
-        "user_role": request.user.profile.role
+        "user_role": request.role
     })
\ No newline at end of file